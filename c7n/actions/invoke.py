@@ -7,6 +7,7 @@ except ImportError:
     from c7n.config import Bag as Config  # pragma: no cover
 
 from .core import EventAction
+from .notify import ResourceMessageBuffer
 from c7n import utils
 from c7n.manager import resources
 from c7n.version import version as VERSION
@@ -24,10 +25,17 @@ class LambdaInvoke(EventAction):
      - event / cloud trail event if any
      - version / version of custodian invoking the lambda
 
-    We automatically batch into sets of 250 for invocation,
-    We try to utilize async invocation by default, this imposes
-    some greater size limits of 128kb which means we batch
-    invoke.
+    We automatically batch into sets of up to 250 resources for
+    invocation, further limited by the serialized size of the payload.
+    We try to utilize async invocation by default, this imposes a
+    payload limit of 256kb versus 6mb for synchronous invocation.
+    Batches are invoked concurrently, up to `concurrency` at a time,
+    and results are returned in resource order.
+
+    With `compress: true` each payload is instead a json string of the
+    base64 encoded, zlib compressed payload, which fits many more
+    resources into an invocation, the function must decode it, ie.
+    ``json.loads(zlib.decompress(base64.b64decode(event)))``.
 
     Example::
 
@@ -55,6 +63,8 @@ class LambdaInvoke(EventAction):
             'async': {'type': 'boolean'},
             'qualifier': {'type': 'string'},
             'batch_size': {'type': 'integer'},
+            'concurrency': {'type': 'integer', 'minimum': 1},
+            'compress': {'type': 'boolean'},
             'timeout': {'type': 'integer'},
             'vars': {'type': 'object'},
         }
@@ -63,6 +73,9 @@ class LambdaInvoke(EventAction):
     permissions = ('lambda:InvokeFunction',
                'iam:ListAccountAliases',)
 
+    async_max_size = 262144
+    sync_max_size = 6291456
+
     def process(self, resources, event=None):
 
         config = Config(read_timeout=self.data.get(
@@ -80,10 +93,12 @@ class LambdaInvoke(EventAction):
 
         params = dict(FunctionName=self.data['function'])
         if self.data.get('qualifier'):
-            params['Qualifier'] = self.data['Qualifier']
+            params['Qualifier'] = self.data['qualifier']
 
+        max_size = self.sync_max_size
         if self.data.get('async', True):
             params['InvocationType'] = 'Event'
+            max_size = self.async_max_size
 
         alias = utils.get_account_alias_from_sts(
             utils.local_session(self.manager.session_factory))
@@ -97,16 +112,42 @@ class LambdaInvoke(EventAction):
             'action': self.data,
             'policy': self.manager.data}
 
-        results = []
-        for resource_set in utils.chunks(resources, self.data.get('batch_size', 250)):
-            payload['resources'] = resource_set
-            params['Payload'] = utils.dumps(payload)
-            result = client.invoke(**params)
+        def invoke(serialized_payload):
+            result = client.invoke(Payload=serialized_payload, **params)
             result['Payload'] = result['Payload'].read()
             if isinstance(result['Payload'], bytes):
                 result['Payload'] = result['Payload'].decode('utf-8')
-            results.append(result)
-        return results
+            return result
+
+        with self.executor_factory(max_workers=self.data.get('concurrency', 4)) as w:
+            return list(w.map(invoke, self.get_payloads(payload, resources, max_size)))
+
+    def get_payloads(self, payload, resources, max_size):
+        """Serialize resources into payloads within the invocation size limit."""
+        batch_size = self.data.get('batch_size', 250)
+        if self.data.get('compress'):
+            # the encoded payload is sent as a json string
+            rbuffer = ResourceMessageBuffer(dict(payload), max_size - 2)
+            for r in resources:
+                rbuffer.add(r)
+                if len(rbuffer) >= batch_size or rbuffer.full:
+                    yield utils.dumps(rbuffer.consume())
+            if len(rbuffer):
+                yield utils.dumps(rbuffer.consume())
+            return
+
+        envelope = utils.dumps(dict(payload, resources=[]))
+        prefix, suffix = envelope[:envelope.rfind('[') + 1], envelope[envelope.rfind(']'):]
+        parts, size = [], len(envelope)
+        for r in resources:
+            part = utils.dumps(r)
+            if parts and (len(parts) >= batch_size or size + len(part) + 1 > max_size):
+                yield prefix + ",".join(parts) + suffix
+                parts, size = [], len(envelope)
+            parts.append(part)
+            size += len(part) + 1
+        if parts:
+            yield prefix + ",".join(parts) + suffix
 
     @classmethod
     def register_resources(klass, registry, resource_class):
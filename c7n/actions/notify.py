@@ -4,11 +4,14 @@
 
 import base64
 import copy
+import json
+import time
+import uuid
 import zlib
 
 from .core import EventAction
 from c7n import utils
-from c7n.exceptions import PolicyValidationError
+from c7n.exceptions import PolicyExecutionError, PolicyValidationError
 from c7n.manager import resources as aws_resources
 from c7n.resolver import ValuesFrom
 from c7n.version import version
@@ -113,6 +116,119 @@ class ResourceMessageBuffer:
         return serialized_payload
 
 
+class SQSTransport:
+    """Send payloads to sqs queues in batches.
+
+    Payloads are grouped per queue into send_message_batch calls of up
+    to 10 messages within the 256kb request limit, entries that fail
+    are retried. Clients are cached per region.
+
+    If a payload bucket is given, payloads over the message size limit
+    are written to s3 and a pointer to them is sent instead, in the
+    format of the sqs extended client libraries.
+    """
+
+    batch_max_count = 10
+    batch_max_size = 262144
+    max_attempts = 3
+    retry_delay = 1
+    s3_pointer_class = 'software.amazon.payloadoffloading.PayloadS3Pointer'
+
+    def __init__(self, session_factory, assume=True, payload_bucket=None, payload_prefix=''):
+        self.session_factory = session_factory
+        self.assume = assume
+        self.payload_bucket = payload_bucket
+        self.payload_prefix = payload_prefix
+        self.clients = {}
+        self.batches = {}
+
+    def get_client(self, service, region):
+        key = (service, region)
+        if key not in self.clients:
+            self.clients[key] = self.session_factory(
+                region=region, assume=self.assume).client(service)
+        return self.clients[key]
+
+    @staticmethod
+    def get_message_size(entry):
+        size = len(entry['MessageBody'])
+        for k, v in entry.get('MessageAttributes', {}).items():
+            size += len(k) + len(v['DataType']) + len(v.get('StringValue', ''))
+        return size
+
+    def add(self, queue_url, region, payload, attributes, context=None):
+        """Queue a payload for sending.
+
+        Returns (message id, context) pairs of any messages sent to make
+        room for it.
+        """
+        entry = {'MessageBody': payload, 'MessageAttributes': dict(attributes)}
+        size = self.get_message_size(entry)
+        if size > self.batch_max_size and self.payload_bucket:
+            entry = self.offload(region, entry)
+            size = self.get_message_size(entry)
+
+        sent = []
+        batch = self.batches.setdefault((queue_url, region), [])
+        if batch and (len(batch) >= self.batch_max_count or
+                sum(s for _, s, _ in batch) + size > self.batch_max_size):
+            sent = self.send_batch(queue_url, region, batch)
+            batch[:] = []
+        batch.append((entry, size, context))
+        return sent
+
+    def flush(self):
+        """Send all queued payloads, returns (message id, context) pairs."""
+        sent = []
+        for (queue_url, region), batch in self.batches.items():
+            if batch:
+                sent.extend(self.send_batch(queue_url, region, batch))
+        self.batches = {}
+        return sent
+
+    def offload(self, region, entry):
+        key = "%s%s" % (self.payload_prefix, uuid.uuid4())
+        self.get_client('s3', region).put_object(
+            Bucket=self.payload_bucket, Key=key, Body=entry['MessageBody'].encode('utf8'))
+        attributes = dict(entry['MessageAttributes'])
+        attributes['ExtendedPayloadSize'] = {
+            'DataType': 'Number', 'StringValue': str(len(entry['MessageBody']))}
+        return {
+            'MessageBody': json.dumps([
+                self.s3_pointer_class,
+                {'s3BucketName': self.payload_bucket, 's3Key': key}]),
+            'MessageAttributes': attributes}
+
+    def send_batch(self, queue_url, region, batch):
+        client = self.get_client('sqs', region)
+        pending = {str(idx): (entry, context) for idx, (entry, _, context) in enumerate(batch)}
+        sent, failed = [], []
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            result = client.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[dict(entry, Id=eid) for eid, (entry, _) in pending.items()])
+            for s in result.get('Successful', ()):
+                sent.append((s['MessageId'], pending.pop(s['Id'])[1]))
+            for f in result.get('Failed', ()):
+                # sender faults won't succeed on retry
+                if f.get('SenderFault'):
+                    pending.pop(f['Id'])
+                    failed.append(f)
+                elif attempt == self.max_attempts - 1:
+                    failed.append(f)
+            if not pending:
+                break
+        if failed:
+            raise PolicyExecutionError(
+                "Failed to send %d messages to %s: %s" % (
+                    len(failed), queue_url,
+                    ", ".join(sorted({"%s %s" % (f['Code'], f.get('Message', ''))
+                                      for f in failed}))))
+        return sent
+
+
 class BaseNotify(EventAction):
 
     message_buffer_class = ResourceMessageBuffer
@@ -157,6 +273,12 @@ class Notify(BaseNotify):
     transport, with the exception of the ``mtype`` attribute, which is a
     reserved attribute used by Cloud Custodian.
 
+    Messages for the SQS transport are sent in batches. With a
+    ``payload_bucket``, resources are packed into fewer, larger messages,
+    those over the SQS message size limit are stored in the bucket
+    under ``payload_prefix`` and a pointer to them is sent instead,
+    as with the SQS extended client libraries.
+
     :example:
 
     .. code-block:: yaml
@@ -181,6 +303,7 @@ class Notify(BaseNotify):
                        type: sqs
                        region: us-east-1
                        queue: xyz
+                       payload_bucket: my-notify-payloads
                 - name: ec2-notify-with-attributes
                   resource: ec2
                   filters:
@@ -206,6 +329,9 @@ class Notify(BaseNotify):
 
     C7N_DATA_MESSAGE = "maidmsg/1.0"
 
+    # payloads over the sqs limit are offloaded to s3 when a bucket is given
+    offload_buffer_max_size = 8 * 1024 * 1024
+
     schema_alias = True
     schema = {
         'type': 'object',
@@ -229,7 +355,9 @@ class Notify(BaseNotify):
                      'required': ['type', 'queue'],
                      'properties': {
                          'queue': {'type': 'string'},
-                         'type': {'enum': ['sqs']}}},
+                         'type': {'enum': ['sqs']},
+                         'payload_bucket': {'type': 'string'},
+                         'payload_prefix': {'type': 'string'}}},
                     {'type': 'object',
                      'required': ['type', 'topic'],
                      'properties': {
@@ -245,6 +373,7 @@ class Notify(BaseNotify):
     def __init__(self, data=None, manager=None, log_dir=None):
         super(Notify, self).__init__(data, manager, log_dir)
         self.assume_role = data.get('assume_role', True)
+        self.sqs_transport = None
 
     def validate(self):
         if self.data.get('transport', {}).get('type') == 'sns' and \
@@ -257,10 +386,21 @@ class Notify(BaseNotify):
     def get_permissions(self):
         if self.data.get('transport', {}).get('type') == 'sns':
             return ('sns:Publish',)
-        if self.data.get('transport', {'type': 'sqs'}).get('type') == 'sqs':
+        transport = self.data.get('transport', {'type': 'sqs'})
+        if transport.get('type') == 'sqs' and transport.get('payload_bucket'):
+            return ('sqs:SendMessage', 's3:PutObject')
+        if transport.get('type') == 'sqs':
             return ('sqs:SendMessage',)
         return ()
 
+    def get_sqs_transport(self):
+        if self.sqs_transport is None:
+            transport = self.data['transport']
+            self.sqs_transport = SQSTransport(
+                self.manager.session_factory, self.assume_role,
+                transport.get('payload_bucket'), transport.get('payload_prefix', ''))
+        return self.sqs_transport
+
     def process(self, resources, event=None):
         alias = utils.get_account_alias_from_sts(
             utils.local_session(self.manager.session_factory))
@@ -277,7 +417,11 @@ class Notify(BaseNotify):
             'policy': self.manager.data}
         message['action'] = self.expand_variables(message)
 
-        rbuffer = self.message_buffer_class(message, self.buffer_max_size)
+        buffer_max_size = self.buffer_max_size
+        if self.data['transport'].get('payload_bucket'):
+            buffer_max_size = self.offload_buffer_max_size
+
+        rbuffer = self.message_buffer_class(message, buffer_max_size)
         for r in self.prepare_resources(resources):
             rbuffer.add(r)
             if rbuffer.full:
@@ -286,13 +430,25 @@ class Notify(BaseNotify):
         if len(rbuffer):
             self.consume_buffer(message, rbuffer)
 
+        if self.sqs_transport is not None:
+            self.log_messages(self.sqs_transport.flush())
+
     def consume_buffer(self, message, rbuffer):
         rcount = len(rbuffer)
         payload = rbuffer.consume()
+        if self.data['transport']['type'] == 'sqs':
+            queue_url, region = self.get_queue(message)
+            self.log_messages(self.get_sqs_transport().add(
+                queue_url, region, payload, self.get_sqs_attributes(), rcount))
+            return
         receipt = self.send_data_message(message, payload)
-        self.log.info("sent message:%s policy:%s template:%s count:%s" % (
-            receipt, self.manager.data['name'],
-            self.data.get('template', 'default'), rcount))
+        self.log_messages([(receipt, rcount)])
+
+    def log_messages(self, messages):
+        for receipt, rcount in messages:
+            self.log.info("sent message:%s policy:%s template:%s count:%s" % (
+                receipt, self.manager.data['name'],
+                self.data.get('template', 'default'), rcount))
 
     def prepare_resources(self, resources):
         """Resources preparation for transport.
@@ -381,6 +537,24 @@ class Notify(BaseNotify):
         return result['MessageId']
 
     def send_sqs(self, message, payload):
+        queue_url, region = self.get_queue(message)
+        client = self.get_sqs_transport().get_client('sqs', region)
+        result = client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=payload,
+            MessageAttributes=self.get_sqs_attributes())
+        return result['MessageId']
+
+    def get_sqs_attributes(self):
+        return {
+            'mtype': {
+                'DataType': 'String',
+                'StringValue': self.C7N_DATA_MESSAGE,
+            },
+        }
+
+    def get_queue(self, message):
+        """Return the url and region of the transport's queue."""
         queue = self.data['transport']['queue'].format(**message)
         if queue.startswith('https://queue.amazonaws.com'):
             region = 'us-east-1'
@@ -404,19 +578,7 @@ class Notify(BaseNotify):
             queue_name = queue
             queue_url = "https://sqs.%s.amazonaws.com/%s/%s" % (
                 region, owner_id, queue_name)
-        client = self.manager.session_factory(
-            region=region, assume=self.assume_role).client('sqs')
-        attrs = {
-            'mtype': {
-                'DataType': 'String',
-                'StringValue': self.C7N_DATA_MESSAGE,
-            },
-        }
-        result = client.send_message(
-            QueueUrl=queue_url,
-            MessageBody=payload,
-            MessageAttributes=attrs)
-        return result['MessageId']
+        return queue_url, region
 
     @classmethod
     def register_resource(cls, registry, resource_class):
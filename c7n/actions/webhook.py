@@ -6,6 +6,7 @@ try:
 except ImportError:
     certifi = None
 
+import time
 import urllib3
 from urllib import parse
 
@@ -13,6 +14,19 @@ from c7n import utils
 from .core import EventAction
 
 
+class WebhookRetry(urllib3.Retry):
+    """Retry that also retries 429 responses to non-idempotent methods.
+
+    A 429 (Too Many Requests) response means the request wasn't processed,
+    so sending it again can't duplicate a delivery.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and status_code in (self.status_forcelist or ()):
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
 class Webhook(EventAction):
     """Calls a webhook with optional parameters and body
        populated from JMESPath queries.
@@ -30,6 +44,17 @@ class Webhook(EventAction):
                  query-params:
                     resource_name: resource.name
                     policy_name: policy.name
+
+    Requests are sent concurrently, up to `concurrency` at a time, over a
+    shared pool of keep-alive connections. Connection errors and 429
+    responses are retried with exponential backoff, up to `retries` times,
+    honoring any Retry-After header. Read errors and 5xx responses are
+    only retried for idempotent methods (ie. GET, PUT and DELETE), as the
+    request may have already been processed. Set `retry-non-idempotent`
+    to retry POST and PATCH requests on these as well.
+
+    Request counts, errors and latency are recorded as policy metrics,
+    with the url's host as the Endpoint dimension.
     """
 
     schema_alias = True
@@ -41,6 +66,9 @@ class Webhook(EventAction):
             'body': {'type': 'string'},
             'batch': {'type': 'boolean'},
             'batch-size': {'type': 'number'},
+            'concurrency': {'type': 'integer', 'minimum': 1},
+            'retries': {'type': 'integer', 'minimum': 0},
+            'retry-non-idempotent': {'type': 'boolean'},
             'method': {'type': 'string', 'enum': ['PUT', 'POST', 'GET', 'PATCH', 'DELETE']},
             'query-params': {
                 "type": "object",
@@ -59,6 +87,9 @@ class Webhook(EventAction):
         }
     )
 
+    retry_status = (429, 500, 502, 503, 504)
+    backoff_factor = 0.5
+
     def __init__(self, data=None, manager=None, log_dir=None):
         super(Webhook, self).__init__(data, manager, log_dir)
         self.http = None
@@ -69,6 +100,9 @@ class Webhook(EventAction):
         self.query_params = self.data.get('query-params', {})
         self.headers = self.data.get('headers', {})
         self.method = self.data.get('method', 'POST')
+        self.concurrency = self.data.get('concurrency', 10)
+        self.retries = self.data.get('retries', 3)
+        self.retry_non_idempotent = self.data.get('retry-non-idempotent', False)
         self.lookup_data = None
 
     def process(self, resources, event=None):
@@ -83,18 +117,20 @@ class Webhook(EventAction):
 
         self.http = self._build_http_manager()
 
+        # each request gets its own payload, as they're built concurrently
         if self.batch:
-            for chunk in utils.chunks(resources, self.batch_size):
-                resource_data = self.lookup_data
-                resource_data['resources'] = chunk
-                self._process_call(resource_data)
+            payloads = [
+                dict(self.lookup_data, resources=chunk)
+                for chunk in utils.chunks(resources, self.batch_size)]
         else:
-            for r in resources:
-                resource_data = self.lookup_data
-                resource_data['resource'] = r
-                self._process_call(resource_data)
+            payloads = [dict(self.lookup_data, resource=r) for r in resources]
+
+        with self.executor_factory(max_workers=self.concurrency) as w:
+            results = list(w.map(self._process_call, payloads))
+        self._put_metrics(results)
 
     def _process_call(self, resource):
+        """Send a request, returns the url, its latency and whether it failed."""
         prepared_url = self._build_url(resource)
         prepared_body = self._build_body(resource)
         prepared_headers = self._build_headers(resource)
@@ -102,22 +138,66 @@ class Webhook(EventAction):
         if prepared_body:
             prepared_headers['Content-Type'] = 'application/json'
 
+        t = time.time()
         try:
             res = self.http.request(
                 method=self.method,
                 url=prepared_url,
                 body=prepared_body,
-                headers=prepared_headers)
+                headers=prepared_headers,
+                retries=self._build_retry())
 
             self.log.info("%s got response %s with URL %s" %
                           (self.method, res.status, prepared_url))
+            error = res.status >= 400
         except urllib3.exceptions.HTTPError as e:
-            self.log.error("Error calling %s. Code: %s" % (prepared_url, e.reason))
+            self.log.error("Error calling %s. Code: %s" % (
+                prepared_url, getattr(e, 'reason', e)))
+            error = True
+        return prepared_url, time.time() - t, error
+
+    def _put_metrics(self, results):
+        endpoints = {}
+        for url, latency, error in results:
+            # host and port only, the url's userinfo may hold credentials.
+            parsed = parse.urlparse(url)
+            endpoint = parsed.hostname or ''
+            if parsed.port:
+                endpoint = '%s:%d' % (endpoint, parsed.port)
+            endpoints.setdefault(endpoint, []).append((latency, error))
+
+        metrics = self.manager.ctx.metrics
+        for endpoint, calls in endpoints.items():
+            latencies = [latency for latency, _ in calls]
+            metrics.put_metric(
+                'WebhookRequests', len(calls), 'Count', Endpoint=endpoint)
+            metrics.put_metric(
+                'WebhookErrors', sum(1 for _, error in calls if error), 'Count',
+                Endpoint=endpoint)
+            metrics.put_metric(
+                'WebhookLatency', sum(latencies) / len(latencies), 'Seconds',
+                Endpoint=endpoint)
+            metrics.put_metric(
+                'WebhookMaxLatency', max(latencies), 'Seconds', Endpoint=endpoint)
+
+    def _build_retry(self):
+        return WebhookRetry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.retry_status,
+            # False retries regardless of the request method
+            allowed_methods=(
+                False if self.retry_non_idempotent
+                else urllib3.Retry.DEFAULT_ALLOWED_METHODS),
+            raise_on_status=False)
 
     def _build_http_manager(self):
         pool_kwargs = {
             'cert_reqs': 'CERT_REQUIRED',
-            'ca_certs': certifi and certifi.where() or None
+            'ca_certs': certifi and certifi.where() or None,
+            # keep a connection per concurrent request alive for reuse
+            'maxsize': self.concurrency,
+            'block': True,
         }
 
         proxy_url = utils.get_proxy_url(self.url)
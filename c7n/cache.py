@@ -3,6 +3,7 @@
 """Provide basic caching services to avoid extraneous queries over
 multiple policies on the same resource type.
 """
+import copy
 import pickle  # nosec nosemgrep
 
 from datetime import datetime, timedelta
@@ -32,6 +33,8 @@ def factory(config):
             log.debug("Using in-memory cache")
             CACHE_NOTIFY = True
         return InMemoryCache(config)
+    elif getattr(config, 'cache_items', False):
+        return SqlItemCache(config)
     return SqlKvCache(config)
 
 
@@ -49,6 +52,40 @@ class Cache:
     def save(self, key, data):
         pass
 
+    def get_many(self, keys):
+        """Return the cached values of a sequence of keys, None where missing."""
+        return [self.get(k) for k in keys]
+
+    def save_many(self, items, retention=None):
+        """Save a sequence of (key, value) pairs.
+
+        Backends that expire values can keep these for the given retention,
+        a timedelta, rather than the cache period.
+        """
+        for k, v in items:
+            self.save(k, v)
+
+    def get_resources(self, key, ids, id_key):
+        """Return the cached resources under key with the given ids."""
+        resources = self.get(key)
+        if resources is None:
+            return None
+        id_set = set(ids)
+        return [r for r in resources if r[id_key] in id_set]
+
+    def save_resources(self, key, resources, id_key):
+        self.save(key, resources)
+
+    def update_resources(self, key, resources, id_key):
+        """Refresh a subset of the resources cached under key.
+
+        Only supported by backends with per resource storage, as
+        a partial set can't be stored under a resource list key.
+        """
+
+    def invalidate(self, key, ids=None):
+        pass
+
     def size(self):
         return 0
 
@@ -89,6 +126,46 @@ class InMemoryCache(Cache):
         return sum(map(len, self.data.values()))
 
 
+class RunResourceCache(Cache):
+    """Run scoped in-memory cache shared by policies on the same resource type.
+
+    Used when the persistent cache is disabled, so that policies on the
+    same resource type, account and region fetch and augment resources once.
+    Resources are deep copied on save and on read, so annotations or other
+    changes one policy makes to a resource, including nested values like
+    tags, aren't visible to other policies. Cached data is
+    dropped once each of the sharing policies has released the cache.
+    """
+
+    def __init__(self, config, users=1):
+        super().__init__(config)
+        self.users = users
+        self.data = {}
+
+    def load(self):
+        return True
+
+    def get(self, key):
+        return self.copy(self.data.get(encode(key)))
+
+    def save(self, key, data):
+        self.data[encode(key)] = self.copy(data)
+
+    def release(self):
+        self.users -= 1
+        if self.users < 1:
+            self.data.clear()
+
+    def size(self):
+        return sum(map(len, self.data.values()))
+
+    @staticmethod
+    def copy(data):
+        if not isinstance(data, list):
+            return data
+        return copy.deepcopy(data)
+
+
 def encode(key):
     return pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)  # nosemgrep
 
@@ -105,7 +182,8 @@ class SqlKvCache(Cache):
     create table if not exists c7n_cache (
         key blob primary key,
         value blob,
-        create_date timestamp
+        create_date timestamp,
+        expire_date timestamp
     )
     """
 
@@ -115,6 +193,9 @@ class SqlKvCache(Cache):
         self.cache_path = resolve_path(config.cache)
         self.conn = None
 
+    # stay under sqlite's default host parameter limit
+    batch_size = 500
+
     def init(self):
         # migration from pickle cache file
         if os.path.exists(self.cache_path):
@@ -128,10 +209,15 @@ class SqlKvCache(Cache):
             os.makedirs(os.path.dirname(self.cache_path))
         self.conn = sqlite3.connect(self.cache_path)
         self.conn.execute(self.create_table)
+        columns = [c[1] for c in self.conn.execute('pragma table_info(c7n_cache)')]
+        if 'expire_date' not in columns:
+            self.conn.execute('alter table c7n_cache add column expire_date timestamp')
+        now = datetime.utcnow()
         with self.conn as cursor:
             result = cursor.execute(
-                'delete from c7n_cache where create_date < ?',
-                [datetime.utcnow() - timedelta(minutes=self.cache_period)])
+                'delete from c7n_cache where '
+                '(expire_date is null and create_date < ?) or expire_date < ?',
+                [now - timedelta(minutes=self.cache_period), now])
             if result.rowcount:
                 log.debug('expired %d stale cache entries', result.rowcount)
 
@@ -143,24 +229,51 @@ class SqlKvCache(Cache):
     def get(self, key):
         with self.conn as cursor:
             r = cursor.execute(
-                'select value, create_date from c7n_cache where key = ?',
+                'select value, create_date, expire_date from c7n_cache where key = ?',
                 [sqlite3.Binary(encode(key))]
             )
             row = r.fetchone()
             if row is None:
                 return None
-            value, create_date = row
-            create_date = sqlite3.converters['TIMESTAMP'](create_date.encode('utf8'))
-            if (datetime.utcnow() - create_date).total_seconds() / 60.0 > self.cache_period:
+            value, create_date, expire_date = row
+            if self.is_expired(create_date, expire_date):
                 return None
             return pickle.loads(value)  # nosec nosemgrep
 
     def save(self, key, data, timestamp=None):
+        self.save_many([(key, data)], timestamp=timestamp)
+
+    def get_many(self, keys):
+        encoded = [encode(k) for k in keys]
+        found = {}
         with self.conn as cursor:
-            timestamp = timestamp or datetime.utcnow()
-            cursor.execute(
-                'replace into c7n_cache (key, value, create_date) values (?, ?, ?)',
-                (sqlite3.Binary(encode(key)), sqlite3.Binary(encode(data)), timestamp))
+            for idx in range(0, len(encoded), self.batch_size):
+                batch = encoded[idx:idx + self.batch_size]
+                rows = cursor.execute(
+                    'select key, value, create_date, expire_date from c7n_cache '
+                    'where key in (%s)' % ', '.join('?' * len(batch)),
+                    [sqlite3.Binary(k) for k in batch])
+                for key, value, create_date, expire_date in rows:
+                    if not self.is_expired(create_date, expire_date):
+                        found[bytes(key)] = pickle.loads(value)  # nosec nosemgrep
+        return [found.get(k) for k in encoded]
+
+    def save_many(self, items, retention=None, timestamp=None):
+        timestamp = timestamp or datetime.utcnow()
+        expire_date = retention and timestamp + retention or None
+        with self.conn as cursor:
+            cursor.executemany(
+                'replace into c7n_cache (key, value, create_date, expire_date) '
+                'values (?, ?, ?, ?)',
+                [(sqlite3.Binary(encode(k)), sqlite3.Binary(encode(v)), timestamp, expire_date)
+                 for k, v in items])
+
+    def is_expired(self, create_date, expire_date=None):
+        if expire_date is not None:
+            expire_date = sqlite3.converters['TIMESTAMP'](expire_date.encode('utf8'))
+            return datetime.utcnow() > expire_date
+        create_date = sqlite3.converters['TIMESTAMP'](create_date.encode('utf8'))
+        return (datetime.utcnow() - create_date).total_seconds() / 60.0 > self.cache_period
 
     def size(self):
         return os.path.exists(self.cache_path) and os.path.getsize(self.cache_path) or 0
@@ -169,3 +282,133 @@ class SqlKvCache(Cache):
         if self.conn:
             self.conn.close()
             self.conn = None
+
+
+class SqlItemCache(SqlKvCache):
+    """Sqlite cache storing one row per resource.
+
+    Resource lists are stored as a manifest of ids per cache key, with
+    each resource stored separately by account, region, resource type
+    and id. This allows loading a subset of resources by id, refreshing
+    individual resources (ie. from events), and expiring resources
+    independently of the list they were fetched with.
+
+    Values not saved via :meth:`save_resources` are stored as with
+    :class:`SqlKvCache`, and :meth:`get_many` only reads such values.
+    """
+
+    create_manifest_table = """
+    create table if not exists c7n_cache_manifest (
+        key blob primary key,
+        ids blob,
+        create_date timestamp
+    )
+    """
+
+    create_item_table = """
+    create table if not exists c7n_cache_item (
+        type_key blob,
+        id text,
+        value blob,
+        create_date timestamp,
+        primary key (type_key, id)
+    )
+    """
+
+    def init(self):
+        super().init()
+        self.conn.execute(self.create_manifest_table)
+        self.conn.execute(self.create_item_table)
+        expire_date = datetime.utcnow() - timedelta(minutes=self.cache_period)
+        with self.conn as cursor:
+            cursor.execute(
+                'delete from c7n_cache_manifest where create_date < ?', [expire_date])
+            result = cursor.execute(
+                'delete from c7n_cache_item where create_date < ?', [expire_date])
+            if result.rowcount:
+                log.debug('expired %d stale cache items', result.rowcount)
+
+    @staticmethod
+    def get_type_key(key):
+        # resources are shared across queries on the same resource type.
+        if isinstance(key, dict):
+            key = {k: v for k, v in key.items() if k != 'q'}
+        return sqlite3.Binary(encode(key))
+
+    def get_manifest(self, key):
+        row = self.conn.execute(
+            'select ids, create_date from c7n_cache_manifest where key = ?',
+            [sqlite3.Binary(encode(key))]).fetchone()
+        if row is None or self.is_expired(row[1]):
+            return None
+        return pickle.loads(row[0])  # nosec nosemgrep
+
+    def load_items(self, key, ids):
+        type_key = self.get_type_key(key)
+        ids = list(ids)
+        found = {}
+        for idx in range(0, len(ids), self.batch_size):
+            batch = ids[idx:idx + self.batch_size]
+            rows = self.conn.execute(
+                'select id, value, create_date from c7n_cache_item '
+                'where type_key = ? and id in (%s)' % ', '.join('?' * len(batch)),
+                [type_key] + batch)
+            for rid, value, create_date in rows:
+                if not self.is_expired(create_date):
+                    found[rid] = pickle.loads(value)  # nosec nosemgrep
+        return found
+
+    def get(self, key):
+        ids = self.get_manifest(key)
+        if ids is None:
+            return super().get(key)
+        items = self.load_items(key, ids)
+        if len(items) != len(ids):
+            log.debug('cached resource set incomplete, %d of %d items expired',
+                      len(ids) - len(items), len(ids))
+            return None
+        return [items[i] for i in ids]
+
+    def get_resources(self, key, ids, id_key):
+        if self.get_manifest(key) is None:
+            return None
+        id_set = {str(i) for i in ids}
+        items = self.load_items(key, id_set)
+        if len(items) != len(id_set):
+            # let the caller fetch and update the missing resources
+            return None
+        return list(items.values())
+
+    def save_resources(self, key, resources, id_key, timestamp=None):
+        timestamp = timestamp or datetime.utcnow()
+        ids = [str(r[id_key]) for r in resources]
+        with self.conn as cursor:
+            cursor.execute(
+                'replace into c7n_cache_manifest (key, ids, create_date) values (?, ?, ?)',
+                (sqlite3.Binary(encode(key)), sqlite3.Binary(encode(ids)), timestamp))
+            self.save_items(cursor, key, resources, id_key, timestamp)
+
+    def update_resources(self, key, resources, id_key, timestamp=None):
+        with self.conn as cursor:
+            self.save_items(
+                cursor, key, resources, id_key, timestamp or datetime.utcnow())
+
+    def save_items(self, cursor, key, resources, id_key, timestamp):
+        type_key = self.get_type_key(key)
+        cursor.executemany(
+            'replace into c7n_cache_item (type_key, id, value, create_date) '
+            'values (?, ?, ?, ?)',
+            [(type_key, str(r[id_key]), sqlite3.Binary(encode(r)), timestamp)
+             for r in resources])
+
+    def invalidate(self, key, ids=None):
+        """Remove the resources with the given ids, or the whole resource list."""
+        with self.conn as cursor:
+            if ids is None:
+                cursor.execute(
+                    'delete from c7n_cache_manifest where key = ?',
+                    [sqlite3.Binary(encode(key))])
+                return
+            cursor.executemany(
+                'delete from c7n_cache_item where type_key = ? and id = ?',
+                [(self.get_type_key(key), str(i)) for i in ids])
@@ -96,6 +96,9 @@ def _default_options(p, exclude=[]):
         p.add_argument(
             "--cache-period", default=15, type=int,
             help="Cache validity in minutes (default %(default)i)")
+        p.add_argument(
+            "--cache-items", default=False, action="store_true",
+            help="Cache resources individually, allowing partial loads and refreshes")
     else:
         p.add_argument("--cache", default=None, help=argparse.SUPPRESS)
 
@@ -125,6 +128,10 @@ def _report_options(p):
     p.add_argument(
         '--all-findings', default=False, action="store_true",
         help="Outputs all findings per resource. Defaults to a single finding per resource. ")
+    p.add_argument(
+        '--index', default=None, metavar='PATH',
+        help="Path of a local index of the report rows of fetched s3 outputs, subsequent "
+        "reports only fetch new outputs")
 
 
 def _metrics_options(p):
@@ -192,6 +199,19 @@ def _key_val_pair(value):
     return value
 
 
+def _positive_int(value):
+    """
+    Type checker to ensure that integer values are at least 1
+    """
+    try:
+        value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid int value: %r' % value)
+    if value < 1:
+        raise argparse.ArgumentTypeError('value must be at least 1')
+    return value
+
+
 def setup_parser():
     c7n_desc = "Cloud Custodian - Cloud fleet management"
     parser = argparse.ArgumentParser(description=c7n_desc)
@@ -226,6 +246,34 @@ def setup_parser():
         "--skip-validation",
         action="store_true",
         help="Skips validation of policies (assumes you've run the validate command seperately).")
+    run.add_argument(
+        "-j", "--workers", type=_positive_int, default=1,
+        help="Number of policy groups to run concurrently, policies on the same "
+        "resource type, account and region run serially (default %(default)i)")
+    run.add_argument(
+        "--service-concurrency", type=_positive_int, default=2,
+        help="Maximum policy groups running concurrently against a service "
+        "when using --workers (default %(default)i)")
+    run.add_argument(
+        "--s3-augment", default="all",
+        help="S3 bucket details to fetch, 'all', 'auto' to infer them from "
+        "the policy, or comma separated keys ie. Tags,Versioning (default %(default)s)")
+    run.add_argument(
+        "--s3-augment-concurrency", type=_positive_int, default=30,
+        help="Maximum concurrent api calls fetching s3 bucket details, when "
+        "not fetching all of them (default %(default)i)")
+    run.add_argument(
+        "--columnar-threshold", type=int, default=0,
+        help="Evaluate value filters in bulk over resource sets of at least "
+        "this many resources, 0 disables it (default %(default)i)")
+    run.add_argument(
+        "--tag-augment-concurrency", type=_positive_int, default=3,
+        help="Maximum concurrent api calls fetching resource tags "
+        "(default %(default)i)")
+    run.add_argument(
+        "--stream-batch-size", type=int, default=0,
+        help="Augment and filter resources in batches of this size as they "
+        "are enumerated, 0 disables it (default %(default)i)")
 
     metrics_help = ("Emit metrics to provider metrics. Specify 'aws', 'gcp', or 'azure'. "
             "For more details on aws metrics options, see: "
@@ -1,6 +1,7 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
 from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import timedelta, datetime
 from functools import wraps
 import json
@@ -13,8 +14,9 @@ from typing import List
 import yaml
 from yaml.constructor import ConstructorError
 
-from c7n import deprecated
+from c7n import cache, deprecated
 from c7n.exceptions import ClientError, PolicyValidationError
+from c7n.executor import ThreadPoolExecutor
 from c7n.loader import SourceLocator
 from c7n.provider import clouds
 from c7n.policy import Policy, PolicyCollection, load as policy_load
@@ -301,22 +303,120 @@ def run(options, policies: List[Policy]) -> None:
             log.exception("Unable to assume role %s", options.assume_role)
             sys.exit(1)
 
-    errored_policies: List[str] = []
+    if not (options.cache and options.cache_period):
+        _share_resource_fetch(policies)
+    _share_tag_results(policies)
+
+    if getattr(options, 'workers', 1) > 1:
+        errored = _run_parallel(options, policies)
+    else:
+        errored = _run_policies(options, policies)
+    errored_policies: List[str] = [p.name for p in errored]
+    if errored_policies:
+        exit_code = 2
+    if exit_code != 0:
+        log.error("The following policies had errors while executing\n - %s" % (
+            "\n - ".join(errored_policies)))
+        sys.exit(exit_code)
+
+
+def _run_policies(options, policies):
+    errored_policies = []
     for policy in policies:
         try:
             policy()
         except Exception:
-            exit_code = 2
-            errored_policies.append(policy.name)
+            errored_policies.append(policy)
             if options.debug:
                 raise
             log.exception(
                 "Error while executing policy %s, continuing" % (
                     policy.name))
-    if exit_code != 0:
-        log.error("The following policies had errors while executing\n - %s" % (
-            "\n - ".join(errored_policies)))
-        sys.exit(exit_code)
+        finally:
+            policy_cache = policy.get_cache()
+            if isinstance(policy_cache, cache.RunResourceCache):
+                policy_cache.release()
+    return errored_policies
+
+
+def _share_resource_fetch(policies):
+    """Share a single resource fetch across policies when the cache is disabled.
+
+    Policies on the same resource type, account and region get a run scoped
+    in-memory cache, so the resource type is fetched and augmented once,
+    with each policy evaluating its filters over its own copy.
+    """
+    groups = {}
+    for policy in policies:
+        if isinstance(policy.get_cache(), cache.NullCache):
+            groups.setdefault(_policy_group_key(policy), []).append(policy)
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        shared = cache.RunResourceCache(group[0].options, users=len(group))
+        for policy in group:
+            policy.resource_manager._cache = shared
+
+
+def _share_tag_results(policies):
+    """Share tag lookups across the run's policies, by account and region."""
+    tag_results = {}
+    for policy in policies:
+        policy.ctx.run_tag_results = tag_results
+
+
+def _policy_group_key(policy):
+    # policies on the same resource type, account and region are run
+    # serially in a group, so they can share a single fetch via the cache.
+    return (
+        policy.provider_name,
+        policy.resource_type,
+        policy.options.account_id,
+        policy.options.region)
+
+
+def _policy_service_key(policy):
+    service = getattr(policy.resource_manager.resource_type, 'service', None)
+    return (policy.provider_name, service or policy.resource_type)
+
+
+def _run_parallel(options, policies):
+    """Run groups of policies concurrently.
+
+    Policies are grouped by resource type, account and region, each group
+    running serially. Groups are run on a pool of `options.workers`
+    threads, with at most `options.service_concurrency` groups concurrently
+    running against any one service.
+    """
+    groups = {}
+    for policy in policies:
+        groups.setdefault(_policy_group_key(policy), []).append(policy)
+    pending = list(groups.values())
+    service_cap = max(getattr(options, 'service_concurrency', 2), 1)
+    service_active = Counter()
+    log.info("Running %d policies in %d groups with %d workers",
+             len(policies), len(pending), options.workers)
+
+    errored_policies = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=options.workers) as w:
+        while pending or running:
+            for group in list(pending):
+                if len(running) >= options.workers:
+                    break
+                service = _policy_service_key(group[0])
+                if service_active[service] >= service_cap:
+                    continue
+                service_active[service] += 1
+                pending.remove(group)
+                running[w.submit(_run_policies, options, group)] = service
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                service_active[running.pop(f)] -= 1
+                # with --debug, policy exceptions are raised here.
+                errored_policies.update(map(id, f.result()))
+    # report errors in policy order, as with serial execution.
+    return [p for p in policies if id(p) in errored_policies]
 
 
 @policy_command
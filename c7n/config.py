@@ -42,6 +42,12 @@ class Config(Bag):
             'metrics': None,
             'output_dir': '',
             'cache_period': 0,
+            'cache_items': False,
+            's3_augment': 'all',
+            's3_augment_concurrency': 30,
+            'columnar_threshold': 0,
+            'tag_augment_concurrency': 3,
+            'stream_batch_size': 0,
             'dryrun': False,
             'authorization_file': None})
         d.update(kw)
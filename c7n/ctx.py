@@ -35,6 +35,14 @@ class ExecutionContext:
         self.api_stats = None
         self.sys_stats = None
 
+        # Resource data shared across the resource managers of an execution
+        self.tag_results = None
+        self.related_index = None
+        self.reference_graph = None
+        self.client_pools = None
+        # Set by a run to share tag results across its policies, see c7n.tags
+        self.run_tag_results = None
+
         # A few tests patch on metrics flush
         # For backward compatibility, accept both 'metrics' and 'metrics_enabled' params (PR #4361)
         metrics = self.options.metrics or self.options.metrics_enabled
@@ -63,6 +71,11 @@ class ExecutionContext:
                 self.sys_stats = sys_stats_outputs.select(sys_stats_type, self)
                 break
 
+        self.tag_results = self.run_tag_results
+        self.related_index = None
+        self.reference_graph = None
+        self.client_pools = None
+
         self.start_time = time.time()
         self.execution_id = str(uuid.uuid4())
 
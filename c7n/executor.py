@@ -1,10 +1,23 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
-from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)  # noqa
-
+from concurrent.futures import ProcessPoolExecutor  # noqa
+import concurrent.futures
+import contextvars
 import threading
 
 
+class ThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Thread pool whose calls run in a copy of the submitter's context.
+
+    Context variables set by the submitting thread, such as the policy
+    execution owning the log output, are visible to the worker threads.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(
+            contextvars.copy_context().run, fn, *args, **kwargs)
+
+
 class MainThreadExecutor:
     """ For running tests.
 
@@ -0,0 +1,211 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Columnar evaluation of value filter blocks over large resource sets.
+
+Rather than walking each resource through the filter tree, the keys
+referenced by the value filters are projected into columns once, each
+filter is evaluated over its column into a boolean mask, and boolean
+blocks combine the masks of their members.
+
+The engine is opt-in, it is used for filtering resource sets of at least
+``--columnar-threshold`` resources. Blocks containing filters other
+than the generic value filter are processed as usual, and value filters
+whose operator or value type isn't supported in bulk are evaluated
+per resource.
+"""
+import datetime
+import fnmatch
+import operator
+import os
+import re
+from itertools import compress
+
+from dateutil.tz import tzutc
+
+from c7n.filters.core import (
+    ANNOTATION_KEY, OPERATORS, SENTINEL_CHECKS, And, Not, Or, ValueFilter)
+from c7n.utils import parse_date, set_annotation
+
+
+ORDERING_OPS = ('gt', 'greater-than', 'ge', 'gte', 'lt', 'less-than', 'le', 'lte')
+EQUALITY_OPS = (None, 'eq', 'equal', 'ne', 'not-equal')
+MEMBERSHIP_OPS = ('in', 'ni', 'not-in')
+PATTERN_OPS = ('regex', 'regex-case', 'glob')
+TIME_TYPES = ('age', 'expiration')
+
+
+def get_threshold(config):
+    return getattr(config, 'columnar_threshold', None) or 0
+
+
+def is_enabled(config, resources):
+    threshold = get_threshold(config)
+    return bool(threshold) and len(resources) >= threshold
+
+
+def supports(f):
+    """Whether a filter and all its members can be evaluated by the engine."""
+    if isinstance(f, (And, Or, Not)):
+        return f.manager is not None and all(supports(m) for m in f.filters)
+    return type(f) is ValueFilter and f.get_plan() is not None
+
+
+def process(f, resources):
+    """Filter resources by the given filter using columnar evaluation."""
+    evaluator = ColumnarEvaluator(resources)
+    mask, annotations = evaluator.evaluate(f, [True] * len(resources))
+    evaluator.annotate(mask, annotations)
+    return list(compress(resources, mask))
+
+
+class ColumnarEvaluator:
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.columns = {}
+
+    def column(self, f):
+        """Values of the filter's key across all resources, shared by key."""
+        ckey = (f.k, f.data.get('value_regex'))
+        if ckey not in self.columns:
+            getter = f.compile_accessor(*ckey)
+            self.columns[ckey] = [getter(r) for r in self.resources]
+        return self.columns[ckey]
+
+    def evaluate(self, f, where):
+        """Evaluate a filter into a mask of matching resources.
+
+        Only resources selected by the where mask are evaluated. Returns
+        the mask along with the annotation keys to set on matched
+        resources, as a list of (key, mask) pairs.
+        """
+        if isinstance(f, And):
+            return self.evaluate_and(f.filters, where)
+        elif isinstance(f, Or):
+            mask, annotations = [False] * len(where), []
+            for m in f.filters:
+                m_mask, m_annotations = self.evaluate(m, where)
+                mask = list(map(operator.or_, mask, m_mask))
+                annotations.extend(m_annotations)
+            return mask, annotations
+        elif isinstance(f, Not):
+            # annotations from within the block are always swept.
+            mask, _ = self.evaluate_and(f.filters, where)
+            return [w and not m for w, m in zip(where, mask)], []
+        mask = self.evaluate_value(f, where)
+        return mask, f.annotate and [(f.k, mask)] or []
+
+    def evaluate_and(self, filters, where):
+        mask, annotations = where, []
+        for f in filters:
+            mask, f_annotations = self.evaluate(f, mask)
+            annotations.extend(f_annotations)
+        return mask, [(k, list(map(operator.and_, m, mask))) for k, m in annotations]
+
+    def evaluate_value(self, f, where):
+        if f.plan is None and self.resources:
+            # trigger lazy initialization of the filter's key, value and plan
+            f.match(self.resources[0])
+        test = f.plan is not None and self.get_test(f)
+        if not test:
+            return [w and f.match(r) for w, r in zip(where, self.resources)]
+        return [w and test(c) for w, c in zip(where, self.column(f))]
+
+    def get_test(self, f):
+        """Return a test of a single column value, or None if not supported in bulk."""
+        op, v, vtype = f.op, f.v, f.vtype
+        if vtype in TIME_TYPES and op in ORDERING_OPS:
+            return self.get_time_test(f)
+        elif vtype is not None or (isinstance(v, str) and v in SENTINEL_CHECKS):
+            return None
+
+        if op in EQUALITY_OPS and isinstance(v, (str, int, float)):
+            compare = op in ('ne', 'not-equal') and operator.ne or operator.eq
+            return lambda c: compare(c, v)
+        elif op in ORDERING_OPS and isinstance(v, (int, float)):
+            compare = OPERATORS[op]
+
+            def test(c):
+                try:
+                    return compare(c, v)
+                except TypeError:
+                    return False
+            return test
+        elif op in MEMBERSHIP_OPS and isinstance(v, (list, tuple, set)):
+            return self.get_membership_test(op, v)
+        elif op in PATTERN_OPS and isinstance(v, str):
+            if op == 'glob':
+                match = re.compile(fnmatch.translate(os.path.normcase(v))).match
+                normcase = os.path.normcase
+            else:
+                match = re.compile(v, op == 'regex' and re.IGNORECASE or 0).match
+                normcase = str
+            return lambda c: isinstance(c, str) and match(normcase(c)) is not None
+        return None
+
+    def get_membership_test(self, op, v):
+        try:
+            values = frozenset(v)
+        except TypeError:
+            return None
+        negate = op != 'in'
+
+        def test(c):
+            if c is None:
+                c = ()
+            try:
+                found = c in values
+            except TypeError:
+                # unhashable resource values, use list semantics
+                found = c in v
+            return found is not negate
+        return test
+
+    def get_time_test(self, f):
+        """Compare resource timestamps as epoch seconds against the threshold."""
+        threshold = f.v
+        if not isinstance(threshold, datetime.datetime):
+            if not isinstance(threshold, (int, float)):
+                return None
+            delta = datetime.timedelta(threshold)
+            now = datetime.datetime.now(tz=tzutc())
+            threshold = f.vtype == 'age' and now - delta or now + delta
+        compare = OPERATORS[f.op]
+        if f.vtype == 'age':
+            # age compares the threshold to the resource value
+            compare = swap(compare)
+        threshold = threshold.timestamp()
+        timestamps = {}
+
+        def test(c):
+            try:
+                ts = timestamps[c]
+            except KeyError:
+                ts = timestamps[c] = to_timestamp(c)
+            except TypeError:
+                ts = to_timestamp(c)
+            return ts is not None and compare(ts, threshold)
+        return test
+
+    def annotate(self, mask, annotations):
+        matched = {}
+        for k, m in annotations:
+            for idx in compress(range(len(m)), map(operator.and_, m, mask)):
+                matched.setdefault(idx, []).append(k)
+        for idx, keys in matched.items():
+            set_annotation(self.resources[idx], ANNOTATION_KEY, keys)
+
+
+def swap(op):
+    return lambda x, y: op(y, x)
+
+
+def to_timestamp(value):
+    try:
+        value = parse_date(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if value is None or not hasattr(value, 'timestamp'):
+        return None
+    return value.timestamp()
+
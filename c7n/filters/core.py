@@ -40,6 +40,17 @@ class FilterValidationError(Exception):
 # Matching filters annotate their key onto objects
 ANNOTATION_KEY = "c7n:MatchedFilters"
 
+# Unquoted jmespath identifier
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Sentinel values of value filters, checked before the operator
+SENTINEL_CHECKS = {
+    'absent': lambda r: r is None,
+    'present': lambda r: r is not None,
+    'not-null': lambda r: bool(r),
+    'empty': lambda r: not r,
+}
+
 
 def glob_match(value, pattern):
     if not isinstance(value, str):
@@ -197,6 +208,21 @@ class Filter(Element):
         """ Bulk process resources and return filtered set."""
         return list(filter(self, resources))
 
+    def get_plan(self):
+        """Return a plan for evaluating this filter within a compiled block.
+
+        See :meth:`BooleanGroupFilter.get_plan`, filters without plan support
+        return None.
+        """
+        return None
+
+    def needs_full_set(self):
+        """Whether the filter evaluates the whole resource set at once.
+
+        Such filters can't be applied to batches of resources.
+        """
+        return False
+
     def get_block_operator(self):
         """Determine the immediate parent boolean operator for a filter"""
         # Top level operator is `and`
@@ -309,6 +335,8 @@ def union_list(a, b):
 
 class BooleanGroupFilter(Filter):
 
+    _plan = None
+
     def __init__(self, data, registry, manager):
         super(BooleanGroupFilter, self).__init__(data)
         self.registry = registry
@@ -324,6 +352,46 @@ class BooleanGroupFilter(Filter):
         resource_type = self.manager.get_model()
         return resource_type.id
 
+    def get_plan(self):
+        """Compile the block into a single plan when all members support plans.
+
+        A plan takes a resource and returns the annotation keys to set on it
+        when it matches, or None when it doesn't.
+        """
+        if self._plan is False:
+            return None
+        if self._plan is None:
+            plans = self.manager and [
+                getattr(f, 'get_plan', lambda: None)() for f in self.filters]
+            if not plans or None in plans:
+                self._plan = False
+                return None
+            self._plan = self.compile_plan(plans)
+        return self._plan
+
+    def process_plan(self, plan, resources):
+        results = []
+        for r in resources:
+            keys = plan(r)
+            if keys is None:
+                continue
+            if keys:
+                set_annotation(r, ANNOTATION_KEY, keys)
+            results.append(r)
+        return results
+
+    @staticmethod
+    def compile_and_plan(plans):
+        def plan(r):
+            keys = []
+            for p in plans:
+                matched = p(r)
+                if matched is None:
+                    return None
+                keys.extend(matched)
+            return keys
+        return plan
+
     def __len__(self):
         return len(self.filters)
 
@@ -341,10 +409,24 @@ class BooleanGroupFilter(Filter):
 class Or(BooleanGroupFilter):
 
     def process(self, resources, event=None):
+        plan = self.get_plan()
+        if plan is not None:
+            return self.process_plan(plan, resources)
         if self.manager:
             return self.process_set(resources, event)
         return super(Or, self).process(resources, event)
 
+    def compile_plan(self, plans):
+        # all members are evaluated, as each annotates its matches.
+        def plan(r):
+            keys = None
+            for p in plans:
+                matched = p(r)
+                if matched is not None:
+                    keys = (keys or []) + matched
+            return keys
+        return plan
+
     def __call__(self, r):
         """Fallback for older unit tests that don't utilize a query manager"""
         for f in self.filters:
@@ -374,6 +456,9 @@ class Or(BooleanGroupFilter):
 class And(BooleanGroupFilter):
 
     def process(self, resources, events=None):
+        plan = self.get_plan()
+        if plan is not None:
+            return self.process_plan(plan, resources)
         if self.manager:
             sweeper = AnnotationSweeper(self.get_resource_type_id(), resources)
 
@@ -387,14 +472,30 @@ class And(BooleanGroupFilter):
 
         return resources
 
+    def compile_plan(self, plans):
+        return self.compile_and_plan(plans)
+
 
 class Not(BooleanGroupFilter):
 
     def process(self, resources, event=None):
+        plan = self.get_plan()
+        if plan is not None:
+            return self.process_plan(plan, resources)
         if self.manager:
             return self.process_set(resources, event)
         return super(Not, self).process(resources, event)
 
+    def compile_plan(self, plans):
+        and_plan = self.compile_and_plan(plans)
+
+        # annotations from within the block are always swept.
+        def plan(r):
+            if and_plan(r) is None:
+                return []
+            return None
+        return plan
+
     def __call__(self, r):
         """Fallback for older unit tests that don't utilize a query manager"""
 
@@ -484,6 +585,7 @@ class ValueFilter(BaseValueFilter):
     """Generic value filter using jmespath
     """
     op = v = vtype = None
+    plan = None
 
     schema = {
         'type': 'object',
@@ -507,6 +609,9 @@ class ValueFilter(BaseValueFilter):
     annotate = True
     required_keys = {'value', 'key'}
 
+    def needs_full_set(self):
+        return self.data.get('value_type') == 'resource_count'
+
     def _validate_resource_count(self):
         """ Specific validation for `resource_count` type
 
@@ -622,6 +727,8 @@ class ValueFilter(BaseValueFilter):
         return jmespath_search(self.data.get('value_path'),i)
 
     def match(self, i):
+        if self.plan is not None:
+            return self.plan(i)
         if self.v is None and len(self.data) == 1:
             [(self.k, self.v)] = self.data.items()
         elif self.v is None and not hasattr(self, 'content_initialized'):
@@ -640,6 +747,10 @@ class ValueFilter(BaseValueFilter):
         if i is None:
             return False
 
+        if self.is_compilable():
+            self.plan = self.compile()
+            return self.plan(i)
+
         # value extract
         r = self.get_resource_value(self.k, i)
         if self.op in ('in', 'not-in') and r is None:
@@ -671,6 +782,148 @@ class ValueFilter(BaseValueFilter):
 
         return False
 
+    def get_plan(self):
+        # only the generic value filter, subclasses may evaluate resources
+        # in other ways.
+        if type(self) is not ValueFilter or self.data.get('value_type') == 'resource_count':
+            return None
+
+        def plan(r):
+            if self.match(r):
+                return self.annotate and [self.k] or []
+            return None
+        return plan
+
+    def is_compilable(self):
+        klass = type(self)
+        return (klass.get_resource_value is ValueFilter.get_resource_value and
+                klass.process_value_type is ValueFilter.process_value_type and
+                isinstance(self.k, str))
+
+    def compile(self):
+        """Compile the filter into a plan, a function matching a single resource.
+
+        The key accessor, operator and value type conversion are resolved once,
+        rather than on each match.
+        """
+        getter = self.compile_accessor(self.k, self.data.get('value_regex'))
+        convert = self.compile_value_type(self.vtype, self.v)
+        empty = () if self.op in ('in', 'not-in') else None
+        op = self.op and OPERATORS[self.op]
+
+        def compare(r, v):
+            if op:
+                try:
+                    return op(r, v)
+                except TypeError:
+                    return False
+            return r == v
+
+        if convert is None:
+            # the value is constant, resolve the sentinel check up front.
+            v = self.v
+            sentinel = SENTINEL_CHECKS.get(v) if isinstance(v, str) else None
+
+            def plan(i):
+                if i is None:
+                    return False
+                r = getter(i)
+                if r is None:
+                    r = empty
+                if sentinel and sentinel(r):
+                    return True
+                return compare(r, v)
+            return plan
+
+        def plan(i):
+            if i is None:
+                return False
+            r = getter(i)
+            if r is None:
+                r = empty
+            v, r = convert(r, i)
+            if r is None and v == 'absent':
+                return True
+            elif r is not None and v == 'present':
+                return True
+            elif v == 'not-null' and r:
+                return True
+            elif v == 'empty' and not r:
+                return True
+            return compare(r, v)
+        return plan
+
+    def compile_accessor(self, k, regex=None):
+        """Return a function retrieving the value for key k from a resource."""
+        if k.startswith('tag:'):
+            tk = k.split(':', 1)[1]
+
+            def getter(i):
+                if 'Tags' in i:
+                    for t in i.get("Tags", []):
+                        if t.get('Key') == tk:
+                            return t.get('Value')
+                elif 'labels' in i:
+                    return i.get('labels', {}).get(tk, None)
+                elif 'tags' in i:
+                    return i.get('tags', {}).get(tk, None)
+                return None
+        elif all(IDENTIFIER.match(p) for p in k.split('.')):
+            # direct dotted accessor, equivalent to the jmespath expression.
+            path = k.split('.')
+
+            def getter(i):
+                if k in i:
+                    return i.get(k)
+                for p in path:
+                    if not isinstance(i, dict):
+                        return None
+                    i = i.get(p)
+                return i
+        else:
+            expr = self.expr
+
+            def getter(i):
+                if k in i:
+                    return i.get(k)
+                # compiled on first use, keys present on resources needn't parse.
+                if k not in expr:
+                    expr[k] = jmespath_compile(k)
+                return expr[k].search(i)
+
+        if regex:
+            value_regex = ValueRegex(regex)
+            key_getter = getter
+
+            def getter(i):
+                return value_regex.get_resource_value(key_getter(i))
+        return getter
+
+    def compile_value_type(self, vtype, sentinel):
+        """Return a value type conversion function, with the sentinel converted once.
+
+        Relative age and expiration sentinels are converted on each match,
+        as compiled filters may be long lived.
+        """
+        if vtype is None:
+            return None
+        if vtype == 'date':
+            sentinel = parse_date(sentinel)
+
+            def convert(r, i):
+                return sentinel, parse_date(r)
+            return convert
+        elif vtype == 'version':
+            sentinel = ComparableVersion(sentinel)
+
+            def convert(r, i):
+                return sentinel, ComparableVersion(r)
+            return convert
+
+        def convert(r, i):
+            return self.process_value_type(sentinel, r, i)
+        return convert
+
     def process_value_type(self, sentinel, value, resource):
         if self.vtype == 'normalize' and isinstance(value, str):
             return sentinel, value.strip().lower()
@@ -934,6 +1187,9 @@ class ReduceFilter(BaseValueFilter):
         self.group_by = self.get_sort_config('group-by')
         self.sort_by = self.get_sort_config('sort-by')
 
+    def needs_full_set(self):
+        return True
+
     def validate(self):
         # make sure the regexes compile
         if 'value_regex' in self.group_by:
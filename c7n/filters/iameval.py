@@ -0,0 +1,219 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""
+IAM Identity Policy Evaluator
+-----------------------------
+
+Evaluates whether principals are allowed to perform actions from the
+identity policies of an account, as an alternative to simulating each
+principal's policies with the iam policy simulator apis.
+
+The account's users, groups, roles and managed policies are loaded with
+a single authorization details sweep. For each action, statements of the
+principal's inline and managed policies (including those of a user's
+groups) and its permission boundary are evaluated per the iam evaluation
+logic, an explicit deny overrides an allow, and a permission boundary
+must also allow the action.
+
+Actions are evaluated against all resources, with wildcard matching of
+action names. An allow statement applies if it grants the action on any
+resource, while a deny statement applies only if it denies the action on
+all resources. Statements with conditions can't be evaluated without
+request context, as with the simulator they are not applied, and their
+condition keys are reported as missing context values.
+
+Organization service control policies and resource policies are not
+considered.
+
+References
+
+- IAM Policy Evaluation
+  https://docs.aws.amazon.com/IAM/latest/UserGuide/reference_policies_evaluation-logic.html
+"""
+import fnmatch
+import json
+import re
+from urllib.parse import unquote
+
+
+class PolicyEvaluator:
+    """Evaluate actions against a set of identity policy documents.
+
+    :param policies: sequence of (policy id, document) pairs
+    :param boundary: optional (policy id, document) permission boundary
+    """
+
+    def __init__(self, policies, boundary=None):
+        self.policies = [(pid, get_statements(doc)) for pid, doc in policies]
+        self.boundary = boundary and (boundary[0], get_statements(boundary[1])) or None
+
+    def evaluate(self, actions):
+        """Return simulator style evaluation results for the given actions."""
+        return [self.evaluate_action(a) for a in actions]
+
+    def evaluate_action(self, action):
+        missing = set()
+        allows, denies = self.match(self.policies, action, missing)
+        if self.boundary:
+            b_allows, b_denies = self.match([self.boundary], action, missing)
+            denies.extend(b_denies)
+
+        if denies:
+            decision, matched = 'explicitDeny', denies
+        elif allows and (not self.boundary or b_allows):
+            decision, matched = 'allowed', allows
+        else:
+            decision, matched = 'implicitDeny', []
+
+        result = {
+            'EvalActionName': action,
+            'EvalResourceName': '*',
+            'EvalDecision': decision,
+            'MatchedStatements': [{'SourcePolicyId': pid} for pid in matched],
+            'MissingContextValues': sorted(missing),
+        }
+        if self.boundary:
+            result['PermissionsBoundaryDecisionDetail'] = {
+                'AllowedByPermissionsBoundary': bool(b_allows) and not b_denies}
+        return result
+
+    def match(self, policies, action, missing):
+        """Return the ids of the policies with allow and deny statements for an action."""
+        allows, denies = [], []
+        for pid, statements in policies:
+            for s in statements:
+                if not match_action(s, action):
+                    continue
+                deny = s.get('Effect') == 'Deny'
+                if not match_resource(s, deny):
+                    continue
+                if s.get('Condition'):
+                    for op_conditions in s['Condition'].values():
+                        missing.update(op_conditions)
+                    continue
+                matched = denies if deny else allows
+                if pid not in matched:
+                    matched.append(pid)
+        return allows, denies
+
+
+class AccountAuthorization:
+    """Identity policies of an account's principals.
+
+    :param details: merged results of get_account_authorization_details
+    :param client: optional iam client, for fetching managed policies not
+      included in the details (ie. aws managed permission boundaries)
+    """
+
+    def __init__(self, details, client=None):
+        self.client = client
+        self.users = {u['Arn']: u for u in details.get('UserDetailList', ())}
+        self.roles = {r['Arn']: r for r in details.get('RoleDetailList', ())}
+        self.groups = {g['Arn']: g for g in details.get('GroupDetailList', ())}
+        self.group_names = {g['GroupName']: g for g in details.get('GroupDetailList', ())}
+        self.policies = {}
+        for p in details.get('Policies', ()):
+            for v in p.get('PolicyVersionList', ()):
+                if v.get('IsDefaultVersion'):
+                    self.policies[p['Arn']] = v['Document']
+
+    @staticmethod
+    def get_details(client):
+        details = {}
+        paginator = client.get_paginator('get_account_authorization_details')
+        for page in paginator.paginate():
+            for k, v in page.items():
+                if k.endswith('List') or k == 'Policies':
+                    details.setdefault(k, []).extend(v)
+        return details
+
+    def get_evaluator(self, arn, boundaries=True):
+        """Return an evaluator of a principal's policies, or None if not found."""
+        if arn in self.users:
+            principal = self.users[arn]
+            policies = self.get_policies(principal, 'UserPolicyList')
+            for g in principal.get('GroupList', ()):
+                if g in self.group_names:
+                    policies.extend(
+                        self.get_policies(self.group_names[g], 'GroupPolicyList'))
+        elif arn in self.roles:
+            principal = self.roles[arn]
+            policies = self.get_policies(principal, 'RolePolicyList')
+        elif arn in self.groups:
+            principal = self.groups[arn]
+            policies = self.get_policies(principal, 'GroupPolicyList')
+        else:
+            return None
+
+        boundary = None
+        boundary_arn = principal.get(
+            'PermissionsBoundary', {}).get('PermissionsBoundaryArn')
+        if boundaries and boundary_arn:
+            boundary = (boundary_arn, self.get_policy(boundary_arn) or {})
+        return PolicyEvaluator(policies, boundary)
+
+    def get_policies(self, principal, inline_key):
+        policies = [
+            (p['PolicyName'], p['PolicyDocument'])
+            for p in principal.get(inline_key, ())]
+        for p in principal.get('AttachedManagedPolicies', ()):
+            document = self.get_policy(p['PolicyArn'])
+            if document is not None:
+                policies.append((p['PolicyArn'], document))
+        return policies
+
+    def get_policy(self, arn):
+        """Return the default version document of a managed policy."""
+        if arn not in self.policies and self.client is not None:
+            try:
+                version_id = self.client.get_policy(
+                    PolicyArn=arn)['Policy']['DefaultVersionId']
+                self.policies[arn] = self.client.get_policy_version(
+                    PolicyArn=arn, VersionId=version_id)['PolicyVersion']['Document']
+            except self.client.exceptions.NoSuchEntityException:
+                self.policies[arn] = None
+        return self.policies.get(arn)
+
+
+def get_statements(document):
+    if isinstance(document, str):
+        document = json.loads(unquote(document))
+    statements = document.get('Statement', ())
+    if isinstance(statements, dict):
+        statements = [statements]
+    return statements
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return value
+
+
+def match_pattern(pattern, value):
+    return re.match(
+        fnmatch.translate(pattern.lower()), value.lower()) is not None
+
+
+def match_action(statement, action):
+    if 'NotAction' in statement:
+        return not any(match_pattern(p, action) for p in as_list(statement['NotAction']))
+    return any(match_pattern(p, action) for p in as_list(statement.get('Action')))
+
+
+def match_resource(statement, deny):
+    """Whether a statement applies to the action across resources.
+
+    Allows apply if they grant any resource, denies only if they cover all.
+    """
+    if 'NotResource' in statement:
+        excludes = as_list(statement['NotResource'])
+        if deny:
+            return not excludes
+        return '*' not in excludes
+    resources = as_list(statement.get('Resource'))
+    if deny:
+        return '*' in resources
+    return bool(resources)
@@ -47,20 +47,13 @@ class KmsRelatedFilter(RelatedResourceFilter):
     AnnotationKey = "matched-kms-key"
 
     def get_related(self, resources):
-        resource_manager = self.get_resource_manager()
-        related_ids = self.get_related_ids(resources)
-        if len(related_ids) < self.FetchThreshold:
-            related = resource_manager.get_resources(list(related_ids))
-        else:
-            related = resource_manager.resources()
-        related_map = {}
-
-        for r in related:
+        related_map = super().get_related(resources)
+
+        for r in related_map.values():
             # `AliasNames` is set when we fetch keys, but only for keys
             # which have aliases defined. Fall back to an empty string
             # to avoid lookup errors in filters.
             r['c7n:AliasName'] = r.get('AliasNames', ('',))[0]
-            related_map[r['KeyId']] = r
 
         return related_map
 
@@ -78,8 +71,7 @@ class KmsRelatedFilter(RelatedResourceFilter):
 
     def process(self, resources, event=None):
         self.alias_to_id = self.key_alias_to_key_id()
-        related = self.get_related(resources)
-        return [r for r in resources if self.process_resource(r, related)]
+        return super().process(resources, event)
 
     def key_alias_to_key_id(self):
         # convert key alias to key id for cache lookup
@@ -9,6 +9,8 @@ from collections import namedtuple
 from concurrent.futures import as_completed
 from datetime import datetime, timedelta
 
+from dateutil.tz import tzutc
+
 from c7n.exceptions import PolicyValidationError
 from c7n.filters.core import Filter, OPERATORS
 from c7n.utils import local_session, type_schema, chunks
@@ -67,6 +69,16 @@ class MetricsFilter(Filter):
     policy to treat their request counts as 0.
 
     Note the default statistic for metrics is Average.
+
+    For larger resource sets, metrics are retrieved for up to 500 resources
+    at a time with GetMetricData rather than a GetMetricStatistics call per
+    resource.
+
+    When a cache is configured, retrieved datapoints are cached per
+    query for reuse by later policies and runs, for the length of the
+    metric window up to the cache period. Where the cached window
+    overlaps the current one on the same period boundaries, only the
+    more recent datapoints are retrieved.
     """
 
     schema = type_schema(
@@ -88,11 +100,16 @@ class MetricsFilter(Filter):
            'missing-value': {'type': 'number'},
            'required': ('value', 'name')})
     schema_alias = True
-    permissions = ("cloudwatch:GetMetricStatistics",)
+    permissions = ("cloudwatch:GetMetricStatistics", "cloudwatch:GetMetricData")
 
     MAX_QUERY_POINTS = 50850
     MAX_RESULT_POINTS = 1440
 
+    # GetMetricData queries per request
+    MAX_DATA_QUERIES = 500
+    # at or above this number of resources, batch metric queries with GetMetricData
+    BATCH_THRESHOLD = 100
+
     # Default per service, for overloaded services like ec2
     # we do type specific default namespace annotation
     # specifically AWS/EBS and AWS/EC2Spot
@@ -132,6 +149,7 @@ class MetricsFilter(Filter):
     def __init__(self, data, manager=None):
         super(MetricsFilter, self).__init__(data, manager)
         self.days = self.data.get('days', 14)
+        self.resume = {}
 
     def validate(self):
         stats = self.data.get('statistics', 'Average')
@@ -193,12 +211,20 @@ class MetricsFilter(Filter):
         self.namespace = ns
 
         self.log.debug("Querying metrics for %d", len(resources))
+        if len(resources) >= self.BATCH_THRESHOLD:
+            process_set, size = self.process_resource_batch, self.MAX_DATA_QUERIES
+        else:
+            process_set, size = self.process_resource_set, 50
+
+        with self.manager.get_cache() as cache:
+            query_keys = self.resume_cached_metrics(cache, resources)
+
         matched = []
         with self.executor_factory(max_workers=3) as w:
             futures = []
-            for resource_set in chunks(resources, 50):
+            for resource_set in chunks(resources, size):
                 futures.append(
-                    w.submit(self.process_resource_set, resource_set))
+                    w.submit(process_set, resource_set))
 
             for f in as_completed(futures):
                 if f.exception():
@@ -206,8 +232,98 @@ class MetricsFilter(Filter):
                         "CW Retrieval error: %s" % f.exception())
                     continue
                 matched.extend(f.result())
+
+        with self.manager.get_cache() as cache:
+            self.save_cached_metrics(cache, resources, query_keys)
         return matched
 
+    def get_query_key(self, dimensions):
+        return {
+            # dimension values (ie. queue or function names) repeat
+            # across accounts and regions.
+            'account': self.manager.config.account_id,
+            'region': self.manager.config.region,
+            'metric': '%s.%s' % (self.namespace, self.metric),
+            'dimensions': sorted((d['Name'], d['Value']) for d in dimensions),
+            'statistic': self.statistics,
+            'period': self.period}
+
+    def resume_cached_metrics(self, cache, resources):
+        """Reuse datapoints of earlier queries from the resource cache.
+
+        Cache entries are keyed by the query less its window and record
+        the window datapoints were retrieved for. Where a cached window
+        overlaps the current one, only the range after it needs to be
+        retrieved. Cached windows are only resumed when the current window
+        starts on one of their period boundaries, and only their datapoints
+        within the current window are reused. The last cached period,
+        partial when the cached window ended mid period, is always
+        retrieved again.
+
+        Returns the query key of each resource whose metrics are retrieved.
+        """
+        self.resume = {}
+        query_keys = {}
+        key = self.get_metric_key()
+        for r in resources:
+            try:
+                if key in r.get('c7n.metrics', ()):
+                    continue
+                query_keys[id(r)] = self.get_query_key(self.get_metric_dimensions(r))
+            except Exception:
+                # errors surface when the resource's metrics are retrieved.
+                continue
+
+        pending = [r for r in resources if id(r) in query_keys]
+        entries = cache.get_many([query_keys[id(r)] for r in pending])
+        for r, entry in zip(pending, entries):
+            start, datapoints = self.get_resume_point(entry)
+            if start >= self.end:
+                r.setdefault('c7n.metrics', {})[key] = datapoints
+                del query_keys[id(r)]
+                continue
+            if datapoints:
+                self.resume[id(r)] = (start, datapoints)
+        return query_keys
+
+    def get_resume_point(self, entry):
+        """Return where to start retrieving datapoints and the cached ones before it."""
+        if not entry:
+            return self.start, []
+        period = timedelta(seconds=self.period)
+        start, end = entry['start'], entry['end']
+        if start > self.start or end <= self.start or end > self.end:
+            return self.start, []
+        # datapoints on other period boundaries aggregate other time ranges
+        if (self.start - start) % period:
+            return self.start, []
+        resume = end
+        if end != self.end:
+            # the start of the last cached period
+            resume = start + (end - start - timedelta(microseconds=1)) // period * period
+        if resume <= self.start:
+            return self.start, []
+        window = utc_timestamp(self.start), utc_timestamp(resume)
+        return resume, [d for d in entry['datapoints']
+                        if window[0] <= utc_timestamp(d['Timestamp']) < window[1]]
+
+    def save_cached_metrics(self, cache, resources, query_keys):
+        key = self.get_metric_key()
+        # entries are reusable until their window no longer overlaps, and
+        # are kept no longer than the cache period.
+        retention = min(
+            self.end - self.start, timedelta(minutes=self.manager.config.cache_period))
+        cache.save_many([
+            (query_keys[id(r)], {
+                'start': self.start,
+                'end': self.end,
+                # fill values for missing data aren't datapoints.
+                'datapoints': [
+                    d for d in r['c7n.metrics'][key] if 'c7n:detail' not in d]})
+            for r in resources
+            if id(r) in query_keys and key in r.get('c7n.metrics', ())],
+            retention=retention)
+
     def get_dimensions(self, resource):
         return [{'Name': self.model.dimension,
                  'Value': resource[self.model.dimension]}]
@@ -220,25 +336,30 @@ class MetricsFilter(Filter):
             dims.append({'Name': k, 'Value': v})
         return dims
 
+    def get_metric_dimensions(self, resource):
+        # if we overload dimensions with multiple resources we get
+        # the statistics/average over those resources.
+        dimensions = self.get_dimensions(resource)
+        # Merge in any filter specified metrics, get_dimensions is
+        # commonly overridden so we can't do it there.
+        dimensions.extend(self.get_user_dimensions())
+        return dimensions
+
+    def get_metric_key(self):
+        # Note this annotation cache is policy scoped, not across
+        # policies, still the lack of full qualification on the key
+        # means multiple filters within a policy using the same metric
+        # across different periods or dimensions would be problematic.
+        return "%s.%s.%s.%s" % (self.namespace, self.metric, self.statistics, str(self.days))
+
     def process_resource_set(self, resource_set):
         client = local_session(
             self.manager.session_factory).client('cloudwatch')
 
         matched = []
+        key = self.get_metric_key()
         for r in resource_set:
-            # if we overload dimensions with multiple resources we get
-            # the statistics/average over those resources.
-            dimensions = self.get_dimensions(r)
-            # Merge in any filter specified metrics, get_dimensions is
-            # commonly overridden so we can't do it there.
-            dimensions.extend(self.get_user_dimensions())
-
             collected_metrics = r.setdefault('c7n.metrics', {})
-            # Note this annotation cache is policy scoped, not across
-            # policies, still the lack of full qualification on the key
-            # means multiple filters within a policy using the same metric
-            # across different periods or dimensions would be problematic.
-            key = "%s.%s.%s.%s" % (self.namespace, self.metric, self.statistics, str(self.days))
 
             params = dict(
                 Namespace=self.namespace,
@@ -246,7 +367,7 @@ class MetricsFilter(Filter):
                 StartTime=self.start,
                 EndTime=self.end,
                 Period=self.period,
-                Dimensions=dimensions
+                Dimensions=self.get_metric_dimensions(r)
             )
 
             stats_key = (self.statistics in self.standard_stats
@@ -254,44 +375,106 @@ class MetricsFilter(Filter):
             params[stats_key] = [self.statistics]
 
             if key not in collected_metrics:
-                collected_metrics[key] = client.get_metric_statistics(
+                params['StartTime'], datapoints = self.resume.get(id(r), (self.start, []))
+                collected_metrics[key] = datapoints + client.get_metric_statistics(
                     **params)['Datapoints']
 
-            # In certain cases CloudWatch reports no data for a metric.
-            # If the policy specifies a fill value for missing data, add
-            # that here before testing for matches. Otherwise, skip
-            # matching entirely.
-            if len(collected_metrics[key]) == 0:
-                if 'missing-value' not in self.data:
-                    continue
-                collected_metrics[key].append({
-                    'Timestamp': self.start,
-                    self.statistics: self.data['missing-value'],
-                    'c7n:detail': 'Fill value for missing data'
-                })
-
-            if self.data.get('percent-attr'):
-                rvalue = r[self.data.get('percent-attr')]
-                if self.data.get('attr-multiplier'):
-                    rvalue = rvalue * self.data['attr-multiplier']
-                all_meet_condition = True
-                for data_point in collected_metrics[key]:
-                    percent = (data_point[self.statistics] / rvalue * 100)
-                    if not self.op(percent, self.value):
-                        all_meet_condition = False
-                        break
-                if all_meet_condition:
-                    matched.append(r)
-            else:
-                all_meet_condition = True
-                for data_point in collected_metrics[key]:
-                    if not self.op(data_point[self.statistics], self.value):
-                        all_meet_condition = False
-                        break
-                if all_meet_condition:
-                    matched.append(r)
+            if self.match_datapoints(r, collected_metrics[key]):
+                matched.append(r)
         return matched
 
+    def process_resource_batch(self, resource_set):
+        """Retrieve metrics for up to MAX_DATA_QUERIES resources per GetMetricData call.
+
+        Datapoints are annotated in the same form as GetMetricStatistics returns them.
+        """
+        client = local_session(
+            self.manager.session_factory).client('cloudwatch')
+
+        key = self.get_metric_key()
+        # queries by the start of the range to retrieve
+        queries, datapoints = {}, {}
+        for idx, r in enumerate(resource_set):
+            if key in r.setdefault('c7n.metrics', {}):
+                continue
+            start, datapoints['m%d' % idx] = self.resume.get(id(r), (self.start, []))
+            queries.setdefault(start, {})['m%d' % idx] = {
+                'Id': 'm%d' % idx,
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': self.namespace,
+                        'MetricName': self.metric,
+                        'Dimensions': self.get_metric_dimensions(r)},
+                    'Period': self.period,
+                    'Stat': self.statistics},
+                'ReturnData': True}
+
+        paginator = client.get_paginator('get_metric_data')
+        for start, start_queries in queries.items():
+            for page in paginator.paginate(
+                    MetricDataQueries=list(start_queries.values()),
+                    StartTime=start,
+                    EndTime=self.end):
+                for result in page['MetricDataResults']:
+                    datapoints[result['Id']] = datapoints[result['Id']] + [
+                        self.get_datapoint(ts, v) for ts, v in zip(
+                            result['Timestamps'], result['Values'])]
+
+        matched = []
+        for idx, r in enumerate(resource_set):
+            collected_metrics = r['c7n.metrics']
+            if 'm%d' % idx in datapoints:
+                collected_metrics[key] = datapoints['m%d' % idx]
+            if self.match_datapoints(r, collected_metrics[key]):
+                matched.append(r)
+        return matched
+
+    def get_datapoint(self, timestamp, value):
+        if self.statistics in self.standard_stats:
+            return {'Timestamp': timestamp, self.statistics: value}
+        return {'Timestamp': timestamp, 'ExtendedStatistics': {self.statistics: value}}
+
+    def get_datapoint_value(self, data_point):
+        if 'ExtendedStatistics' in data_point:
+            return data_point['ExtendedStatistics'][self.statistics]
+        return data_point[self.statistics]
+
+    def match_datapoints(self, r, datapoints):
+        # In certain cases CloudWatch reports no data for a metric.
+        # If the policy specifies a fill value for missing data, add
+        # that here before testing for matches. Otherwise, skip
+        # matching entirely.
+        if len(datapoints) == 0:
+            if 'missing-value' not in self.data:
+                return False
+            datapoints.append({
+                'Timestamp': self.start,
+                self.statistics: self.data['missing-value'],
+                'c7n:detail': 'Fill value for missing data'
+            })
+
+        if self.data.get('percent-attr'):
+            rvalue = r[self.data.get('percent-attr')]
+            if self.data.get('attr-multiplier'):
+                rvalue = rvalue * self.data['attr-multiplier']
+            for data_point in datapoints:
+                percent = (self.get_datapoint_value(data_point) / rvalue * 100)
+                if not self.op(percent, self.value):
+                    return False
+            return True
+
+        for data_point in datapoints:
+            if not self.op(self.get_datapoint_value(data_point), self.value):
+                return False
+        return True
+
+
+def utc_timestamp(timestamp):
+    # metric windows are naive utc datetimes.
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(tzutc()).replace(tzinfo=None)
+    return timestamp
+
 
 class ShieldMetrics(MetricsFilter):
     """Specialized metrics filter for shield
@@ -0,0 +1,62 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Resource reference graph for usage filters.
+
+Usage filters (ie. unused security groups, images, snapshots, key pairs)
+determine which resources are in use by scanning the resource types that
+can reference them. The graph records the referenced ids for each edge,
+named by target and source resource type ie. ``('security-group', 'eni')``,
+the first time the edge is requested within a policy execution, so
+filters share them rather than each scanning the source resources.
+
+Edges are also kept in the resource cache, so subsequent policies of a
+run within the cache period reuse them.
+"""
+
+
+class ReferenceGraph:
+    """Referenced resource ids by edge within a policy execution."""
+
+    def __init__(self):
+        self.edges = {}
+
+    def get_referenced(self, manager, edge, scanner):
+        """Return the set of ids referenced by the edge's source resources.
+
+        The scanner is only called when the edge isn't yet known to the
+        execution or the resource cache.
+        """
+        refs = self.edges.get(edge)
+        if refs is not None:
+            return refs
+
+        cache_key = self.get_cache_key(manager, edge)
+        with manager._cache:
+            refs = manager._cache.get(cache_key)
+        if refs is None:
+            refs = frozenset(scanner())
+            with manager._cache:
+                manager._cache.save(cache_key, refs)
+        self.edges[edge] = refs
+        return refs
+
+    @staticmethod
+    def get_cache_key(manager, edge):
+        return {
+            'account': manager.config.account_id,
+            'region': manager.config.region,
+            'references': ':'.join(edge),
+        }
+
+
+def get_reference_graph(ctx):
+    """Return the reference graph of the execution context."""
+    graph = getattr(ctx, 'reference_graph', None)
+    if graph is None:
+        graph = ctx.reference_graph = ReferenceGraph()
+    return graph
+
+
+def get_referenced(manager, edge, scanner):
+    """Return the ids referenced by an edge of the execution's reference graph."""
+    return get_reference_graph(manager.ctx).get_referenced(manager, edge, scanner)
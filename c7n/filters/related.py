@@ -5,7 +5,65 @@ from functools import lru_cache
 
 from .core import ValueFilter, OPERATORS
 from c7n.query import ChildResourceQuery
-from c7n.utils import jmespath_search
+from c7n.utils import jmespath_compile, jmespath_search
+
+
+class RelatedResourceIndex:
+    """Related resources retrieved within a policy execution.
+
+    Shared across the related filters of an execution context, so each
+    related resource type is fetched once per account and region.
+    """
+
+    def __init__(self):
+        self.related = {}
+        self.populations = {}
+
+    @staticmethod
+    def get_key(resource_manager):
+        return (
+            resource_manager.__class__,
+            resource_manager.config.account_id,
+            resource_manager.config.region)
+
+    def get_resources(self, resource_manager):
+        """Return the full population of the related resource type."""
+        key = self.get_key(resource_manager)
+        if key not in self.populations:
+            self.populations[key] = resource_manager.resources() or []
+            model = resource_manager.get_model()
+            self.related.setdefault(key, {}).update(
+                {r[model.id]: r for r in self.populations[key]})
+        return self.populations[key]
+
+    def get_related(self, resource_manager, related_ids, fetch_threshold):
+        """Return a map of the given ids to their related resources.
+
+        Ids not yet seen are fetched individually below the fetch threshold,
+        else the full population is fetched.
+        """
+        key = self.get_key(resource_manager)
+        related = self.related.setdefault(key, {})
+        missing = [rid for rid in related_ids if rid not in related]
+        if missing and key not in self.populations:
+            if len(missing) < fetch_threshold:
+                model = resource_manager.get_model()
+                related.update(
+                    {r[model.id]: r for r in resource_manager.get_resources(missing) or ()})
+            else:
+                self.get_resources(resource_manager)
+            # remember ids that don't resolve to avoid refetching them.
+            for rid in missing:
+                related.setdefault(rid, None)
+        return {rid: related[rid] for rid in related_ids if related.get(rid) is not None}
+
+
+def get_related_index(ctx):
+    """Return the related resource index of the execution context."""
+    index = getattr(ctx, 'related_index', None)
+    if index is None:
+        index = ctx.related_index = RelatedResourceIndex()
+    return index
 
 
 class RelatedResourceFilter(ValueFilter):
@@ -17,6 +75,9 @@ class RelatedResourceFilter(ValueFilter):
     AnnotationKey = None
     FetchThreshold = 10
 
+    # related ids by resource, while processing a resource set
+    resource_related_ids = None
+
     def get_permissions(self):
         return self.get_resource_manager().get_permissions()
 
@@ -35,23 +96,38 @@ class RelatedResourceFilter(ValueFilter):
         return super(RelatedResourceFilter, self).validate()
 
     def get_related_ids(self, resources):
-        return set(jmespath_search(
-            "[].%s" % self.RelatedIdsExpression, resources))
+        if len(resources) == 1 and self.resource_related_ids:
+            # per resource lookups following a pass over the resource set
+            r, related_ids = self.resource_related_ids.get(id(resources[0]), (None, ()))
+            if r is resources[0]:
+                return set(related_ids)
+        related_ids = self.get_resource_related_ids(resources)
+        self.resource_related_ids = {
+            id(r): (r, ids) for r, ids in zip(resources, related_ids)}
+        return set().union(*related_ids)
+
+    def get_resource_related_ids(self, resources):
+        """Return the related ids of each resource, in a single search."""
+        # a multi-select keeps the ids of each resource apart, where
+        # projections in the expression would otherwise flatten them.
+        search = jmespath_compile("[].[%s]" % self.RelatedIdsExpression).search
+        related_ids = []
+        for (rids,) in search(resources) or ():
+            if rids is None:
+                rids = ()
+            elif not isinstance(rids, list):
+                rids = (rids,)
+            related_ids.append({rid for rid in rids if rid is not None})
+        return related_ids
 
     def get_related(self, resources):
-        resource_manager = self.get_resource_manager()
-        related_ids = self.get_related_ids(resources)
-        model = resource_manager.get_model()
-        if len(related_ids) < self.FetchThreshold:
-            related = resource_manager.get_resources(list(related_ids))
-        else:
-            related = resource_manager.resources()
-
-        if related is None:
-            return {}
+        return self.get_related_index().get_related(
+            self.get_resource_manager(),
+            self.get_related_ids(resources),
+            self.FetchThreshold)
 
-        return {r[model.id]: r for r in related
-                if r[model.id] in related_ids}
+    def get_related_index(self):
+        return get_related_index(self.manager.ctx)
 
     @lru_cache(maxsize=None)
     def get_resource_manager(self):
@@ -111,7 +187,10 @@ class RelatedResourceFilter(ValueFilter):
 
     def process(self, resources, event=None):
         related = self.get_related(resources)
-        return [r for r in resources if self.process_resource(r, related)]
+        try:
+            return [r for r in resources if self.process_resource(r, related)]
+        finally:
+            self.resource_related_ids = None
 
 
 class RelatedResourceByIdFilter(RelatedResourceFilter):
@@ -127,7 +206,7 @@ class RelatedResourceByIdFilter(RelatedResourceFilter):
         related_ids = self.get_related_ids(resources)
 
         related = {}
-        for r in resource_manager.resources():
+        for r in self.get_related_index().get_resources(resource_manager):
             matched_vpc = self.get_related_by_ids(r) & related_ids
             if matched_vpc:
                 for vpc in matched_vpc:
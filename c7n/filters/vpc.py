@@ -95,15 +95,14 @@ class SubnetFilter(MatchResourceValidator, RelatedResourceFilter):
         return super().match(related)
 
     def process(self, resources, event=None):
-        related = self.get_related(resources)
         if self.check_igw in [True, False]:
             self.route_tables = self.get_route_tables()
-        return [r for r in resources if self.process_resource(r, related)]
+        return super().process(resources, event)
 
     def get_route_tables(self):
         rmanager = self.manager.get_resource_manager('aws.route-table')
         route_tables = {}
-        for r in rmanager.resources():
+        for r in self.get_related_index().get_resources(rmanager):
             for a in r['Associations']:
                 if a['Main']:
                     route_tables[r['VpcId']] = r
@@ -57,6 +57,9 @@ class ResourceManager:
             self.actions = self.action_registry.parse(
                 self.data.get('actions', []), self)
 
+    def get_cache(self):
+        return self._cache
+
     def format_json(self, resources, fh):
         return dumps(resources, fh, indent=2)
 
@@ -99,6 +102,9 @@ class ResourceManager:
         return klass(self.ctx, data or {})
 
     def filter_resources(self, resources, event=None):
+        # deferred, the filters package depends on this module
+        from c7n.filters import columnar
+
         original = len(resources)
         if event and event.get('debug', False):
             self.log.info(
@@ -109,7 +115,10 @@ class ResourceManager:
             rcount = len(resources)
 
             with self.ctx.tracer.subsegment("filter:%s" % f.type):
-                resources = f.process(resources, event)
+                if columnar.is_enabled(self.config, resources) and columnar.supports(f):
+                    resources = columnar.process(f, resources)
+                else:
+                    resources = f.process(resources, event)
 
             if event and event.get('debug', False):
                 self.log.debug(
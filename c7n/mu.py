@@ -6,14 +6,19 @@ Cloud Custodian Lambda Provisioning Support
 docs/lambda.rst
 """
 import abc
+import ast
 import base64
+import functools
 import hashlib
 import importlib
+import importlib.util
 import io
 import json
 import logging
 import os
+import py_compile
 import shutil
+import sys
 import time
 import tempfile
 import zipfile
@@ -35,6 +40,7 @@ except ImportError:
 # Static event mapping to help simplify cwe rules creation
 from c7n.exceptions import ClientError
 from c7n.cwe import CloudWatchEvents
+from c7n.structure import StructureParser
 from c7n.utils import parse_s3, local_session, get_retry, merge_dict
 
 log = logging.getLogger('custodian.serverless')
@@ -66,7 +72,7 @@ class PythonPackageArchive:
 
     zip_compression = zipfile.ZIP_DEFLATED
 
-    def __init__(self, modules=(), cache_file=None):
+    def __init__(self, modules=(), cache_file=None, ignore=None, bytecode=False):
         self._temp_archive_file = tempfile.NamedTemporaryFile(delete=False)
         if cache_file:
             with open(cache_file, 'rb') as fin:
@@ -76,7 +82,9 @@ class PythonPackageArchive:
             self._temp_archive_file, mode='a',
             compression=self.zip_compression)
         self._closed = False
-        self.add_modules(None, modules)
+        # also add bytecode for the running interpreter alongside module sources
+        self.bytecode = bytecode
+        self.add_modules(ignore, modules)
 
     def __del__(self):
         try:
@@ -153,7 +161,7 @@ class PythonPackageArchive:
                     raise ValueError(
                         'We need a *.py source file instead of ' + path)
 
-                self.add_file(path)
+                self.add_source(path)
 
     def add_directory(self, path, ignore=None):
         """Add ``*.py`` files under the directory ``path`` to the archive.
@@ -174,7 +182,22 @@ class PythonPackageArchive:
                     continue
                 f_path = os.path.join(root, f)
 
-                self.add_file(f_path, dest_path)
+                if f.endswith('.py'):
+                    self.add_source(f_path, dest_path)
+                else:
+                    self.add_file(f_path, dest_path)
+
+    def add_source(self, src, dest=None):
+        """Add a python source file, along with its bytecode if enabled.
+
+        Lambda extracts the archive to a read only directory, so without
+        bytecode in the archive modules are compiled on every cold start.
+        """
+        dest = dest or os.path.basename(src)
+        self.add_file(src, dest)
+        if self.bytecode:
+            self.add_contents(
+                importlib.util.cache_from_source(dest), compile_bytecode(src, dest))
 
     def add_file(self, src, dest=None):
         """Add the file at ``src`` to the archive.
@@ -340,12 +363,152 @@ def _package_deps(package, deps=None, ignore=()):
     return deps
 
 
-def custodian_archive(packages=None):
+# compiled module bytecode by source path, modification time and archive path
+_bytecode_cache = {}
+
+
+def compile_bytecode(src, dest):
+    """Compile a python source file to bytecode for the running interpreter.
+
+    Hash based bytecode that isn't checked against the source is used, as
+    archive timestamps aren't meaningful, which also keeps archive checksums
+    stable across builds.
+    """
+    key = (src, os.stat(src).st_mtime_ns, dest)
+    if key not in _bytecode_cache:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cfile = os.path.join(tmp_dir, 'module.pyc')
+            py_compile.compile(
+                src, cfile=cfile, dfile=dest, doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            with open(cfile, 'rb') as fh:
+                _bytecode_cache[key] = fh.read()
+    return _bytecode_cache[key]
+
+
+# resource modules that are always loaded along with the aws provider
+BASE_RESOURCE_MODULES = (
+    'c7n.resources', 'c7n.resources.aws', 'c7n.resources.resource_map',
+    'c7n.resources.securityhub', 'c7n.resources.sfn', 'c7n.resources.ssm')
+
+
+def get_resource_modules(resource_types, policy_data=None):
+    """Resolve the aws resource modules needed for the given resource types.
+
+    Starting from the resource types' modules, the modules of the core
+    package and the policy data, modules are followed through their
+    imports and any string referencing a resource type or a resource
+    module (ie. related resource filters), erring on the side of including
+    a module.
+    """
+    resources_dir, type_modules = _get_resource_type_modules()
+    pending = set(BASE_RESOURCE_MODULES)
+    pending.update(type_modules[r] for r in resource_types if r in type_modules)
+    pending.update(_get_core_references())
+    if policy_data is not None:
+        pending.update(filter(None, (
+            _get_referenced(v) for v in iter_strings(policy_data))))
+
+    modules = set()
+    while pending:
+        module = pending.pop()
+        if module in modules:
+            continue
+        modules.add(module)
+        # the resource map references every resource type
+        if module == 'c7n.resources.resource_map':
+            continue
+        path = module == 'c7n.resources' and '__init__' or module.rsplit('.', 1)[1]
+        pending.update(_get_module_references(
+            os.path.join(resources_dir, path + '.py'), 'c7n.resources') - modules)
+    return modules
+
+
+@functools.lru_cache(maxsize=None)
+def _get_resource_type_modules():
+    from c7n.resources.resource_map import ResourceMap
+
+    resources_dir = os.path.dirname(importlib.import_module('c7n.resources').__file__)
+    type_modules = {}
+    for rtype, rclass in ResourceMap.items():
+        rmodule = rclass.rsplit('.', 1)[0]
+        type_modules[rtype] = rmodule
+        type_modules.setdefault(rtype.split('.', 1)[1], rmodule)
+    return resources_dir, type_modules
+
+
+def _get_referenced(value):
+    """Return the resource module referenced by a resource type or module path."""
+    resources_dir, type_modules = _get_resource_type_modules()
+    if value in type_modules:
+        return type_modules[value]
+    if value.startswith('c7n.resources.'):
+        module = value.split('.')[2]
+        if os.path.isfile(os.path.join(resources_dir, module + '.py')):
+            return 'c7n.resources.' + module
+
+
+@functools.lru_cache(maxsize=None)
+def _get_module_references(path, package):
+    with open(path, 'rb') as fh:
+        tree = ast.parse(fh.read(), path)
+    refs = set()
+    for node in ast.walk(tree):
+        names = ()
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parts = package.split('.')
+                base = '.'.join(parts[:len(parts) - node.level + 1] + [base]).rstrip('.')
+            names = [base] + ['%s.%s' % (base, a.name) for a in node.names]
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            names = [node.value]
+        refs.update(filter(None, map(_get_referenced, names)))
+    return frozenset(refs)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_core_references():
+    """Resource modules referenced by the modules outside of c7n.resources."""
+    resources_dir, _ = _get_resource_type_modules()
+    package_dir = os.path.dirname(resources_dir)
+    refs = set()
+    for root, dirs, files in os.walk(package_dir):
+        if root == resources_dir:
+            continue
+        package = '.'.join(
+            ['c7n'] + os.path.relpath(root, package_dir).split(os.sep)).rstrip('.')
+        for f in files:
+            if f.endswith('.py'):
+                refs.update(_get_module_references(os.path.join(root, f), package))
+    return frozenset(refs)
+
+
+def iter_strings(data):
+    if isinstance(data, str):
+        yield data
+    elif isinstance(data, dict):
+        for k, v in data.items():
+            yield k
+            yield from iter_strings(v)
+    elif isinstance(data, (list, tuple)):
+        for v in data:
+            yield from iter_strings(v)
+
+
+def custodian_archive(packages=None, resource_types=None, policy_data=None, bytecode=False):
     """Create a lambda code archive for running custodian.
 
     Lambda archive currently always includes `c7n`.  Add additional
     packages via function parameters, or in policy via mode block.
 
+    If resource types are given, only the aws resource modules needed
+    for them are included, see :func:`get_resource_modules`. With
+    bytecode, precompiled bytecode for the running interpreter is
+    included, which should match the lambda runtime.
+
     Example policy that includes additional packages
 
     .. code-block:: yaml
@@ -363,7 +526,22 @@ def custodian_archive(packages=None):
     modules = {'c7n'}
     if packages:
         modules = filter(None, modules.union(packages))
-    return PythonPackageArchive(sorted(modules))
+    ignore = None
+    if resource_types:
+        ignore = get_resource_module_filter(
+            get_resource_modules(resource_types, policy_data))
+    return PythonPackageArchive(sorted(modules), ignore=ignore, bytecode=bytecode)
+
+
+def get_resource_module_filter(resource_modules):
+    """Return an archive path filter excluding the other aws resource modules."""
+    prefix = os.path.join('c7n', 'resources', '')
+    keep = {os.path.join(*m.split('.')) + '.py' for m in resource_modules}
+    keep.add(prefix + '__init__.py')
+
+    def ignore(path):
+        return path.startswith(prefix) and path.endswith('.py') and path not in keep
+    return ignore
 
 
 class LambdaManager:
@@ -854,7 +1032,16 @@ class PolicyLambda(AbstractLambdaFunction):
 
     def __init__(self, policy):
         self.policy = policy
-        self.archive = custodian_archive(packages=self.packages)
+        resource_types = None
+        if self.policy.data['mode'].get('prune-archive'):
+            resource_types = StructureParser().get_resource_types(
+                {'policies': [self.policy.data]})
+        self.archive = custodian_archive(
+            packages=self.packages,
+            resource_types=resource_types,
+            policy_data=self.policy.data,
+            bytecode=bool(self.policy.data['mode'].get('bytecode-archive')) and (
+                self.runtime == 'python%d.%d' % sys.version_info[:2]))
 
     @property
     def name(self):
@@ -958,9 +1145,17 @@ class PolicyLambda(AbstractLambdaFunction):
         return events
 
     def get_archive(self):
+        exec_options = get_exec_options(self.policy.options)
+        # spare the function an sts call at cold start when the policy has
+        # opted into a cold start tuned archive, member role policies
+        # determine their account from the event.
+        mode = self.policy.data['mode']
+        if (self.policy.options.account_id and 'member-role' not in mode and
+                (mode.get('prune-archive') or mode.get('bytecode-archive'))):
+            exec_options['account_id'] = self.policy.options.account_id
         self.archive.add_contents(
             'config.json', json.dumps(
-                {'execution-options': get_exec_options(self.policy.options),
+                {'execution-options': exec_options,
                  'policies': [self.policy.data]}, indent=2))
         self.archive.add_contents('custodian_policy.py', PolicyHandlerTemplate)
         self.archive.close()
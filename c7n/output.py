@@ -8,6 +8,7 @@ See docs/usage/outputs.rst
 
 """
 import contextlib
+import contextvars
 import datetime
 import gzip
 import logging
@@ -32,6 +33,9 @@ except ImportError:
 
 log = logging.getLogger('custodian.output')
 
+# log filter of the policy execution running in the current context
+EXECUTION_LOG = contextvars.ContextVar('c7n_execution_log', default=None)
+
 
 # TODO remove
 DEFAULT_NAMESPACE = "CloudMaid"
@@ -314,6 +318,33 @@ class LogMetrics(Metrics):
         return res
 
 
+class ExecutionLogFilter(logging.Filter):
+    """Limit a policy execution's log to the records of its execution.
+
+    Policies may execute concurrently on threads, with their log handlers
+    all on the custodian logger. The execution joining its log is recorded
+    in a context variable, which c7n.executor thread pools carry over to
+    their workers. Records attributed to another execution are excluded,
+    records that can't be attributed are kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.previous = None
+
+    def join(self):
+        self.previous = EXECUTION_LOG.get()
+        EXECUTION_LOG.set(self)
+
+    def leave(self):
+        if EXECUTION_LOG.get() is self:
+            EXECUTION_LOG.set(self.previous)
+
+    def filter(self, record):
+        owner = EXECUTION_LOG.get()
+        return owner is None or owner is self
+
+
 class LogOutput:
 
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -322,6 +353,7 @@ class LogOutput:
         self.ctx = ctx
         self.config = config or {}
         self.handler = None
+        self.log_filter = None
 
     def get_handler(self):
         raise NotImplementedError()
@@ -342,6 +374,9 @@ class LogOutput:
             return
         self.handler.setLevel(logging.DEBUG)
         self.handler.setFormatter(logging.Formatter(self.log_format))
+        self.log_filter = ExecutionLogFilter()
+        self.log_filter.join()
+        self.handler.addFilter(self.log_filter)
         mlog = logging.getLogger('custodian')
         mlog.addHandler(self.handler)
 
@@ -350,6 +385,7 @@ class LogOutput:
             return
         mlog = logging.getLogger('custodian')
         mlog.removeHandler(self.handler)
+        self.log_filter.leave()
         self.handler.flush()
         self.handler.close()
 
@@ -389,6 +389,10 @@ class LambdaMode(ServerlessExecutionMode):
             'function-prefix': {'type': 'string'},
             'member-role': {'type': 'string'},
             'packages': {'type': 'array', 'items': {'type': 'string'}},
+            # only include the resource modules needed by the policy
+            'prune-archive': {'type': 'boolean'},
+            # include precompiled bytecode when the runtime matches the deploying python
+            'bytecode-archive': {'type': 'boolean'},
             # Lambda passthrough config
             'layers': {'type': 'array', 'items': {'type': 'string'}},
             'concurrency': {'type': 'integer'},
@@ -1194,7 +1198,7 @@ class Policy:
         return self.data.get('tags', ())
 
     def get_cache(self):
-        return self.resource_manager._cache
+        return self.resource_manager.get_cache()
 
     @property
     def execution_mode(self):
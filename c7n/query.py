@@ -47,6 +47,20 @@ class ResourceQuery:
             m = resource_type
         return m
 
+    def _iter_client_enum(self, client, enum_op, params, path, retry=None):
+        """Yield the results of an enumeration operation page by page."""
+        if not client.can_paginate(enum_op):
+            yield self._invoke_client_enum(client, enum_op, params, path, retry)
+            return
+
+        p = client.get_paginator(enum_op)
+        if retry:
+            p.PAGE_ITERATOR_CLS = RetryPageIterator
+        if path:
+            path = jmespath_compile(path)
+        for page in p.paginate(**params):
+            yield path.search(page) if path else page
+
     def _invoke_client_enum(self, client, enum_op, params, path, retry=None):
         if client.can_paginate(enum_op):
             p = client.get_paginator(enum_op)
@@ -66,6 +80,20 @@ class ResourceQuery:
 
     def filter(self, resource_manager, **params):
         """Query a set of resources."""
+        client, enum_op, path = self._get_enum_args(resource_manager, params)
+        return self._invoke_client_enum(
+            client, enum_op, params, path,
+            getattr(resource_manager, 'retry', None)) or []
+
+    def iter_filter(self, resource_manager, **params):
+        """Query a set of resources, yielding them as each page is retrieved."""
+        client, enum_op, path = self._get_enum_args(resource_manager, params)
+        for page in self._iter_client_enum(
+                client, enum_op, params, path,
+                getattr(resource_manager, 'retry', None)):
+            yield from page or ()
+
+    def _get_enum_args(self, resource_manager, params):
         m = self.resolve(resource_manager.resource_type)
         if resource_manager.get_client:
             client = resource_manager.get_client()
@@ -75,9 +103,7 @@ class ResourceQuery:
         enum_op, path, extra_args = m.enum_spec
         if extra_args:
             params.update(extra_args)
-        return self._invoke_client_enum(
-            client, enum_op, params, path,
-            getattr(resource_manager, 'retry', None)) or []
+        return client, enum_op, path
 
     def get(self, resource_manager, identities):
         """Get resources by identities
@@ -231,6 +257,16 @@ class DescribeSource:
     def resources(self, query):
         return self.query.filter(self.manager, **query)
 
+    def can_stream(self):
+        # sources and queries with custom enumeration retrieve resources as a whole.
+        return (type(self).resources is DescribeSource.resources and
+                type(self.query).filter is ResourceQuery.filter and
+                bool(self.manager.get_model().enum_spec[1]))
+
+    def iter_resources(self, query, batch_size):
+        """Yield resources in batches of at most batch_size as pages are retrieved."""
+        return chunks(self.query.iter_filter(self.manager, **query), batch_size)
+
     def get_query(self):
         return self.resource_query_factory(self.manager.session_factory)
 
@@ -302,25 +338,73 @@ class ConfigSource:
         self.manager = manager
         self.titleCase = self.manager.resource_type.id[0].isupper()
 
+    # resource keys per batch get call
+    batch_size = 100
+
     def get_permissions(self):
         return ["config:GetResourceConfigHistory",
+                "config:BatchGetResourceConfig",
                 "config:ListDiscoveredResources"]
 
     def get_resources(self, ids, cache=True):
         client = local_session(self.manager.session_factory).client('config')
         results = []
-        m = self.manager.get_model()
-        for i in ids:
-            revisions = self.retry(
-                client.get_resource_config_history,
-                resourceId=i,
-                resourceType=m.config_type,
-                limit=1).get('configurationItems')
-            if not revisions:
-                continue
-            results.append(self.load_resource(revisions[0]))
+        history_ids = ids
+        with self.manager.executor_factory(
+                max_workers=self.manager.max_workers) as w:
+            if len(ids) > 1:
+                results, history_ids = self.get_batch_resources(w, client, ids)
+            results.extend(w.map(
+                functools.partial(self.get_history_resource, client), history_ids))
         return list(filter(None, results))
 
+    def get_history_resource(self, client, resource_id):
+        """Retrieve a resource from its latest config history item."""
+        revisions = self.retry(
+            client.get_resource_config_history,
+            resourceId=resource_id,
+            resourceType=self.manager.get_model().config_type,
+            limit=1).get('configurationItems')
+        if not revisions:
+            return None
+        return self.load_resource(revisions[0])
+
+    def get_batch_resources(self, executor, client, ids):
+        """Retrieve the current configuration items of resources in batches.
+
+        Returns the loaded resources and the ids to retrieve from config history,
+        those that weren't processed or found. Base configuration items of some
+        resource types don't carry tags, if none of a taggable type's items do,
+        resources without tags are also retrieved from history.
+        """
+        config_type = self.manager.get_model().config_type
+
+        def get_items(id_set):
+            return self.retry(
+                client.batch_get_resource_config,
+                resourceKeys=[
+                    {'resourceType': config_type, 'resourceId': i} for i in id_set]
+            ).get('baseConfigurationItems', ())
+
+        loaded = []
+        for items in executor.map(get_items, chunks(ids, self.batch_size)):
+            loaded.extend((item['resourceId'], self.load_resource(item)) for item in items)
+
+        tags_missing = self.is_taggable() and not any(
+            r is not None and 'Tags' in r for _, r in loaded)
+        results, served = [], set()
+        for rid, resource in loaded:
+            if tags_missing and resource is not None:
+                continue
+            served.add(rid)
+            results.append(resource)
+        return results, [i for i in ids if i not in served]
+
+    def is_taggable(self):
+        return bool(
+            self.manager.get_model().universal_taggable or
+            'tag' in self.manager.action_registry)
+
     def get_query_params(self, query):
         """Parse config select expression from policy and parameter.
 
@@ -410,18 +494,29 @@ class ConfigSource:
                 len(resource_ids),
                 self.manager.__class__.__name__.lower())
 
-            for resource_set in chunks(resource_ids, 50):
-                futures = []
-                futures.append(w.submit(self.get_resources, resource_set))
-                for f in as_completed(futures):
-                    if f.exception():
-                        self.manager.log.error(
-                            "Exception getting resources from config \n %s" % (
-                                f.exception()))
-                    results.extend(f.result())
+            futures = [
+                w.submit(self.get_resources, resource_set)
+                for resource_set in chunks(resource_ids, self.batch_size)]
+            for f in as_completed(futures):
+                if f.exception():
+                    self.manager.log.error(
+                        "Exception getting resources from config \n %s" % (
+                            f.exception()))
+                results.extend(f.result())
         return results
 
     def resources(self, query=None):
+        return list(itertools.chain.from_iterable(
+            self.iter_resources(query, self.batch_size)))
+
+    def can_stream(self):
+        return type(self).resources is ConfigSource.resources
+
+    def iter_resources(self, query, batch_size):
+        """Yield resources in batches of at most batch_size as pages are retrieved.
+
+        Rows are only decoded once their batch is reached.
+        """
         client = local_session(self.manager.session_factory).client('config')
         query = self.get_query_params(query)
         pager = Paginator(
@@ -431,17 +526,18 @@ class ConfigSource:
             client.meta.service_model.operation_model('SelectResourceConfig'))
         pager.PAGE_ITERATOR_CLS = RetryPageIterator
 
-        results = []
-        for page in pager.paginate(Expression=query['expr']):
-            results.extend([
-                self.load_resource(json.loads(r)) for r in page['Results']])
+        rows = itertools.chain.from_iterable(
+            page['Results'] for page in pager.paginate(Expression=query['expr']))
+        found = False
+        for row_set in chunks(rows, batch_size):
+            found = True
+            yield [self.load_resource(json.loads(r)) for r in row_set]
 
         # Config arbitrarily breaks which resource types its supports for query/select
         # on any given day, if we don't have a user defined query, then fallback
         # to iteration mode.
-        if not results and query == self.get_query_params({}):
-            results = self.get_listed_resources(client)
-        return results
+        if not found and query == self.get_query_params({}):
+            yield from chunks(self.get_listed_resources(client), batch_size)
 
     def augment(self, resources):
         return resources
@@ -536,13 +632,16 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             if resources is None:
                 if query is None:
                     query = {}
+                batch_size = augment and self.get_stream_batch_size()
+                if batch_size:
+                    return self.stream_resources(query, batch_size)
                 with self.ctx.tracer.subsegment('resource-fetch'):
                     resources = self.source.resources(query)
                 if augment:
                     with self.ctx.tracer.subsegment('resource-augment'):
                         resources = self.augment(resources)
                     # Don't pollute cache with unaugmented resources.
-                    self._cache.save(cache_key, resources)
+                    self._cache.save_resources(cache_key, resources, self.get_model().id)
 
         resource_count = len(resources)
         with self.ctx.tracer.subsegment('filter'):
@@ -553,6 +652,51 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             self.check_resource_limit(len(resources), resource_count)
         return resources
 
+    def get_stream_batch_size(self):
+        """Size of the batches resources are streamed through in, 0 if disabled.
+
+        Streaming is opt-in via ``--stream-batch-size``, and only used when
+        the source enumerates resources page by page and no filter needs
+        the full resource set.
+        """
+        batch_size = getattr(self.config, 'stream_batch_size', None) or 0
+        if not batch_size or not getattr(self.source, 'can_stream', None):
+            return 0
+        if not self.source.can_stream():
+            return 0
+        if any(f.needs_full_set() for f in self.iter_filters()):
+            return 0
+        return batch_size
+
+    def stream_resources(self, query, batch_size):
+        """Fetch, augment and filter resources in bounded batches.
+
+        Resources are released as soon as they're filtered out, as such the
+        resource set isn't cached. Matched resources are still retained in
+        full, as the resource limits, actions and output of the policy run
+        over the whole matched set. Memory use is then bounded by the batch
+        size plus the matched set, so policies matching most of a large
+        resource population see little reduction.
+        """
+        results, resource_count = [], 0
+        batches = self.source.iter_resources(query, batch_size)
+        while True:
+            with self.ctx.tracer.subsegment('resource-fetch'):
+                resources = next(batches, None)
+            if resources is None:
+                break
+            resource_count += len(resources)
+            with self.ctx.tracer.subsegment('resource-augment'):
+                resources = self.augment(resources)
+            with self.ctx.tracer.subsegment('filter'):
+                results.extend(self.filter_resources(resources))
+        self.log.debug("Streamed %d of %d %s" % (
+            len(results), resource_count, self.__class__.__name__.lower()))
+
+        if self.data == self.ctx.policy.data:
+            self.check_resource_limit(len(results), resource_count)
+        return results
+
     def check_resource_limit(self, selection_count, population_count):
         """Check if policy's execution affects more resources then its limit.
 
@@ -566,17 +710,17 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
     def _get_cached_resources(self, ids):
         key = self.get_cache_key(None)
         with self._cache:
-            resources = self._cache.get(key)
+            resources = self._cache.get_resources(key, ids, self.get_model().id)
             if resources is not None:
                 self.log.debug("Using cached results for get_resources")
-                m = self.get_model()
-                id_set = set(ids)
-                return [r for r in resources if r[m.id] in id_set]
+                return resources
         return None
 
     def get_resources(self, ids, cache=True, augment=True):
         if not ids:
             return []
+        # events can reference the same resource more than once
+        ids = list(dict.fromkeys(ids))
         if cache:
             resources = self._get_cached_resources(ids)
             if resources is not None:
@@ -585,6 +729,10 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             resources = self.source.get_resources(ids)
             if augment:
                 resources = self.augment(resources)
+                if cache:
+                    with self._cache:
+                        self._cache.update_resources(
+                            self.get_cache_key(None), resources, self.get_model().id)
             return resources
         except ClientError as e:
             self.log.warning("event ids not resolved: %s error:%s" % (ids, e))
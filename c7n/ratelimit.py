@@ -0,0 +1,195 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""API rate governor shared across processes.
+
+When many accounts are processed concurrently (ie. c7n-org) each process
+retries throttled calls independently, so throttling turns into retry
+storms against the same endpoints. The governor keeps a token bucket per
+service, account and region, api calls made through :func:`c7n.utils.get_retry`
+(and so :class:`c7n.query.RetryPageIterator`) wait for a token before being
+issued, and throttling errors are counted for reporting.
+
+The governor can be hosted in a manager process with :func:`start_governor`
+and its proxy installed in each worker with :func:`set_governor`. Without
+an installed governor calls are unaffected.
+"""
+import logging
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+
+log = logging.getLogger('custodian.ratelimit')
+
+THROTTLE_CODES = frozenset((
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+))
+
+# the process's governor and the account its calls are made against
+_governor = None
+_account_id = None
+
+
+class TokenBucket:
+    """Token bucket refilled at a fixed rate per second.
+
+    Tokens are reserved ahead of time, the caller is given the delay
+    before its reserved token is available.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class RateGovernor:
+    """Token buckets and throttling stats by service, account and region.
+
+    :param rates: mapping of service name to calls per second, the
+      ``*`` entry applies to services without their own rate.
+    """
+
+    def __init__(self, rates=None, burst=None):
+        self.rates = dict(rates or {})
+        self.burst = burst
+        self.buckets = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_rate(self, service):
+        return self.rates.get(service, self.rates.get('*'))
+
+    def acquire(self, service, account_id, region):
+        """Reserve a call, returning the seconds to wait before making it."""
+        key = (service, account_id, region)
+        rate = self.get_rate(service)
+        with self.lock:
+            stats = self.get_key_stats(key)
+            stats['calls'] += 1
+            if not rate:
+                return 0
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(rate, self.burst)
+            delay = bucket.reserve()
+            stats['delay'] += delay
+            return delay
+
+    def throttled(self, service, account_id, region):
+        with self.lock:
+            self.get_key_stats((service, account_id, region))['throttled'] += 1
+
+    def get_key_stats(self, key):
+        if key not in self.stats:
+            self.stats[key] = {'calls': 0, 'throttled': 0, 'delay': 0.0}
+        return self.stats[key]
+
+    def get_stats(self):
+        """Return per service, account and region stats, as a list of dicts."""
+        with self.lock:
+            return [
+                dict(service=service, account_id=account_id, region=region, **stats)
+                for (service, account_id, region), stats in sorted(
+                    self.stats.items(), key=lambda i: tuple(map(str, i[0])))]
+
+
+class GovernorManager(BaseManager):
+    """Manager process hosting a governor shared by worker processes."""
+
+
+GovernorManager.register('RateGovernor', RateGovernor)
+
+
+def start_governor(rates, burst=None):
+    """Start a manager process hosting a governor.
+
+    Returns the started manager, which should be shutdown when done,
+    and the governor proxy that can be passed to worker processes.
+    """
+    manager = GovernorManager()
+    manager.start()
+    return manager, manager.RateGovernor(rates, burst)
+
+
+def set_governor(governor, account_id=None):
+    global _governor, _account_id
+    _governor = governor
+    _account_id = account_id
+
+
+def get_governor():
+    return _governor
+
+
+def set_account(account_id):
+    """Set the account the process's subsequent api calls are made against."""
+    global _account_id
+    _account_id = account_id
+
+
+def get_call_key(func):
+    """Resolve the service and region of a boto client method."""
+    meta = getattr(getattr(func, '__self__', None), 'meta', None)
+    service_model = getattr(meta, 'service_model', None)
+    if service_model is None:
+        return None
+    return service_model.service_name, _account_id, meta.region_name
+
+
+def acquire(func):
+    """Wait for the governor's permission to call the given client method."""
+    if _governor is None:
+        return
+    key = get_call_key(func)
+    if key is None:
+        return
+    delay = _governor.acquire(*key)
+    if delay:
+        time.sleep(delay)
+
+
+def record_error(func, error_code):
+    """Record a throttling error of the given client method with the governor."""
+    if _governor is None or error_code not in THROTTLE_CODES:
+        return
+    key = get_call_key(func)
+    if key is not None:
+        _governor.throttled(*key)
+
+
+def report(governor, logger=log):
+    """Log the throttling stats of a governor, returning the stats."""
+    stats = governor.get_stats()
+    for s in stats:
+        if not (s['throttled'] or s['delay']):
+            continue
+        logger.info(
+            "API rate service:%s account:%s region:%s calls:%d throttled:%d delayed:%0.2fs",
+            s['service'], s['account_id'], s['region'],
+            s['calls'], s['throttled'], s['delay'])
+    logger.info(
+        "API rate totals calls:%d throttled:%d delayed:%0.2fs",
+        sum(s['calls'] for s in stats),
+        sum(s['throttled'] for s in stats),
+        sum(s['delay'] for s in stats))
+    return stats
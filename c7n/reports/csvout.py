@@ -26,17 +26,26 @@ CLI Usage
    $ custodian report -s s3://cloud-custodian-xyz/policies \\
      -p ec2-tag-compliance-terminate -v > terminated.csv
 
+Records are fetched and parsed concurrently and streamed into the
+report, only the report rows of the latest record per resource are
+retained. With ``--index`` a local sqlite index keeps the report rows
+of the s3 outputs already fetched, so subsequent reports with the same
+fields only fetch and parse new outputs.
 
 """
-from concurrent.futures import as_completed
+from concurrent.futures import as_completed, wait, FIRST_COMPLETED
 
 import csv
 from datetime import datetime
 import gzip
 import io
+import itertools
 import json
 import logging
 import os
+import sqlite3
+import threading
+import zlib
 from tabulate import tabulate
 
 from botocore.compat import OrderedDict
@@ -74,28 +83,19 @@ def report(policies, start_date, options, output_fh, raw_output_fh=None):
         include_policy=len(policy_names) > 1
     )
 
-    records = []
-    for policy in policies:
-        # initialize policy execution context for output access
-        policy.ctx.initialize()
-        if policy.ctx.output.type == 's3':
-            policy_records = record_set(
-                policy.session_factory,
-                policy.ctx.output.config['netloc'],
-                strip_output_path(policy.ctx.output.config['path'], policy.name),
-                start_date)
-        else:
-            policy_records = fs_record_set(policy.ctx.log_dir, policy.name)
-
-        log.debug("Found %d records for region %s", len(policy_records), policy.options.region)
-
-        for record in policy_records:
-            record['policy'] = policy.name
-            record['region'] = policy.options.region
-
-        records += policy_records
-
-    rows = formatter.to_csv(records, unique=not options.all_findings)
+    if options.format == 'json' or raw_output_fh is not None:
+        records = list(itertools.chain.from_iterable(
+            iter_policy_records(policies, start_date)))
+        rows = formatter.to_csv(records, unique=not options.all_findings)
+    else:
+        # only the formatted rows are needed, stream the records through
+        records = None
+        index = getattr(options, 'index', None) and ReportIndex(options.index) or None
+        rows = formatter.to_csv_entries(
+            iter_policy_records(policies, start_date, formatter, index),
+            unique=not options.all_findings)
+        if index is not None:
+            index.close()
 
     if options.format == 'csv':
         writer = csv.writer(output_fh, formatter.headers(), quoting=csv.QUOTE_ALL)
@@ -111,6 +111,37 @@ def report(policies, start_date, options, output_fh, raw_output_fh=None):
         dumps(records, raw_output_fh, indent=2)
 
 
+def iter_policy_records(policies, start_date, formatter=None, index=None):
+    """Yield batches of the records of each policy's outputs.
+
+    Given a formatter, batches of the records' report entries are yielded
+    instead, see :meth:`Formatter.to_entries`, with those of s3 outputs
+    kept in the index if given.
+    """
+    for policy in policies:
+        # initialize policy execution context for output access
+        policy.ctx.initialize()
+        annotations = {'policy': policy.name, 'region': policy.options.region}
+        if policy.ctx.output.type == 's3':
+            policy_batches = iter_record_set(
+                policy.session_factory,
+                policy.ctx.output.config['netloc'],
+                strip_output_path(policy.ctx.output.config['path'], policy.name),
+                start_date, index=index, formatter=formatter, annotations=annotations)
+        else:
+            records = fs_record_set(policy.ctx.log_dir, policy.name)
+            for record in records:
+                record.update(annotations)
+            policy_batches = [formatter and formatter.to_entries(records) or records]
+
+        count = 0
+        for policy_records in policy_batches:
+            count += len(policy_records)
+            yield policy_records
+
+        log.debug("Found %d records for region %s", count, policy.options.region)
+
+
 def _get_values(record, field_list, tag_map):
     tag_prefix = 'tag:'
     list_prefix = 'list:'
@@ -188,18 +219,18 @@ class Formatter:
         tag_map = {t['Key']: t['Value'] for t in record.get('Tags', ())}
         return _get_values(record, self.fields.values(), tag_map)
 
+    def get_id_accessor(self):
+        if '.' in self._id_field:
+            return jmespath_compile(self._id_field).search
+        return lambda r: r[self._id_field]
+
     def uniq_by_id(self, records):
         """Only the first record for each id"""
         uniq = []
         keys = set()
-        compiled = None
-        if '.' in self._id_field:
-            compiled = jmespath_compile(self._id_field)
+        get_id = self.get_id_accessor()
         for rec in records:
-            if compiled:
-                rec_id = compiled.search(rec)
-            else:
-                rec_id = rec[self._id_field]
+            rec_id = get_id(rec)
             if rec_id not in keys:
                 uniq.append(rec)
                 keys.add(rec_id)
@@ -225,6 +256,65 @@ class Formatter:
         rows = list(map(self.extract_csv, uniq))
         return rows
 
+    def get_index_key(self):
+        """Identify the entries of this formatter within a report index."""
+        return json.dumps([self._id_field, list(self.fields.items())])
+
+    def to_entries(self, records):
+        """Return the (date, id, row) report entry of each record.
+
+        The date is None for records without one.
+        """
+        if not records:
+            return []
+        date_sort = ('CustodianDate' in records[0] and 'CustodianDate' or
+                     self._date_field)
+        get_id = self.get_id_accessor()
+        return [
+            (rec[date_sort] if date_sort else None, get_id(rec), self.extract_csv(rec))
+            for rec in records]
+
+    def to_csv_stream(self, record_batches, reverse=True, unique=True):
+        """Format batches of records, as to_csv does for all of them."""
+        return self.to_csv_entries(
+            map(self.to_entries, record_batches), reverse=reverse, unique=unique)
+
+    def to_csv_entries(self, entry_batches, reverse=True, unique=True):
+        """Format batches of report entries, as to_csv does for their records.
+
+        Entries are consumed as they arrive, only the rows of retained
+        entries along with their dates are kept, so memory is bounded by
+        the number of distinct resources rather than the number of records.
+        """
+        date_sort = None
+        seq = itertools.count()
+        retained = {} if unique else []
+
+        for entries in entry_batches:
+            for date, rec_id, row in entries:
+                if date_sort is None:
+                    date_sort = date is not None
+                if not unique:
+                    retained.append((date, next(seq), row))
+                    continue
+                prior = retained.get(rec_id)
+                # keep the first of the latest (or earliest) records per id
+                if prior is not None and (
+                        not date_sort or prior[0] == date or (prior[0] > date) is reverse):
+                    continue
+                retained[rec_id] = (date, next(seq), row)
+
+        if unique:
+            log.debug("Uniqued to %d" % len(retained))
+            entries = list(retained.values())
+        else:
+            log.debug("Selected %d record(s)" % len(retained))
+            entries = retained
+        entries.sort(key=lambda e: e[1])
+        if date_sort:
+            entries.sort(key=lambda e: e[0], reverse=reverse)
+        return [row for _, _, row in entries]
+
 
 def fs_record_set(output_path, policy_name):
     record_path = os.path.join(output_path, 'resources.json')
@@ -246,11 +336,29 @@ def record_set(session_factory, bucket, key_prefix, start_date, specify_hour=Fal
 
     From the given start date.
     """
-
-    s3 = local_session(session_factory).client('s3')
-
     records = []
     key_count = 0
+    for key_records in iter_record_set(
+            session_factory, bucket, key_prefix, start_date, specify_hour):
+        records.extend(key_records)
+        key_count += 1
+
+    log.info("Fetched %d records across %d files" % (
+        len(records), key_count))
+    return records
+
+
+def iter_record_set(session_factory, bucket, key_prefix, start_date,
+                    specify_hour=False, index=None, max_workers=20,
+                    formatter=None, annotations=None):
+    """Yield the records of each s3 output for the given policy output url
+
+    From the given start date. Outputs are fetched and parsed concurrently,
+    with a bounded number of them in flight. Records are updated with the
+    given annotations, and given a formatter their report entries are
+    yielded instead, see :func:`get_records`.
+    """
+    s3 = local_session(session_factory).client('s3')
 
     date = start_date.strftime('%Y/%m/%d')
     if specify_hour:
@@ -258,48 +366,112 @@ def record_set(session_factory, bucket, key_prefix, start_date, specify_hour=Fal
     else:
         date += "/00"
 
+    prefix = key_prefix.strip('/') + '/'
     marker = "{}/{}/resources.json.gz".format(key_prefix.strip("/"), date)
+    if index is not None and formatter is not None:
+        index.prune(bucket, prefix, marker)
 
     p = s3.get_paginator('list_objects_v2').paginate(
         Bucket=bucket,
-        Prefix=key_prefix.strip('/') + '/',
+        Prefix=prefix,
         StartAfter=marker,
     )
 
-    with ThreadPoolExecutor(max_workers=20) as w:
+    with ThreadPoolExecutor(max_workers=max_workers) as w:
+        pending = set()
         for key_set in p:
-            if 'Contents' not in key_set:
-                continue
-            keys = [k for k in key_set['Contents']
-                    if k['Key'].endswith('resources.json.gz')]
-            key_count += len(keys)
-            futures = map(lambda k: w.submit(
-                get_records, bucket, k, session_factory), keys)
-
-            for f in as_completed(futures):
-                records.extend(f.result())
-
-    log.info("Fetched %d records across %d files" % (
-        len(records), key_count))
-    return records
-
-
-def get_records(bucket, key, session_factory):
-    # we're doing a lot of this in memory, worst case
-    # though we're talking about a 10k objects, else
-    # we should spool to temp files
-
+            for k in key_set.get('Contents', ()):
+                if not k['Key'].endswith('resources.json.gz'):
+                    continue
+                pending.add(w.submit(
+                    get_records, bucket, k, session_factory, index, formatter, annotations))
+                if len(pending) < max_workers * 2:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+
+        for f in as_completed(pending):
+            yield f.result()
+
+
+def get_records(bucket, key, session_factory, index=None, formatter=None, annotations=None):
+    """Get the records of an s3 output.
+
+    Given a formatter, the records' report entries are returned instead,
+    served from and kept in the index if given.
+    """
     # key ends with 'YYYY/mm/dd/HH/resources.json.gz'
     # so take the date parts only
     date_str = '-'.join(key['Key'].rsplit('/', 5)[-5:-1])
     custodian_date = date_parse(date_str)
+
+    if formatter is None:
+        index = None
+    if index is not None:
+        index_key = json.dumps([formatter.get_index_key(), annotations], sort_keys=True)
+        rows = index.get(bucket, key, index_key)
+        if rows is not None:
+            return [(custodian_date, rec_id, row) for rec_id, row in rows]
+
     s3 = local_session(session_factory).client('s3')
     result = s3.get_object(Bucket=bucket, Key=key['Key'])
-    blob = io.BytesIO(result['Body'].read())
-
-    records = json.load(gzip.GzipFile(fileobj=blob))
+    records = json.load(gzip.GzipFile(fileobj=io.BytesIO(result['Body'].read())))
     log.debug("bucket: %s key: %s records: %d",
               bucket, key['Key'], len(records))
     for r in records:
         r['CustodianDate'] = custodian_date
-    return records
+        r.update(annotations or ())
+    if formatter is None:
+        return records
+
+    entries = formatter.to_entries(records)
+    if index is not None:
+        index.save(bucket, key, index_key, [(rec_id, row) for _, rec_id, row in entries])
+    return entries
+
+
+class ReportIndex:
+    """Local sqlite index of the report rows of s3 outputs.
+
+    The (id, row) of each record of an output are keyed by bucket, key and
+    etag, along with the report fields, so an output is only fetched from
+    s3 and parsed once per set of report fields. Outputs older than a
+    report's start date are pruned from the index.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'create table if not exists output_rows ('
+                'bucket text, key text, etag text, report text, rows blob, '
+                'primary key (bucket, key, report))')
+
+    def get(self, bucket, key, report):
+        with self.lock:
+            row = self.conn.execute(
+                'select rows from output_rows '
+                'where bucket = ? and key = ? and etag = ? and report = ?',
+                (bucket, key['Key'], key.get('ETag'), report)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def save(self, bucket, key, report, rows):
+        body = zlib.compress(json.dumps(rows).encode('utf8'))
+        with self.lock, self.conn:
+            self.conn.execute(
+                'insert or replace into output_rows values (?, ?, ?, ?, ?)',
+                (bucket, key['Key'], key.get('ETag'), report, sqlite3.Binary(body)))
+
+    def prune(self, bucket, prefix, marker):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'delete from output_rows where bucket = ? and key >= ? and key <= ?',
+                (bucket, prefix, marker))
+
+    def close(self):
+        self.conn.close()
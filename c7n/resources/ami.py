@@ -14,6 +14,7 @@ from c7n.actions import BaseAction
 from c7n.exceptions import ClientError, PolicyValidationError
 from c7n.filters import (
     AgeFilter, ValueFilter, Filter, CrossAccountAccessFilter)
+from c7n.filters.references import get_referenced
 from c7n.manager import resources
 from c7n.query import QueryResourceManager, DescribeSource, TypeInfo
 from c7n.resolver import ValuesFrom
@@ -612,7 +613,9 @@ class ImageUnusedFilter(Filter):
         return {i['ImageId'] for i in ec2_manager.resources()}
 
     def process(self, resources, event=None):
-        images = self._pull_ec2_images().union(self._pull_asg_images())
+        images = get_referenced(
+            self.manager, ('ami', 'ec2'), self._pull_ec2_images).union(
+                get_referenced(self.manager, ('ami', 'asg'), self._pull_asg_images))
         if self.data.get('value', True):
             return [r for r in resources if r['ImageId'] not in images]
         return [r for r in resources if r['ImageId'] in images]
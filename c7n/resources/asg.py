@@ -14,6 +14,7 @@ from c7n.actions import Action, AutoTagUser
 from c7n.exceptions import PolicyValidationError
 from c7n.filters import ValueFilter, AgeFilter, Filter
 from c7n.filters.offhours import OffHour, OnHour
+from c7n.filters.references import get_referenced
 import c7n.filters.vpc as net_filters
 import c7n.policy
 
@@ -1820,10 +1821,13 @@ class UnusedLaunchConfig(Filter):
         return self.manager.get_resource_manager('asg').get_permissions()
 
     def process(self, configs, event=None):
+        used = get_referenced(self.manager, ('launch-config', 'asg'), self.scan_asg_configs)
+        return [c for c in configs if c['LaunchConfigurationName'] not in used]
+
+    def scan_asg_configs(self):
         asgs = self.manager.get_resource_manager('asg').resources()
-        used = {a.get('LaunchConfigurationName', a['AutoScalingGroupName'])
+        return {a.get('LaunchConfigurationName', a['AutoScalingGroupName'])
                 for a in asgs if not a.get('LaunchTemplate')}
-        return [c for c in configs if c['LaunchConfigurationName'] not in used]
 
 
 @LaunchConfig.action_registry.register('delete')
@@ -16,6 +16,7 @@ from c7n.filters import (
     CrossAccountAccessFilter, Filter, AgeFilter, ValueFilter,
     ANNOTATION_KEY)
 from c7n.filters.health import HealthEventFilter
+from c7n.filters.references import get_referenced
 from c7n.filters.related import RelatedResourceFilter
 
 from c7n.manager import resources
@@ -316,7 +317,9 @@ class SnapshotUnusedFilter(Filter):
         return ami_snaps
 
     def process(self, resources, event=None):
-        snaps = self._pull_asg_snapshots().union(self._pull_ami_snapshots())
+        snaps = get_referenced(
+            self.manager, ('ebs-snapshot', 'asg'), self._pull_asg_snapshots).union(
+                get_referenced(self.manager, ('ebs-snapshot', 'ami'), self._pull_ami_snapshots))
         if self.data.get('value', True):
             return [r for r in resources if r['SnapshotId'] not in snaps]
         return [r for r in resources if r['SnapshotId'] in snaps]
@@ -24,7 +24,9 @@ from c7n.actions import BaseAction
 from c7n.exceptions import PolicyValidationError
 from c7n.filters import ValueFilter, Filter
 from c7n.filters.multiattr import MultiAttrFilter
+from c7n.filters.references import get_referenced
 from c7n.filters.iamaccess import CrossAccountAccessFilter
+from c7n.filters.iameval import AccountAuthorization, PolicyEvaluator
 from c7n.manager import resources
 from c7n.query import ConfigSource, QueryResourceManager, DescribeSource, TypeInfo
 from c7n.resolver import ValuesFrom
@@ -659,6 +661,15 @@ class CheckPermissions(Filter):
                   - '*:*'
 
     By default permission boundaries are checked.
+
+    Permissions are checked with the iam policy simulator. Set `simulate`
+    to `never` to instead evaluate them locally from the account's identity
+    policies, loaded with a single authorization details call and kept in
+    the resource cache, see :py:mod:`c7n.filters.iameval`. Local evaluation
+    is an approximation: allows apply if they grant any resource, denies
+    only if they cover every resource, and statements with conditions don't
+    apply. Set `simulate` to `conditions` to evaluate locally but use the
+    policy simulator for principals with conditional statements.
     """
 
     schema = type_schema(
@@ -668,6 +679,7 @@ class CheckPermissions(Filter):
                 {'$ref': '#/definitions/filters/valuekv'},
                 {'$ref': '#/definitions/filters/value'}]},
             'boundaries': {'type': 'boolean'},
+            'simulate': {'enum': ['never', 'conditions', 'always']},
             'match-operator': {'enum': ['and', 'or']},
             'actions': {'type': 'array', 'items': {'type': 'string'}},
             'required': ('actions', 'match')})
@@ -691,16 +703,25 @@ class CheckPermissions(Filter):
         return self
 
     def get_permissions(self):
+        simulate = self.data.get('simulate', 'always') != 'never'
         if self.manager.type == 'iam-policy':
-            return ('iam:SimulateCustomPolicy', 'iam:GetPolicyVersion')
-        perms = ('iam:SimulatePrincipalPolicy', 'iam:GetPolicy', 'iam:GetPolicyVersion')
-        if self.manager.type not in ('iam-user', 'iam-role',):
+            perms = ('iam:GetPolicyVersion',)
+            if simulate:
+                perms += ('iam:SimulateCustomPolicy',)
+            return perms
+        perms = ('iam:GetPolicy', 'iam:GetPolicyVersion')
+        if simulate:
+            perms += ('iam:SimulatePrincipalPolicy',)
+        if self.data.get('simulate', 'always') != 'always':
+            perms += ('iam:GetAccountAuthorizationDetails',)
+        if simulate and self.manager.type not in ('iam-user', 'iam-role',):
             # for simulating w/ permission boundaries
             perms += ('iam:GetRole',)
         return perms
 
     def process(self, resources, event=None):
         client = local_session(self.manager.session_factory).client('iam')
+        self.authorization = None
         actions = self.data['actions']
         matcher = self.get_eval_matcher()
         operator = self.data.get('match-operator', 'and') == 'and' and all or any
@@ -751,12 +772,26 @@ class CheckPermissions(Filter):
                 r['c7n:policy'] = policy = client.get_policy_version(
                     PolicyArn=r['Arn'],
                     VersionId=r['DefaultVersionId']).get('PolicyVersion', {})
+            evaluations = self.evaluate_locally(
+                PolicyEvaluator([(r['Arn'], policy['Document'])]), actions)
+            if evaluations is not None:
+                return evaluations
             evaluations = self.manager.retry(
                 client.simulate_custom_policy,
                 PolicyInputList=[json.dumps(policy['Document'])],
                 ActionNames=actions).get('EvaluationResults', ())
             return evaluations
 
+        if self.data.get('simulate', 'always') != 'always':
+            evaluator = self.get_authorization(client).get_evaluator(
+                arn, self.data.get('boundaries', True))
+            # principals that don't exist are skipped, as with simulation
+            if evaluator is None:
+                return ()
+            evaluations = self.evaluate_locally(evaluator, actions)
+            if evaluations is not None:
+                return evaluations
+
         params = dict(
             PolicySourceArn=arn,
             ActionNames=actions,
@@ -777,6 +812,32 @@ class CheckPermissions(Filter):
             **params) or {}).get('EvaluationResults', ())
         return evaluations
 
+    def evaluate_locally(self, evaluator, actions):
+        """Evaluate actions locally, returns None if they should be simulated."""
+        simulate = self.data.get('simulate', 'always')
+        if simulate == 'always':
+            return None
+        evaluations = evaluator.evaluate(actions)
+        if simulate == 'conditions' and any(
+                e['MissingContextValues'] for e in evaluations):
+            return None
+        return evaluations
+
+    def get_authorization(self, client):
+        """Return the account's identity policies, from the cache if available."""
+        if self.authorization is not None:
+            return self.authorization
+        cache_key = {
+            'account': self.manager.config.account_id,
+            'resource': 'iam-authorization-details'}
+        with self.manager._cache:
+            details = self.manager._cache.get(cache_key)
+            if details is None:
+                details = self.manager.retry(AccountAuthorization.get_details, client)
+                self.manager._cache.save(cache_key, details)
+        self.authorization = AccountAuthorization(details, client)
+        return self.authorization
+
     def get_eval_matcher(self):
         if isinstance(self.data['match'], str):
             if self.data['match'] == 'denied':
@@ -803,15 +864,20 @@ class IamRoleUsage(Filter):
 
     def service_role_usage(self):
         results = set()
-        results.update(self.scan_lambda_roles())
-        results.update(self.scan_ecs_roles())
-        results.update(self.collect_profile_roles())
+        results.update(get_referenced(
+            self.manager, ('iam-role', 'lambda'), self.scan_lambda_roles))
+        results.update(get_referenced(
+            self.manager, ('iam-role', 'ecs-service'), self.scan_ecs_roles))
+        results.update(get_referenced(
+            self.manager, ('iam-role', 'iam-profile'), self.collect_profile_roles))
         return results
 
     def instance_profile_usage(self):
         results = set()
-        results.update(self.scan_asg_roles())
-        results.update(self.scan_ec2_roles())
+        results.update(get_referenced(
+            self.manager, ('iam-profile', 'launch-config'), self.scan_asg_roles))
+        results.update(get_referenced(
+            self.manager, ('iam-profile', 'ec2'), self.scan_ec2_roles))
         return results
 
     def scan_lambda_roles(self):
@@ -834,9 +900,7 @@ class IamRoleUsage(Filter):
 
     def collect_profile_roles(self):
         # Collect iam roles attached to instance profiles of EC2/ASG resources
-        profiles = set()
-        profiles.update(self.scan_asg_roles())
-        profiles.update(self.scan_ec2_roles())
+        profiles = self.instance_profile_usage()
 
         manager = self.manager.get_resource_manager('iam-profile')
         iprofiles = manager.resources()
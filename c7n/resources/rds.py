@@ -54,6 +54,7 @@ from c7n.filters import (
     CrossAccountAccessFilter, FilterRegistry, Filter, ValueFilter, AgeFilter)
 from c7n.filters.offhours import OffHour, OnHour
 from c7n.filters import related
+from c7n.filters.references import get_referenced
 import c7n.filters.vpc as net_filters
 from c7n.manager import resources
 from c7n.query import (
@@ -1665,12 +1666,22 @@ class UnusedRDSSubnetGroup(Filter):
         return self.manager.get_resource_manager('rds').get_permissions()
 
     def process(self, configs, event=None):
-        rds = self.manager.get_resource_manager('rds').resources()
-        self.used = set(jmespath_search('[].DBSubnetGroup.DBSubnetGroupName', rds))
-        self.used.update(set(jmespath_search('[].DBSubnetGroup.DBSubnetGroupName',
-            self.manager.get_resource_manager('rds-cluster').resources(augment=False))))
+        self.used = get_referenced(
+            self.manager, ('rds-subnet-group', 'rds'), self.scan_rds_groups).union(
+                get_referenced(
+                    self.manager, ('rds-subnet-group', 'rds-cluster'),
+                    self.scan_rds_cluster_groups))
         return super(UnusedRDSSubnetGroup, self).process(configs)
 
+    def scan_rds_groups(self):
+        rds = self.manager.get_resource_manager('rds').resources()
+        return set(jmespath_search('[].DBSubnetGroup.DBSubnetGroupName', rds))
+
+    def scan_rds_cluster_groups(self):
+        return set(jmespath_search(
+            '[].DBSubnetGroup.DBSubnetGroupName',
+            self.manager.get_resource_manager('rds-cluster').resources(augment=False)))
+
     def __call__(self, config):
         return config['DBSubnetGroupName'] not in self.used
 
@@ -33,11 +33,13 @@ import itertools
 import logging
 import math
 import os
+import re
 import time
 import ssl
+import threading
 
 from botocore.client import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, EndpointConnectionError
 
 from collections import defaultdict
 from concurrent.futures import as_completed
@@ -54,6 +56,7 @@ from c7n.exceptions import PolicyValidationError, PolicyExecutionError
 from c7n.filters import (
     FilterRegistry, Filter, CrossAccountAccessFilter, MetricsFilter,
     ValueFilter, ListItemFilter)
+from c7n.filters.core import BooleanGroupFilter, EventFilter
 from .aws import shape_validate
 import c7n.filters.policystatement as polstmt_filter
 from c7n.manager import resources
@@ -63,7 +66,8 @@ from c7n.resources.securityhub import PostFinding
 from c7n.tags import RemoveTag, Tag, TagActionFilter, TagDelayedAction
 from c7n.utils import (
     chunks, local_session, set_annotation, type_schema, filter_empty,
-    dumps, format_string_values, get_account_alias_from_sts)
+    dumps, format_string_values, get_account_alias_from_sts, ClientPool,
+    get_client_pool)
 from c7n.resources.aws import inspect_bucket_region
 
 
@@ -80,13 +84,73 @@ MAX_COPY_SIZE = 1024 * 1024 * 1024 * 2
 class DescribeS3(query.DescribeSource):
 
     def augment(self, buckets):
+        augment_keys = self.get_augment_keys()
+        if augment_keys is not None:
+            return self.augment_subset(buckets, augment_keys)
+        pool = get_client_pool(self.manager.ctx, self.manager.session_factory)
         with self.manager.executor_factory(
                 max_workers=min((10, len(buckets) + 1))) as w:
             results = w.map(
                 assemble_bucket,
-                zip(itertools.repeat(self.manager.session_factory), buckets))
+                zip(itertools.repeat(pool), buckets))
             results = list(filter(None, results))
-            return results
+        log.debug(
+            "s3 augment client pool sessions:%d clients:%d hits:%d",
+            pool.stats['sessions'], pool.stats['clients'], pool.stats['hits'])
+        return results
+
+    def get_augment_keys(self):
+        """Return the augment keys the policy needs, or None for all keys.
+
+        Only active when the s3_augment option (--s3-augment) is set, either
+        to `auto` to infer the keys from the policy's filters and actions, or to
+        a comma separated list of augment keys (ie. Tags,Versioning).
+        """
+        mode = (getattr(self.manager.config, 's3_augment', None) or 'all').strip()
+        if mode == 'all':
+            return None
+        if mode != 'auto':
+            return {k.strip() for k in mode.split(',')}.union(('Location',))
+        keys = {'Location'}
+        for el in itertools.chain(
+                getattr(self.manager, 'filters', ()), getattr(self.manager, 'actions', ())):
+            el_keys = get_augment_keys(el)
+            if el_keys is None:
+                return None
+            keys.update(el_keys)
+        return keys
+
+    def augment_subset(self, buckets, augment_keys):
+        """Fetch the given augment keys, concurrently across buckets and keys.
+
+        The number of outstanding api calls, across all concurrent
+        augments with the same bound, is bounded by the
+        s3_augment_concurrency option (--s3-augment-concurrency).
+        """
+        pool = get_client_pool(self.manager.ctx, self.manager.session_factory)
+        methods = [m for m in S3_AUGMENT_TABLE if m[1] in augment_keys]
+        location = [m for m in methods if m[1] == 'Location']
+        methods = [m for m in methods if m[1] != 'Location']
+        concurrency = getattr(self.manager.config, 's3_augment_concurrency', None) or 30
+        semaphore = get_augment_semaphore(concurrency)
+
+        with self.manager.executor_factory(max_workers=concurrency) as w:
+            # location first, as the remaining calls need the regional endpoint.
+            for m in location:
+                list(w.map(
+                    functools.partial(fetch_bucket_augment, pool, semaphore, method=m),
+                    buckets))
+            futures = [
+                w.submit(fetch_bucket_augment, pool, semaphore, b, method=m)
+                for b in buckets for m in methods]
+            for f in as_completed(futures):
+                # propagate unhandled api errors
+                f.result()
+        log.debug(
+            "s3 augment keys:%s client pool sessions:%d clients:%d hits:%d",
+            ",".join(sorted(augment_keys)),
+            pool.stats['sessions'], pool.stats['clients'], pool.stats['hits'])
+        return buckets
 
 
 class ConfigS3(query.ConfigSource):
@@ -381,6 +445,14 @@ class S3(query.QueryResourceManager):
     def get_arns(self, resources):
         return ["arn:aws:s3:::{}".format(r["Name"]) for r in resources]
 
+    def get_cache_key(self, query):
+        key = super().get_cache_key(query)
+        augment_keys = getattr(self.source, 'get_augment_keys', lambda: None)()
+        if augment_keys is not None:
+            # keep partially augmented buckets separate in the cache
+            key['augment'] = sorted(augment_keys)
+        return key
+
     @classmethod
     def get_permissions(cls):
         perms = ["s3:ListAllMyBuckets"]
@@ -419,14 +491,127 @@ S3_AUGMENT_TABLE = (
 )
 
 
+def get_augment_keys(element):
+    """Return the s3 augment keys a filter or action depends on, or None for all.
+
+    Filters and actions may declare an `augment_keys` attribute, value
+    filters are resolved from their key, and boolean blocks from their
+    members.
+    """
+    if hasattr(element, 'augment_keys'):
+        return set(element.augment_keys)
+    if isinstance(element, BooleanGroupFilter):
+        keys = set()
+        for f in element.filters:
+            f_keys = get_augment_keys(f)
+            if f_keys is None:
+                return None
+            keys.update(f_keys)
+        return keys
+    if isinstance(element, TagActionFilter):
+        return {'Tags'}
+    if isinstance(element, EventFilter):
+        return set()
+    if type(element) is ValueFilter:
+        if len(element.data) == 1:
+            [key] = element.data.keys()
+        else:
+            key = element.data.get('key', '')
+        if key.startswith('tag:'):
+            return {'Tags'}
+        root = re.match(r'^([A-Za-z_][\w]*)(\.|\[|$)', key)
+        if root is None:
+            return None
+        return {root.group(1)}.intersection([m[1] for m in S3_AUGMENT_TABLE])
+    return None
+
+
+AUGMENT_SEMAPHORES = {}
+AUGMENT_SEMAPHORE_LOCK = threading.Lock()
+
+
+def get_augment_semaphore(concurrency):
+    """Get the bound on outstanding subset augment api calls.
+
+    Concurrent augments with the same concurrency share a bound.
+    """
+    with AUGMENT_SEMAPHORE_LOCK:
+        semaphore = AUGMENT_SEMAPHORES.get(concurrency)
+        if semaphore is None:
+            semaphore = AUGMENT_SEMAPHORES[concurrency] = threading.BoundedSemaphore(
+                concurrency)
+        return semaphore
+
+
+def fetch_bucket_augment(pool, semaphore, b, method):
+    """Fetch a single augment key for a bucket.
+
+    Used for subset augmentation, where the bucket location is fetched
+    first to determine the regional endpoint for the remaining calls.
+    As with full augmentation, keys that can't be fetched are left unset,
+    and calls redirected to another region are retried there.
+    """
+    m, k, default, select = method[:4]
+    region = k != 'Location' and get_region(b) or None
+    regions = {region}
+    while True:
+        if region is None:
+            c = pool.client('s3')
+        else:
+            c = pool.client('s3', region_name=region, config=S3_CLIENT_CONFIG)
+        try:
+            with semaphore:
+                v = getattr(c, m)(Bucket=b['Name'])
+            v.pop('ResponseMetadata')
+            if select is not None and select in v:
+                v = v[select]
+        except (ssl.SSLError, SSLError, EndpointConnectionError) as e:
+            log.warning("Bucket connection error %s: %s %s",
+                        b['Name'], b.get('Location', 'unknown'), e)
+            return
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code.startswith("NoSuch") or "NotFound" in code:
+                v = default
+            elif code in ('PermanentRedirect', 'AuthorizationHeaderMalformed'):
+                redirect = get_redirect_region(e)
+                if redirect and redirect not in regions:
+                    region = redirect
+                    regions.add(region)
+                    continue
+                log.warning(
+                    "Bucket:%s unable to invoke method:%s error:%s ",
+                    b['Name'], m, e.response['Error'].get('Message', code))
+                return
+            elif code == 'AccessDenied':
+                log.warning(
+                    "Bucket:%s unable to invoke method:%s error:%s ",
+                    b['Name'], m, e.response['Error']['Message'])
+                b.setdefault('c7n:DeniedMethods', []).append(m)
+                return
+            else:
+                raise
+        break
+    if k == 'Location' and v is not None and v.get('LocationConstraint') == 'EU':
+        v['LocationConstraint'] = 'eu-west-1'
+    b[k] = v
+
+
+def get_redirect_region(e):
+    """Get the region of a bucket from a redirect or region mismatch error."""
+    headers = e.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    return headers.get('x-amz-bucket-region') or e.response['Error'].get('Region')
+
+
 def assemble_bucket(item):
     """Assemble a document representing all the config state around a bucket.
 
     TODO: Refactor this, the logic here feels quite muddled.
     """
-    factory, b = item
-    s = factory()
-    c = s.client('s3')
+    pool, b = item
+    if not isinstance(pool, ClientPool):
+        pool = ClientPool(pool)
+    c = pool.client('s3')
     # Bucket Location, Current Client Location, Default Location
     b_location = c_location = location = "us-east-1"
     methods = list(S3_AUGMENT_TABLE)
@@ -449,8 +634,7 @@ def assemble_bucket(item):
             if code.startswith("NoSuch") or "NotFound" in code:
                 v = default
             elif code == 'PermanentRedirect':
-                s = factory()
-                c = bucket_client(s, b)
+                c = pool.client('s3', region_name=get_region(b), config=S3_CLIENT_CONFIG)
                 # Requeue with the correct region given location constraint
                 methods.append((m, k, default, select))
                 continue
@@ -483,13 +667,16 @@ def assemble_bucket(item):
                 b_location = "eu-west-1"
                 v['LocationConstraint'] = 'eu-west-1'
             if v and v != c_location:
-                c = s.client('s3', region_name=b_location)
+                c = pool.client('s3', region_name=b_location)
             elif c_location != location:
-                c = s.client('s3', region_name=location)
+                c = pool.client('s3', region_name=location)
         b[k] = v
     return b
 
 
+S3_CLIENT_CONFIG = Config(read_timeout=200, connect_timeout=120)
+
+
 def bucket_client(session, b, kms=False):
     region = get_region(b)
 
@@ -500,7 +687,7 @@ def bucket_client(session, b, kms=False):
             signature_version='s3v4',
             read_timeout=200, connect_timeout=120)
     else:
-        config = Config(read_timeout=200, connect_timeout=120)
+        config = S3_CLIENT_CONFIG
     return session.client('s3', region_name=region, config=config)
 
 
@@ -569,6 +756,8 @@ class S3Metrics(MetricsFilter):
     mismatch, and additional required dimension.
     """
 
+    augment_keys = ()
+
     def get_dimensions(self, resource):
         dims = [{'Name': 'BucketName', 'Value': resource['Name']}]
         if (self.data['name'] == 'NumberOfObjects' and
@@ -593,6 +782,7 @@ class S3CrossAccountFilter(CrossAccountAccessFilter):
                 filters:
                   - type: cross-account
     """
+    augment_keys = ('Policy',)
     permissions = ('s3:GetBucketPolicy',)
 
     def get_accounts(self):
@@ -703,6 +893,7 @@ class GlobalGrantsFilter(Filter):
 
     """
 
+    augment_keys = ('Acl', 'Website')
     schema = type_schema(
         'global-grants',
         allow_website={'type': 'boolean'},
@@ -818,6 +1009,8 @@ class BucketFinding(PostFinding):
 
 @S3.filter_registry.register('has-statement')
 class HasStatementFilter(polstmt_filter.HasStatementFilter):
+    augment_keys = ('Policy',)
+
     def get_std_format_args(self, bucket):
         return {
             'account_id': self.manager.config.account_id,
@@ -850,6 +1043,7 @@ class EncryptionEnabledFilter(Filter):
                 filters:
                   - type: no-encryption-statement
     """
+    augment_keys = ('Policy',)
     schema = type_schema(
         'no-encryption-statement')
 
@@ -901,6 +1095,7 @@ class MissingPolicyStatementFilter(Filter):
                       - RequiredEncryptedPutObject
     """
 
+    augment_keys = ('Policy',)
     schema = type_schema(
         'missing-policy-statement',
         aliases=('missing-statement',),
@@ -945,6 +1140,7 @@ class BucketNotificationFilter(ValueFilter):
                     statement_ids: matched
     """
 
+    augment_keys = ('Notification',)
     schema = type_schema(
         'bucket-notification',
         required=['kind'],
@@ -1011,6 +1207,7 @@ class BucketLoggingFilter(BucketFilterBase):
                     target_prefix: "{account}/{source_bucket_name}/"
     """
 
+    augment_keys = ('Logging',)
     schema = type_schema(
         'bucket-logging',
         op={'enum': ['enabled', 'disabled', 'equal', 'not-equal', 'eq', 'ne']},
@@ -1069,6 +1266,7 @@ class BucketLoggingFilter(BucketFilterBase):
 class DeleteBucketNotification(BucketActionBase):
     """Action to delete S3 bucket notification configurations"""
 
+    augment_keys = ('Notification',)
     schema = type_schema(
         'delete-bucket-notification',
         required=['statement_ids'],
@@ -1105,6 +1303,7 @@ class DeleteBucketNotification(BucketActionBase):
 @actions.register('no-op')
 class NoOp(BucketActionBase):
 
+    augment_keys = ()
     schema = type_schema('no-op')
     permissions = ('s3:ListAllMyBuckets',)
 
@@ -1137,6 +1336,7 @@ class SetPolicyStatement(BucketActionBase):
                             "aws:SecureTransport": false
     """
 
+    augment_keys = ('Policy',)
     permissions = ('s3:PutBucketPolicy',)
 
     schema = type_schema(
@@ -1222,6 +1422,7 @@ class RemovePolicyStatement(RemovePolicyBase):
                       - RequiredEncryptedPutObject
     """
 
+    augment_keys = ('Policy',)
     permissions = ("s3:PutBucketPolicy", "s3:DeleteBucketPolicy")
 
     def process(self, buckets):
@@ -1344,6 +1545,7 @@ class FilterPublicBlock(Filter):
                     BlockPublicPolicy: true
     """
 
+    augment_keys = ()
     schema = type_schema(
         'check-public-block',
         BlockPublicAcls={'type': 'boolean'},
@@ -1442,6 +1644,7 @@ class SetPublicBlock(BucketActionBase):
 
     """
 
+    augment_keys = ()
     schema = type_schema(
         'set-public-block',
         state={'type': 'boolean', 'default': True},
@@ -1507,6 +1710,7 @@ class ToggleVersioning(BucketActionBase):
                     enabled: true
     """
 
+    augment_keys = ('Versioning',)
     schema = type_schema(
         'toggle-versioning',
         enabled={'type': 'boolean'})
@@ -1576,6 +1780,7 @@ class ToggleLogging(BucketActionBase):
                     target_bucket: "{account_id}-{region}-s3-logs"
                     target_prefix: "{account}/{source_bucket_name}/"
     """
+    augment_keys = ('Logging',)
     schema = type_schema(
         'toggle-logging',
         enabled={'type': 'boolean'},
@@ -1761,6 +1966,7 @@ class EncryptionRequiredPolicy(BucketActionBase):
                   - encryption-policy
     """
 
+    augment_keys = ('Policy',)
     permissions = ("s3:GetBucketPolicy", "s3:PutBucketPolicy")
     schema = type_schema('encryption-policy')
 
@@ -2409,6 +2615,7 @@ def _query_elb_attrs(session_factory, elb_set):
 class RemoveWebsiteHosting(BucketActionBase):
     """Action that removes website hosting configuration."""
 
+    augment_keys = ()
     schema = type_schema('remove-website-hosting')
 
     permissions = ('s3:DeleteBucketWebsite',)
@@ -2437,6 +2644,7 @@ class DeleteGlobalGrants(BucketActionBase):
                   - delete-global-grants
     """
 
+    augment_keys = ('Acl', 'Website')
     schema = type_schema(
         'delete-global-grants',
         grantees={'type': 'array', 'items': {'type': 'string'}})
@@ -2509,6 +2717,8 @@ class BucketTag(Tag):
                     value: us-east-1
     """
 
+    augment_keys = ()
+
     def process_resource_set(self, client, resource_set, tags):
         modify_bucket_tags(self.manager.session_factory, resource_set, tags)
 
@@ -2534,6 +2744,7 @@ class MarkBucketForOp(TagDelayedAction):
                     days: 7
     """
 
+    augment_keys = ()
     schema = type_schema(
         'mark-for-op', rinherit=TagDelayedAction.schema)
 
@@ -2557,6 +2768,8 @@ class RemoveBucketTag(RemoveTag):
                     tags: ['BucketOwner']
     """
 
+    augment_keys = ()
+
     def process_resource_set(self, client, resource_set, tags):
         modify_bucket_tags(
             self.manager.session_factory, resource_set, remove_tags=tags)
@@ -2570,6 +2783,7 @@ class DataEvents(Filter):
     current account.
     """
 
+    augment_keys = ()
     schema = type_schema('data-events', state={'enum': ['present', 'absent']})
     permissions = (
         'cloudtrail:DescribeTrails',
@@ -2624,6 +2838,7 @@ class DataEvents(Filter):
 @filters.register('inventory')
 class Inventory(ValueFilter):
     """Filter inventories for a bucket"""
+    augment_keys = ()
     schema = type_schema('inventory', rinherit=ValueFilter.schema)
     schema_alias = False
     permissions = ('s3:GetInventoryConfiguration',)
@@ -2802,6 +3017,7 @@ class IntelligentTiering(ListItemFilter):
                           - AccessTier: ARCHIVE_ACCESS
 
     """
+    augment_keys = ()
     schema = type_schema(
         'intelligent-tiering',
         attrs={'$ref': '#/definitions/filters_common/list_item_attrs'},
@@ -3024,6 +3240,7 @@ class DeleteBucket(ScanBucket):
                     remove-contents: true
     """
 
+    augment_keys = ('Replication', 'Versioning')
     schema = type_schema('delete', **{'remove-contents': {'type': 'boolean'}})
 
     permissions = ('s3:*',)
@@ -3159,6 +3376,7 @@ class Lifecycle(BucketActionBase):
 
     """
 
+    augment_keys = ('Lifecycle',)
     schema = type_schema(
         'configure-lifecycle',
         **{
@@ -3418,6 +3636,7 @@ class BucketEncryption(KMSKeyResolverMixin, Filter):
                   - type: bucket-encryption
                     bucket_key_enabled: True
     """
+    augment_keys = ()
     schema = type_schema('bucket-encryption',
                          state={'type': 'boolean'},
                          crypto={'type': 'string', 'enum': ['AES256', 'aws:kms']},
@@ -3581,6 +3800,7 @@ class SetBucketEncryption(KMSKeyResolverMixin, BucketActionBase):
                     enabled: false
     """
 
+    augment_keys = ()
     schema = {
         'type': 'object',
         'additionalProperties': False,
@@ -3704,6 +3924,7 @@ class BucketOwnershipControls(BucketFilterBase, ValueFilter):
                   - type: ownership
                     value: empty
     """
+    augment_keys = ()
     schema = type_schema('ownership', rinherit=ValueFilter.schema, value={'oneOf': [
         {'type': 'string', 'enum': OWNERSHIP_CONTROLS + VALUE_FILTER_MAGIC_VALUES},
         {'type': 'array', 'items': {
@@ -3771,6 +3992,7 @@ class BucketReplication(ListItemFilter):
                       - ExistingObjectReplication: Enabled
 
     """
+    augment_keys = ()
     schema = type_schema(
         'bucket-replication',
         attrs={'$ref': '#/definitions/filters_common/list_item_attrs'},
@@ -9,6 +9,7 @@ from c7n.exceptions import PolicyValidationError, ClientError
 from c7n.filters import Filter, ValueFilter, MetricsFilter, ListItemFilter
 import c7n.filters.vpc as net_filters
 from c7n.filters.iamaccess import CrossAccountAccessFilter
+from c7n.filters.references import get_referenced
 from c7n.filters.related import RelatedResourceFilter, RelatedResourceByIdFilter
 from c7n.filters.revisions import Diff
 from c7n import query, resolver
@@ -941,7 +942,8 @@ class SecurityGroupPatch:
 
 class SGUsage(Filter):
 
-    nics = ()
+    # set when the eni scanner runs
+    nics = None
 
     def get_permissions(self):
         return list(itertools.chain(
@@ -979,7 +981,7 @@ class SGUsage(Filter):
     def scan_groups(self):
         used = set()
         for kind, scanner in self.get_scanners():
-            sg_ids = scanner()
+            sg_ids = get_referenced(self.manager, ('security-group', kind), scanner)
             new_refs = sg_ids.difference(used)
             used = used.union(sg_ids)
             self.log.debug(
@@ -1142,9 +1144,16 @@ class UsedSecurityGroup(SGUsage):
     interface_type_key = 'c7n:InterfaceTypes'
     interface_resource_type_key = 'c7n:InterfaceResourceTypes'
 
-    def _get_eni_attributes(self):
-        group_enis = {}
-        for nic in self.nics:
+    def get_eni_attribute_refs(self):
+        """Return (group id, owner id, interface type, resource type) of each eni group."""
+        nics = self.nics
+        if nics is None:
+            if 'nics' not in dict(self.get_scanners()):
+                return ()
+            # eni usage was served by the reference graph
+            nics = self.manager.get_resource_manager('eni').resources()
+        refs = set()
+        for nic in nics:
             instance_owner_id, interface_resource_type = '', ''
             if nic['Status'] == 'in-use':
                 if nic.get('Attachment') and 'InstanceOwnerId' in nic['Attachment']:
@@ -1152,11 +1161,22 @@ class UsedSecurityGroup(SGUsage):
                 interface_resource_type = get_eni_resource_type(nic)
             interface_type = nic.get('InterfaceType')
             for g in nic['Groups']:
-                group_enis.setdefault(g['GroupId'], []).append({
-                    'InstanceOwnerId': instance_owner_id,
-                    'InterfaceType': interface_type,
-                    'InterfaceResourceType': interface_resource_type
-                })
+                refs.add((
+                    g['GroupId'], instance_owner_id, interface_type, interface_resource_type))
+        return refs
+
+    def _get_eni_attributes(self):
+        group_enis = {}
+        # kept in the reference graph alongside the eni usage, so they're
+        # only scanned with it.
+        refs = get_referenced(
+            self.manager, ('security-group', 'nic-attributes'), self.get_eni_attribute_refs)
+        for group_id, instance_owner_id, interface_type, interface_resource_type in refs:
+            group_enis.setdefault(group_id, []).append({
+                'InstanceOwnerId': instance_owner_id,
+                'InterfaceType': interface_type,
+                'InterfaceResourceType': interface_resource_type
+            })
         return group_enis
 
     def process(self, resources, event=None):
@@ -2842,7 +2862,9 @@ class UnusedKeyPairs(Filter):
         return {i.get('KeyName',None) for i in ec2_manager.resources()}
 
     def process(self, resources, event=None):
-        keynames = self._pull_ec2_keynames().union(self._pull_asg_keynames())
+        keynames = get_referenced(
+            self.manager, ('key-pair', 'ec2'), self._pull_ec2_keynames).union(
+                get_referenced(self.manager, ('key-pair', 'asg'), self._pull_asg_keynames))
         if self.data.get('state', True):
             return [r for r in resources if r['KeyName'] not in keynames]
         return [r for r in resources if r['KeyName'] in keynames]
@@ -10,11 +10,13 @@ snapshots) and resources that support Amazon's Resource Groups Tagging API
 """
 from collections import Counter
 from concurrent.futures import as_completed
+import functools
 
 from datetime import datetime, timedelta
 from dateutil import tz as tzutil
 from dateutil.parser import parse
 
+import threading
 import time
 
 from c7n.manager import resources as aws_resources
@@ -65,6 +67,98 @@ def register_universal_tags(filters, actions, compatibility=True):
     actions.register('rename-tag', UniversalTagRename)
 
 
+# Below this many resources missing tags, or fraction of the resources
+# being augmented, tags are fetched by arn rather than scanning the
+# tags of all resources of the type.
+TAG_SCAN_THRESHOLD = 500
+TAG_SCAN_RATIO = 0.5
+
+TAG_RESULTS_LOCK = threading.Lock()
+
+
+class TagResults:
+    """Resource tags retrieved from the resource groups tagging api.
+
+    Shared across the resource managers of a policy execution, or of a
+    run's policies, by account and region, so each resource's tags are
+    retrieved once. Tag actions discard the results of resources they
+    change.
+    Resource types whose tags were scanned in full are recorded, resources
+    of those types without results have no tags.
+    """
+
+    def __init__(self):
+        self.tags = {}
+        self.scans = set()
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def get(self, arn, scan=None):
+        with self.lock:
+            if arn in self.tags:
+                return self.tags[arn]
+            if scan in self.scans and arn not in self.stale:
+                return []
+
+    def update(self, tags, scan=None):
+        with self.lock:
+            self.tags.update(tags)
+            self.stale.difference_update(tags)
+            if scan:
+                self.scans.add(scan)
+
+    def discard(self, arns):
+        with self.lock:
+            for arn in arns:
+                self.tags.pop(arn, None)
+            self.stale.update(arns)
+
+
+def get_tag_results(ctx, region):
+    # scoped to the execution, unless the run shares them across its
+    # policies, the context resets them when initialized.
+    key = (getattr(ctx.options, 'account_id', None), region)
+    with TAG_RESULTS_LOCK:
+        if getattr(ctx, 'tag_results', None) is None:
+            ctx.tag_results = {}
+        results = ctx.tag_results.get(key)
+        if results is None:
+            results = ctx.tag_results[key] = TagResults()
+        return results
+
+
+def invalidate_tag_results(manager, resources):
+    """Discard the shared tag results of resources whose tags changed."""
+    tag_results = getattr(manager.ctx, 'tag_results', None)
+    if not tag_results or not resources or manager.get_model().arn is False:
+        return
+    arns = manager.get_arns(resources)
+    for results in list(tag_results.values()):
+        results.discard(arns)
+
+
+def invalidates_tags(process):
+    """Decorate a tag action's process to invalidate the tags of its resources.
+
+    Resource specific tag actions inherit this from the base tag actions.
+    """
+    @functools.wraps(process)
+    def process_resources(self, resources):
+        try:
+            return process(self, resources)
+        finally:
+            invalidate_tag_results(self.manager, resources)
+    return process_resources
+
+
+def get_tag_scan_type(resource_type):
+    """Return the tagging api resource type filter for a resource type."""
+    if not resource_type.arn_type:
+        return None
+    service = getattr(resource_type, 'arn_service', None) or resource_type.service
+    return "%s:%s" % (service, resource_type.arn_type.split('/', 1)[0])
+
+
 def universal_augment(self, resources):
     # Resource Tagging API Support
     # https://docs.aws.amazon.com/awsconsolehelpdocs/latest/gsg/supported-resources.html
@@ -72,6 +166,10 @@ def universal_augment(self, resources):
     if not resources:
         return resources
 
+    rfetch = [r for r in resources if 'Tags' not in r]
+    if not rfetch:
+        return resources
+
     # For global resources, tags don't populate in the get_resources call
     # unless the call is being made to us-east-1
     region = getattr(self.resource_type, 'global_resource', None) and 'us-east-1' or self.region
@@ -79,25 +177,53 @@ def universal_augment(self, resources):
     client = utils.local_session(
         self.session_factory).client('resourcegroupstaggingapi', region_name=region)
 
+    results = get_tag_results(self.ctx, region)
+    scan = get_tag_scan_type(self.resource_type)
+    arn_resources = list(zip(self.get_arns(rfetch), rfetch))
+    pending = [arn for arn, r in arn_resources if results.get(arn, scan) is None]
+
+    if (scan and len(pending) >= TAG_SCAN_THRESHOLD and
+            len(pending) >= len(resources) * TAG_SCAN_RATIO):
+        scan_resource_tags(client, scan, pending, results)
+        pending = [arn for arn in pending if results.get(arn, scan) is None]
+
+    concurrency = getattr(self.config, 'tag_augment_concurrency', None) or 3
+    with self.executor_factory(max_workers=concurrency) as w:
+        futures = [
+            w.submit(fetch_resource_tags, client, arn_set)
+            for arn_set in utils.chunks(pending, 100)]
+        for f in as_completed(futures):
+            results.update(f.result())
+
+    for arn, r in arn_resources:
+        r['Tags'] = [dict(t) for t in results.get(arn, scan) or ()]
+    return resources
+
+
+def fetch_resource_tags(client, arns):
+    resource_tag_results = client.get_resources(
+        ResourceARNList=arns).get('ResourceTagMappingList', ())
+    # resources without tags aren't returned
+    tags = dict.fromkeys(arns, [])
+    tags.update({r['ResourceARN']: r['Tags'] for r in resource_tag_results})
+    return tags
+
+
+def scan_resource_tags(client, scan, arns, results):
+    """Retrieve the tags of all resources of a type in the account and region.
+
+    The scan is only recorded as complete if it returns some of the given
+    arns, as otherwise the type filter may not correspond to the resource.
+    """
     # Lazy for non circular :-(
     from c7n.query import RetryPageIterator
     paginator = client.get_paginator('get_resources')
     paginator.PAGE_ITERATOR_CLS = RetryPageIterator
 
-    rfetch = [r for r in resources if 'Tags' not in r]
-
-    for arn_resource_set in utils.chunks(
-            zip(self.get_arns(rfetch), rfetch), 100):
-        arn_resource_map = dict(arn_resource_set)
-        resource_tag_results = client.get_resources(
-            ResourceARNList=list(arn_resource_map.keys())).get(
-                'ResourceTagMappingList', ())
-        resource_tag_map = {
-            r['ResourceARN']: r['Tags'] for r in resource_tag_results}
-        for arn, r in arn_resource_map.items():
-            r['Tags'] = resource_tag_map.get(arn, [])
-
-    return resources
+    tags = {}
+    for page in paginator.paginate(ResourceTypeFilters=[scan], ResourcesPerPage=100):
+        tags.update({r['ResourceARN']: r['Tags'] for r in page.get('ResourceTagMappingList', ())})
+    results.update(tags, scan=not tags.keys().isdisjoint(arns) and scan or None)
 
 
 def _common_tag_processer(executor_factory, batch_size, concurrency, client,
@@ -166,6 +292,7 @@ class TagTrim(Action):
 
     permissions = ('ec2:DeleteTags',)
 
+    @invalidates_tags
     def process(self, resources):
         self.id_key = self.manager.get_model().id
 
@@ -387,6 +514,7 @@ class Tag(Action):
                     self.manager.data,))
         return self
 
+    @invalidates_tags
     def process(self, resources):
         # Legacy
         msg = self.data.get('msg')
@@ -461,6 +589,7 @@ class RemoveTag(Action):
     schema_alias = True
     permissions = ('ec2:DeleteTags',)
 
+    @invalidates_tags
     def process(self, resources):
         self.id_key = self.manager.get_model().id
 
@@ -553,6 +682,7 @@ class RenameTag(Action):
         ]
         return filtered_resources
 
+    @invalidates_tags
     def process(self, resources):
         count = len(resources)
         resources = self.filter_resources(resources)
@@ -663,6 +793,7 @@ class TagDelayedAction(Action):
             d['days'], d['hours'])
         return d
 
+    @invalidates_tags
     def process(self, resources):
         cfg = self.get_config_values()
         self.tz = tzutil.gettz(Time.TZ_ALIASES.get(cfg['tz']))
@@ -790,6 +921,7 @@ class NormalizeTag(Action):
         ]
         return filtered_resources
 
+    @invalidates_tags
     def process(self, resources):
         count = len(resources)
         resources = self.filter_resources(resources)
@@ -849,6 +981,7 @@ class UniversalTag(Tag):
     concurrency = 1
     permissions = ('tag:TagResources',)
 
+    @invalidates_tags
     def process(self, resources):
         self.id_key = self.manager.get_model().id
 
@@ -1010,6 +1143,7 @@ class UniversalTagDelayedAction(TagDelayedAction):
     batch_size = 20
     concurrency = 1
 
+    @invalidates_tags
     def process(self, resources):
         self.tz = tzutil.gettz(
             Time.TZ_ALIASES.get(self.data.get('tz', 'utc')))
@@ -1146,6 +1280,7 @@ class CopyRelatedResourceTag(Tag):
             )
         return self
 
+    @invalidates_tags
     def process(self, resources):
         related_resources = []
         if self.data['key'].startswith('tag:'):
@@ -23,7 +23,7 @@ import jmespath
 from jmespath import functions
 from jmespath.parser import Parser, ParsedResult
 
-from c7n import config
+from c7n import config, ratelimit
 from c7n.exceptions import ClientError, PolicyValidationError
 
 # Try to play nice in a serverless environment, where we don't require yaml
@@ -342,6 +342,65 @@ def reset_session_cache():
         setattr(CONN_CACHE, k, {})
 
 
+class ClientPool:
+    """Thread safe pool of boto3 clients shared across worker threads.
+
+    Sessions are created once per worker thread, while clients are
+    created once per service, region and config and shared by all
+    threads, reusing their underlying keep-alive connections.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.stats = {'sessions': 0, 'clients': 0, 'hits': 0}
+        self._local = threading.local()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def session(self):
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            s = self._local.session = self.session_factory()
+            with self._lock:
+                self.stats['sessions'] += 1
+        return s
+
+    def client(self, service, region_name=None, config=None):
+        # botocore config objects hash by identity, callers should
+        # reuse a config instance to share clients.
+        key = (service, region_name, config)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.stats['hits'] += 1
+                return client
+        client = self.session().client(service, region_name=region_name, config=config)
+        with self._lock:
+            if key in self._clients:
+                self.stats['hits'] += 1
+                return self._clients[key]
+            self.stats['clients'] += 1
+            self._clients[key] = client
+        return client
+
+
+CLIENT_POOLS_LOCK = threading.Lock()
+
+
+def get_client_pool(ctx, factory):
+    """Get the execution's shared client pool for a session factory.
+
+    Pools are kept on the execution context, and released with it.
+    """
+    with CLIENT_POOLS_LOCK:
+        if getattr(ctx, 'client_pools', None) is None:
+            ctx.client_pools = {}
+        pool = ctx.client_pools.get(factory)
+        if pool is None:
+            pool = ctx.client_pools[factory] = ClientPool(factory)
+        return pool
+
+
 def annotation(i, k):
     return i.get(k, ())
 
@@ -450,9 +509,11 @@ def get_retry(retry_codes=(), max_attempts=8, min_delay=1, log_retries=False):
     def _retry(func, *args, ignore_err_codes=(), **kw):
         for idx, delay in enumerate(
                 backoff_delays(min_delay, max_delay, jitter=True)):
+            ratelimit.acquire(func)
             try:
                 return func(*args, **kw)
             except ClientError as e:
+                ratelimit.record_error(func, e.response['Error']['Code'])
                 if e.response['Error']['Code'] in ignore_err_codes:
                     return
                 elif e.response['Error']['Code'] not in retry_codes:
@@ -1,5 +1,9 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
+import base64
+import json
+import zlib
+
 from botocore.exceptions import ClientError
 from c7n.exceptions import PolicyValidationError
 from c7n.actions import Action, ActionRegistry
@@ -51,3 +55,52 @@ class ActionRegistryTest(BaseTest):
         self.assertRaises(
             PolicyValidationError, ActionRegistry("test.actions").factory, "foo", None
         )
+
+
+class LambdaInvokeTest(BaseTest):
+
+    def get_action(self, **options):
+        p = self.load_policy({
+            'name': 'invoke',
+            'resource': 'dynamodb-table',
+            'actions': [dict({'type': 'invoke-lambda', 'function': 'process_resources'},
+                             **options)]})
+        return p.resource_manager.actions[0]
+
+    def test_payloads_by_size(self):
+        resources = [{'TableName': 'table-%d' % i, 'Data': 'x' * 10000} for i in range(30)]
+        action = self.get_action(batch_size=8)
+        payloads = list(action.get_payloads({'policy': {'name': 'invoke'}}, resources, 65536))
+        self.assertEqual(
+            [len(json.loads(p)['resources']) for p in payloads], [6, 6, 6, 6, 6])
+        self.assertTrue(all(len(p) <= 65536 for p in payloads))
+        self.assertEqual(
+            [r for p in payloads for r in json.loads(p)['resources']], resources)
+        self.assertEqual(json.loads(payloads[0])['policy'], {'name': 'invoke'})
+        # batch size still caps the resources per invocation
+        payloads = self.get_action(batch_size=4).get_payloads({}, resources, 65536)
+        self.assertEqual(
+            [len(json.loads(p)['resources']) for p in payloads], [4] * 7 + [2])
+
+    def test_payloads_compressed(self):
+        resources = [{'TableName': 'table-%d' % i, 'Status': 'ACTIVE'} for i in range(500)]
+        action = self.get_action(compress=True)
+        payloads = list(action.get_payloads({'policy': {'name': 'invoke'}}, resources, 4096))
+        decoded = [
+            json.loads(zlib.decompress(base64.b64decode(json.loads(p)))) for p in payloads]
+        self.assertTrue(all(len(p) <= 4096 for p in payloads))
+        self.assertEqual([r for d in decoded for r in d['resources']], resources)
+        self.assertEqual(decoded[0]['policy'], {'name': 'invoke'})
+
+    def test_invoke_batches(self):
+        factory = self.replay_flight_data('test_dynamodb_invoke_action')
+        p = self.load_policy({
+            'name': 'invoke',
+            'resource': 'dynamodb-table',
+            'actions': [{'type': 'invoke-lambda', 'function': 'process_resources',
+                         'batch_size': 2, 'concurrency': 2}]},
+            session_factory=factory)
+        results = p.resource_manager.actions[0].process(
+            [{'TableName': 'table-%d' % i} for i in range(5)])
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r['StatusCode'] == 202 for r in results))
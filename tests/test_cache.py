@@ -43,6 +43,28 @@ class MemCacheTest(TestCase):
         mem_cache.close()
 
 
+def test_run_resource_cache():
+    run_cache = cache.RunResourceCache(None, users=2)
+    key = {'region': 'us-east-1', 'resource': 'ec2'}
+    resources = [{'id': 'a', 'Tags': [{'Key': 'Env', 'Value': 'dev'}]}]
+    run_cache.save(key, resources)
+    resources[0]['c7n:annotation'] = True
+    resources[0]['Tags'][0]['Value'] = 'prod'
+
+    expected = [{'id': 'a', 'Tags': [{'Key': 'Env', 'Value': 'dev'}]}]
+    cached = run_cache.get(key)
+    assert cached == expected
+    cached[0]['c7n:annotation'] = True
+    cached[0]['Tags'][0]['Value'] = 'prod'
+    cached[0]['Tags'].append({'Key': 'Owner', 'Value': 'me'})
+    assert run_cache.get(key) == expected
+
+    run_cache.release()
+    assert run_cache.size() == 1
+    run_cache.release()
+    assert run_cache.get(key) is None
+
+
 def test_sqlkv(tmp_path):
     kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
     kv.load()
@@ -99,3 +121,101 @@ def test_sqlkv_convert(tmp_path):
     kv.close()
     with open(cache_path, 'rb') as fh:
         assert fh.read(15) == b"SQLite format 3"
+
+
+def test_item_cache_factory(tmp_path):
+    assert isinstance(
+        cache.factory(config.Bag(
+            cache=tmp_path / "cache.db", cache_period=60, cache_items=True)),
+        cache.SqlItemCache)
+
+
+def test_item_cache_resources(tmp_path):
+    kv = cache.SqlItemCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    k1 = {"account": "123456789012", "region": "us-west-2", "resource": "ec2", "q": None}
+    v1 = [{'id': 'a', 'v': 1}, {'id': 'b', 'v': 2}, {'id': 'c', 'v': 3}]
+
+    assert kv.get(k1) is None
+    assert kv.get_resources(k1, ['a'], 'id') is None
+    kv.save_resources(k1, v1, 'id')
+    assert kv.get(k1) == v1
+    assert kv.get_resources(k1, ['b'], 'id') == [{'id': 'b', 'v': 2}]
+    # unknown ids are left for the caller to fetch
+    assert kv.get_resources(k1, ['b', 'd'], 'id') is None
+
+    # refresh a single resource, visible through other queries on the type
+    kv.update_resources(k1, [{'id': 'b', 'v': 4}], 'id')
+    assert kv.get(k1)[1] == {'id': 'b', 'v': 4}
+    assert kv.get_resources(
+        dict(k1, q={'Filters': []}), ['b'], 'id') is None
+    kv.save_resources(dict(k1, q={'Filters': []}), [{'id': 'b', 'v': 4}], 'id')
+    assert kv.get_resources(
+        dict(k1, q={'Filters': []}), ['b'], 'id') == [{'id': 'b', 'v': 4}]
+
+    # removing a member invalidates the full set
+    kv.invalidate(k1, ['c'])
+    assert kv.get(k1) is None
+    kv.save_resources(k1, v1, 'id')
+    kv.invalidate(k1)
+    assert kv.get(k1) is None
+    kv.close()
+
+
+def test_item_cache_expired(tmp_path):
+    kv = cache.SqlItemCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    k1 = {"account": "123456789012", "region": "us-west-2", "resource": "ec2", "q": None}
+    kv.save_resources(k1, [{'id': 'a'}, {'id': 'b'}], 'id')
+    kv.update_resources(
+        k1, [{'id': 'b'}], 'id', datetime.utcnow() - timedelta(days=1))
+    assert kv.get_resources(k1, ['a'], 'id') == [{'id': 'a'}]
+    assert kv.get(k1) is None
+    kv.close()
+
+    # stale items are removed on load
+    kv.load()
+    assert kv.conn.execute('select count(*) from c7n_cache_item').fetchone()[0] == 1
+    kv.close()
+
+
+def test_sqlkv_many(tmp_path):
+    kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    keys = [{"metric": "m", "dimensions": [("QueueName", str(i))]} for i in range(600)]
+    kv.save_many([(k, i) for i, k in enumerate(keys)])
+    assert kv.get_many(keys + [{"metric": "n"}]) == list(range(600)) + [None]
+    assert kv.get(keys[3]) == 3
+    kv.close()
+
+
+def test_sqlkv_retention(tmp_path):
+    cache_path = tmp_path / "cache.db"
+    # caches created before values had their own retention
+    conn = sqlite3.connect(cache_path)
+    conn.execute(
+        'create table c7n_cache (key blob primary key, value blob, create_date timestamp)')
+    conn.close()
+
+    kv = cache.SqlKvCache(config.Bag(cache=cache_path, cache_period=60))
+    kv.load()
+    earlier = datetime.utcnow() - timedelta(hours=2)
+    kv.save_many([("a", 1)], retention=timedelta(days=1), timestamp=earlier)
+    kv.save_many([("b", 2)], retention=timedelta(hours=1), timestamp=earlier)
+    kv.save_many([("c", 3)], timestamp=earlier)
+    assert kv.get_many(["a", "b", "c"]) == [1, None, None]
+    kv.close()
+
+    # expired values are removed on load
+    kv.load()
+    assert kv.conn.execute('select count(*) from c7n_cache').fetchone()[0] == 1
+    assert kv.get("a") == 1
+    kv.close()
+
+
+def test_item_cache_values(tmp_path):
+    kv = cache.SqlItemCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    kv.save(("uri-resolver", "s3://bucket/key"), "contents")
+    assert kv.get(("uri-resolver", "s3://bucket/key")) == "contents"
+    kv.close()
@@ -3,6 +3,8 @@
 import json
 import os
 import sys
+import threading
+import time
 
 from argparse import ArgumentTypeError
 from datetime import datetime, timedelta
@@ -83,6 +85,12 @@ class UtilsTest(BaseTest):
         param = "day=today"
         self.assertIs(cli._key_val_pair(param), param)
 
+    def test_positive_int(self):
+        self.assertRaises(ArgumentTypeError, cli._positive_int, "0")
+        self.assertRaises(ArgumentTypeError, cli._positive_int, "-1")
+        self.assertRaises(ArgumentTypeError, cli._positive_int, "two")
+        self.assertEqual(cli._positive_int("2"), 2)
+
 
 class VersionTest(CliTest):
 
@@ -566,6 +574,117 @@ class RunTest(CliTest):
             ["custodian", "run", "-s", temp_dir, "--debug", yaml_file], CustomError
         )
 
+    def test_shared_fetch(self):
+        session_factory = self.replay_flight_data(
+            "test_ec2_state_transition_age_filter"
+        )
+
+        from c7n.policy import PolicyCollection
+        from c7n.query import DescribeSource
+
+        self.patch(
+            PolicyCollection,
+            "session_factory",
+            staticmethod(lambda x=None: session_factory),
+        )
+        fetches = []
+        describe = DescribeSource.resources
+
+        def resources(source, query):
+            fetches.append(source.manager.ctx.policy.name)
+            return describe(source, query)
+
+        self.patch(DescribeSource, "resources", resources)
+
+        temp_dir = self.get_temp_dir()
+        yaml_file = self.write_policy_file(
+            {
+                "policies": [
+                    {
+                        "name": "ec2-running",
+                        "resource": "ec2",
+                        "filters": [{"State.Name": "running"}],
+                    },
+                    {
+                        "name": "ec2-age",
+                        "resource": "ec2",
+                        "filters": [{"type": "state-age", "days": 30}],
+                    },
+                ]
+            }
+        )
+        self.run_and_expect_success(
+            ["custodian", "run", "--cache-period", "0", "-s", temp_dir, yaml_file])
+        self.assertEqual(fetches, ["ec2-running"])
+
+    def test_parallel(self):
+        from c7n.policy import Policy
+        executed = []
+
+        def policy_call(p):
+            executed.append((p.name, threading.current_thread().name))
+            if p.name == "ebs-error":
+                raise Exception("foobar")
+
+        self.patch(Policy, "__call__", policy_call)
+
+        temp_dir = self.get_temp_dir()
+        yaml_file = self.write_policy_file(
+            {
+                "policies": [
+                    {"name": "ec2-one", "resource": "ec2"},
+                    {"name": "ebs-error", "resource": "ebs"},
+                    {"name": "ec2-two", "resource": "ec2"},
+                    {"name": "s3", "resource": "s3"},
+                ]
+            }
+        )
+        log_output = self.capture_logging("custodian.commands")
+        self.run_and_expect_failure(
+            ["custodian", "run", "-s", temp_dir, "-j", "3", yaml_file], 2)
+        self.assertIn(
+            "following policies had errors while executing\n - ebs-error",
+            log_output.getvalue())
+        self.assertEqual(
+            sorted(name for name, _ in executed),
+            ["ebs-error", "ec2-one", "ec2-two", "s3"])
+        # policies on the same resource type run serially in one group
+        threads = dict(executed)
+        self.assertEqual(threads["ec2-one"], threads["ec2-two"])
+        self.assertLess(
+            [n for n, _ in executed].index("ec2-one"),
+            [n for n, _ in executed].index("ec2-two"))
+
+    def test_parallel_service_concurrency(self):
+        from c7n.policy import Policy
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def policy_call(p):
+            with lock:
+                active.append(p.name)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(p.name)
+
+        self.patch(Policy, "__call__", policy_call)
+        self.patch_account_id()
+        policies = [
+            self.load_policy(
+                {"name": "ec2-%s" % region, "resource": "ec2"},
+                config={"region": region, "workers": 4, "service_concurrency": 1})
+            for region in ("us-east-1", "us-west-2", "eu-west-1")]
+        self.assertEqual(
+            commands._run_parallel(policies[0].options, policies), [])
+        self.assertEqual(max(peak), 1)
+
+        # a cap below one still runs a group at a time
+        policies[0].options.service_concurrency = 0
+        self.assertEqual(
+            commands._run_parallel(policies[0].options, policies), [])
+
 
 class MetricsTest(CliTest):
 
@@ -90,7 +90,7 @@ class TestEcsService(BaseTest):
 
     def test_ecs_service_config(self):
         session_factory = self.replay_flight_data(
-            'test_ecs_service_config')
+            'test_ecs_service_config_batch')
         p = self.load_policy({
             'name': 'ctags', 'resource': 'ecs-service', 'source': 'config'},
             session_factory=session_factory)
@@ -99,6 +99,17 @@ class TestEcsService(BaseTest):
         assert resources[0]['name'] == 'queue-processor'
         assert resources[0]['clusterArn'].endswith('cluster/dev')
 
+    def test_ecs_service_config_history(self):
+        session_factory = self.replay_flight_data(
+            'test_ecs_service_config')
+        p = self.load_policy({
+            'name': 'ctags', 'resource': 'ecs-service', 'source': 'config'},
+            session_factory=session_factory)
+        resources = p.resource_manager.source.get_resources(
+            ['arn:aws:ecs:us-east-2:644160558196:service/dev/queue-processor'])
+        assert len(resources) == 1
+        assert resources[0]['name'] == 'queue-processor'
+
     def test_ecs_service_tag_augment(self):
         session_factory = self.replay_flight_data(
             'test_ecs_service_tag_augment')
@@ -6,13 +6,15 @@ from collections import namedtuple
 from datetime import datetime, timedelta
 from dateutil import tz
 from dateutil.parser import parse as parse_date
+import json
 import random
 import unittest
 import os
 
+from c7n.config import Config
 from c7n.exceptions import PolicyValidationError, PolicyExecutionError
 from c7n.executor import MainThreadExecutor
-from c7n import filters as base_filters
+from c7n import cache as c7n_cache, filters as base_filters
 from c7n.resources.ec2 import filters
 from c7n.resources.elb import ELB
 from c7n.testing import mock_datetime_now
@@ -1149,6 +1151,236 @@ class TestMetricsFilter(BaseTest):
                 for res in resources)
         )
 
+    def test_metrics_batched(self):
+        self.patch(ELB, "executor_factory", MainThreadExecutor)
+        self.patch(base_filters.MetricsFilter, "BATCH_THRESHOLD", 2)
+        session_factory = self.replay_flight_data("test_metrics_batched")
+
+        p = self.load_policy(
+            {
+                "name": "elb-batched-metrics",
+                "resource": "elb",
+                "filters": [
+                    {
+                        "type": "metrics",
+                        "value": 0,
+                        "name": "RequestCount",
+                        "op": "eq",
+                        "statistics": "Sum",
+                        "missing-value": 0.0,
+                    }
+                ],
+            },
+            config={"account_id": "644160558196"},
+            session_factory=session_factory,
+        )
+        resources = p.run()
+        self.assertEqual(
+            [r["LoadBalancerName"] for r in resources],
+            ["test-elb-zero-metrics", "test-elb-missing-metrics"])
+        self.assertEqual(
+            [[d["Sum"] for d in r["c7n.metrics"]["AWS/ELB.RequestCount.Sum.14"]]
+             for r in resources],
+            [[0.0], [0.0]])
+        self.assertEqual(
+            resources[1]["c7n.metrics"]["AWS/ELB.RequestCount.Sum.14"][0]["c7n:detail"],
+            "Fill value for missing data")
+
+    def test_metrics_batched_extended_statistics(self):
+        self.patch(ELB, "executor_factory", MainThreadExecutor)
+        self.patch(base_filters.MetricsFilter, "BATCH_THRESHOLD", 2)
+        session_factory = self.replay_flight_data("test_metrics_batched")
+
+        p = self.load_policy(
+            {
+                "name": "elb-batched-metrics",
+                "resource": "elb",
+                "filters": [
+                    {
+                        "type": "metrics",
+                        "value": 100,
+                        "name": "RequestCount",
+                        "op": "gt",
+                        "statistics": "p99",
+                    }
+                ],
+            },
+            config={"account_id": "644160558196"},
+            session_factory=session_factory,
+        )
+        resources = p.run()
+        self.assertEqual(len(resources), 0)
+        metrics_filter = p.resource_manager.filters[0]
+        self.assertEqual(
+            metrics_filter.get_datapoint("2019-06-25", 120.0),
+            {"Timestamp": "2019-06-25", "ExtendedStatistics": {"p99": 120.0}})
+        self.assertTrue(metrics_filter.match_datapoints(
+            {}, [metrics_filter.get_datapoint("2019-06-25", 120.0)]))
+
+    def test_metrics_cache(self):
+        self.patch(ELB, "executor_factory", MainThreadExecutor)
+        session_factory = self.replay_flight_data("test_missing_metrics")
+        policy_data = {
+            "name": "elb-missing-metrics-with-fill",
+            "resource": "elb",
+            "filters": [
+                {
+                    "type": "metrics",
+                    "value": 0,
+                    "name": "RequestCount",
+                    "op": "eq",
+                    "statistics": "Sum",
+                    "missing-value": 0.0,
+                }
+            ],
+        }
+        config = {"account_id": "644160558196"}
+
+        with mock_datetime_now(parse_date("2019-07-09T15:30:00"), base_filters.metrics):
+            p = self.load_policy(
+                policy_data, config=config, session_factory=session_factory, cache=True)
+            self.assertEqual(len(p.run()), 2)
+            cache = p.resource_manager._cache
+
+            # the same query window is served from the cache
+            p = self.load_policy(policy_data, config=config, session_factory=session_factory)
+            p.resource_manager._cache = cache
+            with unittest.mock.patch("c7n.filters.metrics.local_session") as local_session:
+                local_session.return_value.client.return_value.get_metric_statistics.side_effect = (
+                    AssertionError)
+                resources = p.run()
+        self.assertEqual(len(resources), 2)
+        self.assertEqual(
+            [len(r["c7n.metrics"]["AWS/ELB.RequestCount.Sum.14"]) for r in resources],
+            [1, 1])
+
+        # entries are scoped to the account and region
+        metrics_filter = p.resource_manager.filters[0]
+        query_key = metrics_filter.get_query_key(
+            [{"Name": "LoadBalancerName", "Value": "test"}])
+        self.assertEqual(
+            (query_key["account"], query_key["region"]), ("644160558196", "us-east-1"))
+
+    def test_metrics_cache_resume(self):
+        p = self.load_policy({
+            "name": "ec2-metrics",
+            "resource": "ec2",
+            "filters": [{
+                "type": "metrics", "name": "CPUUtilization", "days": 3,
+                "period": 86400, "value": 1}]})
+        metrics_filter = p.resource_manager.filters[0]
+        metrics_filter.period = 86400
+        metrics_filter.start = datetime(2023, 7, 4)
+        metrics_filter.end = datetime(2023, 7, 7)
+        datapoints = [
+            {"Timestamp": datetime(2023, 7, day, tzinfo=tz.tzutc()), "Average": day}
+            for day in (2, 3, 4, 5)]
+
+        # an earlier window on the same period boundaries
+        resume, cached = metrics_filter.get_resume_point({
+            "start": datetime(2023, 7, 2), "end": datetime(2023, 7, 6),
+            "datapoints": datapoints})
+        self.assertEqual(resume, datetime(2023, 7, 5))
+        self.assertEqual([d["Average"] for d in cached], [4])
+
+        # the same window
+        resume, cached = metrics_filter.get_resume_point({
+            "start": datetime(2023, 7, 4), "end": datetime(2023, 7, 7),
+            "datapoints": datapoints})
+        self.assertEqual(resume, datetime(2023, 7, 7))
+        self.assertEqual([d["Average"] for d in cached], [4, 5])
+
+        # an earlier window ending mid period, the partial period is retrieved again
+        resume, cached = metrics_filter.get_resume_point({
+            "start": datetime(2023, 7, 2), "end": datetime(2023, 7, 6, 12),
+            "datapoints": datapoints})
+        self.assertEqual(resume, datetime(2023, 7, 6))
+        self.assertEqual([d["Average"] for d in cached], [4, 5])
+
+        # windows on other period boundaries, which don't overlap, or without
+        # a complete period to reuse
+        for start, end in (
+                (datetime(2023, 7, 2, 12), datetime(2023, 7, 6, 12)),
+                (datetime(2023, 7, 1), datetime(2023, 7, 3)),
+                (datetime(2023, 7, 3, 12), datetime(2023, 7, 4, 12))):
+            self.assertEqual(
+                metrics_filter.get_resume_point(
+                    {"start": start, "end": end, "datapoints": datapoints}),
+                (datetime(2023, 7, 4), []))
+        self.assertEqual(
+            metrics_filter.get_resume_point(None), (datetime(2023, 7, 4), []))
+
+    def test_metrics_cache_overlap(self):
+        policy_data = {
+            "name": "ec2-metrics",
+            "resource": "ec2",
+            "filters": [{
+                "type": "metrics", "name": "CPUUtilization", "days": 1,
+                "period": 3600, "value": 1, "op": "gte"}]}
+        cache_db = c7n_cache.SqlKvCache(Bag(
+            cache=os.path.join(self.get_temp_dir(), "cache.db"), cache_period=180))
+        requests = []
+
+        def get_metric_statistics(**params):
+            requests.append((params["StartTime"], params["EndTime"]))
+            hours = int((params["EndTime"] - params["StartTime"]).total_seconds() // 3600)
+            return {"Datapoints": [
+                {"Timestamp": params["StartTime"] + timedelta(hours=h),
+                 "Average": len(requests)}
+                for h in range(hours + 1)]}
+
+        def run(now):
+            p = self.load_policy(policy_data)
+            p.resource_manager._cache = cache_db
+            resources = [{"InstanceId": "i-0123"}]
+            with mock_datetime_now(now, base_filters.metrics), \
+                    mock_datetime_now(now, c7n_cache):
+                with unittest.mock.patch("c7n.filters.metrics.local_session") as session:
+                    session.return_value.client.return_value.get_metric_statistics = (
+                        get_metric_statistics)
+                    p.resource_manager.filters[0].process(resources)
+            return resources[0]["c7n.metrics"]["AWS/EC2.CPUUtilization.Average.1"]
+
+        first = run(datetime(2023, 7, 4, 10, 20))
+        # the window is left as is without cached datapoints
+        self.assertEqual(requests, [(datetime(2023, 7, 3, 10, 21), datetime(2023, 7, 4, 10, 21))])
+        self.assertEqual(len(first), 25)
+
+        # two hours on, the cached window is resumed from its last, partial,
+        # period.
+        second = run(datetime(2023, 7, 4, 12, 20))
+        self.assertEqual(
+            requests[1], (datetime(2023, 7, 4, 9, 21), datetime(2023, 7, 4, 12, 21)))
+        self.assertEqual(
+            [d["Timestamp"] for d in second],
+            [datetime(2023, 7, 3, 12, 21) + timedelta(hours=h) for h in range(25)])
+        # cached datapoints up to the resumed period, retrieved ones after
+        self.assertEqual([d["Average"] for d in second], [1] * 21 + [2] * 4)
+        self.assertEqual(second[0], first[2])
+
+    def test_metrics_cache_retention(self):
+        def get_retention(cache_period):
+            p = self.load_policy({
+                "name": "ec2-metrics",
+                "resource": "ec2",
+                "filters": [{
+                    "type": "metrics", "name": "CPUUtilization", "days": 14,
+                    "period": 86400, "value": 1}]},
+                config={"cache_period": cache_period})
+            metrics_filter = p.resource_manager.filters[0]
+            metrics_filter.start, metrics_filter.end = metrics_filter.get_metric_window()
+            metrics_filter.namespace, metrics_filter.metric = "AWS/EC2", "CPUUtilization"
+            metrics_filter.statistics, metrics_filter.period = "Average", 86400
+            key = metrics_filter.get_metric_key()
+            resources = [{"InstanceId": "i-0123", "c7n.metrics": {key: []}}]
+            cache = unittest.mock.MagicMock()
+            metrics_filter.save_cached_metrics(cache, resources, {id(resources[0]): "query"})
+            return cache.save_many.call_args[1]["retention"]
+
+        # kept for the cache period, up to the length of the window
+        self.assertEqual(get_retention(60), timedelta(minutes=60))
+        self.assertEqual(get_retention(60 * 24 * 30), timedelta(days=14))
+
     def test_metric_period_rounding(self):
         """Round metrics start and end times to align with CloudWatch retention periods"""
 
@@ -1551,6 +1783,7 @@ class ListItemFilterTest(BaseFilterTest):
             ctx = unittest.mock.MagicMock()
         m = Manager()
         m.ctx.options.cache = None
+        m.ctx.options.columnar_threshold = 0
         return m
 
     def instance(self, id_, list_):
@@ -1731,6 +1964,180 @@ class ListItemFilterTest(BaseFilterTest):
         self.assertEqual(len(resources), 1)
 
 
+class TestFilterPlans(BaseTest):
+
+    def test_value_filter_plan(self):
+        resources = [
+            instance(Architecture="x86_64", Tags=[{"Key": "Env", "Value": "Prod"}]),
+            instance(Architecture="arm64", Placement={"AvailabilityZone": None}),
+            {"Architecture": "x86_64"},
+        ]
+        cases = [
+            ({"tag:Env": "Prod"}, [True, False, False]),
+            ({"tag:Env": "absent"}, [False, True, True]),
+            ({"Placement.AvailabilityZone": "us-west-2c"}, [True, False, False]),
+            ({"Placement.AvailabilityZone": "present"}, [True, False, False]),
+            ({"type": "value", "key": "Tags[?Key=='Env'].Value | [0]",
+              "value": "prod", "value_type": "normalize"}, [True, False, False]),
+            ({"type": "value", "key": "Architecture", "op": "in",
+              "value": ["arm64", "ppc"]}, [False, True, False]),
+            ({"type": "value", "key": "Missing", "op": "not-in",
+              "value": ["arm64"]}, [True, True, True]),
+            ({"type": "value", "key": "Architecture", "op": "regex",
+              "value": "x86.*"}, [True, False, True]),
+            ({"type": "value", "key": "LaunchTime", "value_type": "age",
+              "op": "gt", "value": 30}, [True, True, False]),
+            ({"type": "value", "key": "Placement.AvailabilityZone",
+              "value_regex": "us-west-([0-9])[a-z]", "value": "2"},
+             [True, False, False]),
+        ]
+        for data, expected in cases:
+            compiled = filters.factory(data)
+            self.assertEqual([compiled.match(r) for r in resources], expected, data)
+            self.assertIsNotNone(compiled.plan)
+
+    def test_value_filter_plan_age_now(self):
+        resource = {"LaunchTime": "2020-01-10T00:00:00+00:00"}
+        with mock_datetime_now(parse_date("2020-01-10T12:00:00+00:00"), base_filters.core.datetime):
+            compiled = filters.factory(
+                {"type": "value", "key": "LaunchTime", "value_type": "age",
+                 "op": "gt", "value": 1})
+            self.assertFalse(compiled.match(resource))
+        # the age threshold moves with the current time of each match
+        with mock_datetime_now(parse_date("2020-01-12T00:00:00+00:00"), base_filters.core.datetime):
+            self.assertTrue(compiled.match(resource))
+
+    def test_boolean_plan(self):
+        policy_data = {
+            "name": "ec2-plan",
+            "resource": "ec2",
+            "filters": [
+                {"or": [
+                    {"Architecture": "x86_64"},
+                    {"and": [{"tag:Env": "Prod"}, {"not": [{"Color": "green"}]}]}]}]}
+        resources = [
+            instance(InstanceId="i-1", Architecture="x86_64", Color="green"),
+            instance(InstanceId="i-2", Architecture="arm64",
+                     Tags=[{"Key": "Env", "Value": "Prod"}]),
+            instance(InstanceId="i-3", Architecture="arm64", Color="green",
+                     Tags=[{"Key": "Env", "Value": "Prod"}]),
+            instance(InstanceId="i-4", Architecture="arm64"),
+        ]
+        [or_filter] = self.load_policy(policy_data).resource_manager.filters
+        self.assertIsNotNone(or_filter.get_plan())
+        results = or_filter.process(copy.deepcopy(resources))
+        self.assertEqual(
+            [r["Architecture"] for r in results], ["x86_64", "arm64"])
+        self.assertEqual(
+            [annotation(r, "c7n:MatchedFilters") for r in results],
+            [["Architecture"], ["tag:Env"]])
+
+        # matches the uncompiled evaluation
+        [or_filter] = self.load_policy(policy_data).resource_manager.filters
+        or_filter._plan = False
+        expected = or_filter.process(copy.deepcopy(resources))
+        self.assertEqual(
+            sorted(results, key=json.dumps), sorted(expected, key=json.dumps))
+
+    def test_boolean_plan_unsupported(self):
+        p = self.load_policy({
+            "name": "ec2-plan",
+            "resource": "ec2",
+            "filters": [
+                {"or": [{"Architecture": "x86_64"}, {"type": "instance-age", "days": 1}]}]})
+        [or_filter] = p.resource_manager.filters
+        self.assertIsNone(or_filter.get_plan())
+
+
+class TestColumnarEngine(BaseTest):
+
+    now = datetime.now(tz=tz.tzutc())
+
+    def get_resources(self):
+        now = self.now
+        return [
+            instance(InstanceId="i-1", Architecture="x86_64", CpuCount=4,
+                     LaunchTime=(now - timedelta(90)).isoformat(),
+                     Tags=[{"Key": "Env", "Value": "Prod"}]),
+            instance(InstanceId="i-2", Architecture="arm64", CpuCount=2,
+                     LaunchTime=now - timedelta(1),
+                     Tags=[{"Key": "Env", "Value": "dev-1"}]),
+            instance(InstanceId="i-3", Architecture="arm64", CpuCount="8",
+                     LaunchTime=None, Tags=[]),
+            instance(InstanceId="i-4", Architecture=["x86_64"], CpuCount=None,
+                     LaunchTime="not-a-date", Tags=[{"Key": "Env", "Value": "Prod"}]),
+        ]
+
+    def assertColumnar(self, policy_filters, expected):
+        policy_data = {
+            "name": "ec2-columnar", "resource": "ec2", "filters": policy_filters}
+        manager = self.load_policy(policy_data).resource_manager
+        expected_results = manager.filter_resources(self.get_resources())
+
+        manager = self.load_policy(
+            policy_data, config={"columnar_threshold": 2}).resource_manager
+        with unittest.mock.patch.object(
+                base_filters.ValueFilter, "process", side_effect=AssertionError):
+            results = manager.filter_resources(self.get_resources())
+        self.assertEqual([r["InstanceId"] for r in results], expected)
+        self.assertEqual(results, expected_results)
+
+    def test_columnar_operators(self):
+        cases = [
+            ({"tag:Env": "Prod"}, ["i-1", "i-4"]),
+            ({"type": "value", "key": "CpuCount", "op": "gte", "value": 4}, ["i-1"]),
+            ({"type": "value", "key": "Architecture", "op": "ne",
+              "value": "arm64"}, ["i-1", "i-4"]),
+            ({"type": "value", "key": "Architecture", "op": "in",
+              "value": ["arm64", "ppc"]}, ["i-2", "i-3"]),
+            ({"type": "value", "key": "tag:Env", "op": "not-in",
+              "value": ["Prod"]}, ["i-2", "i-3"]),
+            ({"type": "value", "key": "tag:Env", "op": "regex",
+              "value": "prod|DEV-[0-9]"}, ["i-1", "i-2", "i-4"]),
+            ({"type": "value", "key": "tag:Env", "op": "glob",
+              "value": "dev-*"}, ["i-2"]),
+            ({"type": "value", "key": "LaunchTime", "value_type": "age",
+              "op": "gt", "value": 30}, ["i-1"]),
+            ({"type": "value", "key": "LaunchTime", "value_type": "expiration",
+              "op": "lt", "value": 30}, ["i-1", "i-2"]),
+            # per resource fallbacks
+            ({"tag:Env": "absent"}, ["i-3"]),
+            ({"type": "value", "key": "CpuCount", "value_type": "integer",
+              "op": "gt", "value": 4}, ["i-3"]),
+        ]
+        for data, expected in cases:
+            self.assertColumnar([data], expected)
+
+    def test_columnar_blocks(self):
+        self.assertColumnar([
+            {"or": [
+                {"Architecture": "x86_64"},
+                {"and": [
+                    {"tag:Env": "present"},
+                    {"not": [{"type": "value", "key": "CpuCount",
+                              "op": "lt", "value": 3}]}]},
+                {"type": "value", "key": "LaunchTime", "value_type": "age",
+                 "op": "lt", "value": 7}]}],
+            ["i-1", "i-2", "i-4"])
+
+    def test_columnar_unsupported(self):
+        p = self.load_policy({
+            "name": "ec2-columnar",
+            "resource": "ec2",
+            "filters": [
+                {"or": [{"Architecture": "x86_64"}, {"type": "instance-age", "days": 1}]},
+                {"and": [{"tag:Env": "Prod"}]}]})
+        from c7n.filters import columnar
+        or_filter, and_filter = p.resource_manager.filters
+        self.assertFalse(columnar.supports(or_filter))
+        self.assertTrue(columnar.supports(and_filter))
+        config = Config.empty(columnar_threshold=3)
+        self.assertFalse(columnar.is_enabled(config, [{}, {}]))
+        self.assertTrue(columnar.is_enabled(config, [{}, {}, {}]))
+        self.assertFalse(columnar.is_enabled(Config.empty(), [{}, {}, {}]))
+        self.assertFalse(columnar.is_enabled(None, [{}, {}, {}]))
+
+
 class AnnotationSweeperTest(unittest.TestCase):
     def test_annotation_sweep_jmespath(self):
         resources = [
@@ -1768,5 +2175,79 @@ class AnnotationSweeperTest(unittest.TestCase):
         self.assertEqual(resources, swept)
 
 
+class RelatedResourceIndexTest(BaseTest):
+
+    def test_related_shared_across_filters(self):
+        session_factory = self.replay_flight_data("test_ec2_security_group_filter")
+        p = self.load_policy(
+            {
+                "name": "ec2-sg",
+                "resource": "ec2",
+                "filters": [
+                    {"or": [
+                        {"type": "security-group", "key": "GroupName",
+                         "value": "launch-wizard-1"},
+                        {"type": "security-group", "key": "GroupName",
+                         "value": "(.*PROD-ONLY.*)", "op": "regex"}]},
+                    {"type": "security-group", "key": "GroupName",
+                     "value": "absent", "op": "ne"},
+                ],
+            },
+            session_factory=session_factory,
+        )
+        from c7n.resources.vpc import SecurityGroup
+        fetched = []
+        get_resources = SecurityGroup.get_resources
+
+        def record_get_resources(manager, ids, *args, **kw):
+            fetched.append(sorted(ids))
+            return get_resources(manager, ids, *args, **kw)
+
+        with unittest.mock.patch.object(SecurityGroup, 'get_resources', record_get_resources):
+            resources = p.run()
+        self.assertEqual(len(resources), 3)
+        self.assertEqual(fetched, [['sg-411b413c', 'sg-926a56e8']])
+
+        index = p.resource_manager.ctx.related_index
+        self.assertEqual(
+            [sorted(r) for r in index.related.values()],
+            [['sg-411b413c', 'sg-926a56e8']])
+
+    def test_related_ids_by_resource(self):
+        from c7n.filters.related import RelatedResourceFilter
+
+        class GroupFilter(RelatedResourceFilter):
+            RelatedIdsExpression = "Groups[].GroupId"
+
+        f = GroupFilter({}, unittest.mock.MagicMock())
+        resources = [
+            {"Groups": [{"GroupId": "a"}, {"GroupId": "b"}]},
+            {"Groups": []},
+            {},
+            {"Groups": [{"GroupId": "b"}]}]
+        self.assertEqual(
+            f.get_resource_related_ids(resources), [{"a", "b"}, set(), set(), {"b"}])
+        self.assertEqual(f.get_related_ids(resources), {"a", "b"})
+        self.assertEqual(f.get_related_ids(resources[:1]), {"a", "b"})
+
+        f.get_related = lambda resources: {}
+        f.process_resource = lambda r, related: bool(f.get_related_ids([r]))
+        self.assertEqual(f.process(resources), [resources[0], resources[3]])
+        self.assertIsNone(f.resource_related_ids)
+
+    def test_related_fetch_population(self):
+        from c7n.filters.related import RelatedResourceIndex
+        manager = unittest.mock.MagicMock()
+        manager.get_model.return_value.id = 'Id'
+        manager.resources.return_value = [{'Id': 'a'}, {'Id': 'b'}, {'Id': 'c'}]
+        index = RelatedResourceIndex()
+
+        self.assertEqual(index.get_related(manager, ['a', 'b', 'x'], 2), {
+            'a': {'Id': 'a'}, 'b': {'Id': 'b'}})
+        self.assertEqual(index.get_related(manager, ['c', 'x'], 1), {'c': {'Id': 'c'}})
+        self.assertEqual(manager.resources.call_count, 1)
+        self.assertEqual(manager.get_resources.call_count, 0)
+
+
 if __name__ == "__main__":
     unittest.main()
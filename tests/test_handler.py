@@ -54,8 +54,14 @@ class HandleTest(BaseTest):
              'cache': '',
              'regions': ['us-east-1'],
              'cache_period': 0,
+             'cache_items': False,
              'log_group': None,
-             'metrics': None})
+             'metrics': None,
+             's3_augment': 'all',
+             's3_augment_concurrency': 30,
+             'columnar_threshold': 0,
+             'tag_augment_concurrency': 3,
+             'stream_batch_size': 0})
 
     def setupLambdaEnv(
             self, policy_data, environment=None, err_execs=(),
@@ -17,6 +17,7 @@ from dateutil import parser
 from c7n.exceptions import PolicyValidationError
 from c7n.executor import MainThreadExecutor
 from c7n.filters.iamaccess import CrossAccountAccessFilter, PolicyChecker
+from c7n.filters.iameval import AccountAuthorization, PolicyEvaluator
 from c7n.mu import LambdaManager, LambdaFunction, PythonPackageArchive
 from botocore.exceptions import ClientError
 from c7n.resources.aws import shape_validate
@@ -850,6 +851,46 @@ class IamUserTest(BaseTest):
         self.assertEqual(len(resources), 1)
         self.assertTrue('c7n:perm-matches' in resources[0])
 
+    def test_iam_user_check_permissions_local(self):
+        factory = self.replay_flight_data('test_iam_user_check_permissions_local')
+        event = {'detail': {'eventName': '', 'eventSource': '', 'ids': ['kapil']}}
+
+        def check(actions, **options):
+            p = self.load_policy({
+                'name': 'perm-check',
+                'resource': 'iam-user',
+                'mode': {
+                    'type': 'cloudtrail',
+                    'events': [{'event': '', 'source': '', 'ids': 'ids'}],
+                },
+                'filters': [
+                    {'UserName': 'kapil'},
+                    dict({'type': 'check-permissions',
+                          'match': {'EvalDecision': 'allowed'},
+                          'match-operator': 'or',
+                          'simulate': 'never',
+                          'actions': actions}, **options)]},
+                session_factory=factory)
+            resources = p.push(event, None)
+            return resources and resources[0]['c7n:perm-matches'] or []
+
+        # allowed by the user's inline policy and its boundary
+        self.assertEqual(
+            check(['sqs:CreateQueue', 'ec2:RunInstances']),
+            [{'EvalActionName': 'sqs:CreateQueue',
+              'EvalResourceName': '*',
+              'EvalDecision': 'allowed',
+              'MatchedStatements': [{'SourcePolicyId': 'queues'}],
+              'MissingContextValues': [],
+              'PermissionsBoundaryDecisionDetail': {'AllowedByPermissionsBoundary': True}}])
+        # denied by the user's group policy
+        self.assertEqual(check(['sqs:DeleteQueue']), [])
+        # conditional statements don't apply unless simulated
+        self.assertEqual(check(['s3:PutObject']), [])
+        self.assertEqual(
+            check(['s3:PutObject'], simulate='conditions')[0]['EvalDecision'],
+            'allowed')
+
     @functional
     def test_iam_user_delete(self):
         # To get this test to work against live AWS I had to attach the
@@ -1121,6 +1162,66 @@ def test_iam_user_disable_ssh_keys(test, iam_user):
     ))
 
 
+class IamPolicyEvaluatorTest(TestCase):
+
+    def test_evaluate_statements(self):
+        evaluator = PolicyEvaluator([
+            ('admin', {'Statement': [
+                {'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'},
+                {'Effect': 'Allow', 'Action': 'IAM:Get*', 'Resource': 'arn:aws:iam::*:user/*'}]}),
+            ('guard', {'Statement': {
+                'Effect': 'Deny', 'Action': 's3:*', 'NotResource': 'arn:aws:s3:::logs/*'}}),
+            ('kms', {'Statement': [
+                {'Effect': 'Deny', 'Action': 'kms:*', 'NotResource': []},
+                {'Effect': 'Allow', 'Action': 'kms:Decrypt', 'Resource': '*',
+                 'Condition': {'StringEquals': {'kms:ViaService': 's3.amazonaws.com'}}}]}),
+        ])
+        results = {r['EvalActionName']: r for r in evaluator.evaluate(
+            ['ec2:RunInstances', 'iam:GetUser', 'iam:CreateUser', 's3:GetObject',
+             'kms:Decrypt'])}
+        self.assertEqual(results['ec2:RunInstances']['EvalDecision'], 'allowed')
+        self.assertEqual(
+            results['iam:GetUser']['MatchedStatements'], [{'SourcePolicyId': 'admin'}])
+        self.assertEqual(results['iam:CreateUser']['EvalDecision'], 'implicitDeny')
+        # denies only apply when they cover every resource
+        self.assertEqual(results['s3:GetObject']['EvalDecision'], 'allowed')
+        self.assertEqual(results['kms:Decrypt']['EvalDecision'], 'explicitDeny')
+        self.assertEqual(
+            results['kms:Decrypt']['MissingContextValues'], ['kms:ViaService'])
+        self.assertNotIn('PermissionsBoundaryDecisionDetail', results['kms:Decrypt'])
+
+    def test_evaluate_boundary(self):
+        evaluator = PolicyEvaluator(
+            [('admin', '%7B%22Statement%22%3A%5B%7B%22Effect%22%3A%22Allow%22%2C'
+              '%22Action%22%3A%22%2A%22%2C%22Resource%22%3A%22%2A%22%7D%5D%7D')],
+            ('boundary', {'Statement': [{'Effect': 'Allow', 'Action': 'ec2:*', 'Resource': '*'}]}))
+        allowed, denied = evaluator.evaluate(['ec2:RunInstances', 'iam:CreateUser'])
+        self.assertEqual(allowed['EvalDecision'], 'allowed')
+        self.assertEqual(denied['EvalDecision'], 'implicitDeny')
+        self.assertEqual(
+            denied['PermissionsBoundaryDecisionDetail'],
+            {'AllowedByPermissionsBoundary': False})
+
+    def test_account_authorization(self):
+        authorization = AccountAuthorization({
+            'RoleDetailList': [{
+                'Arn': 'arn:aws:iam::123456789012:role/app',
+                'RolePolicyList': [],
+                'AttachedManagedPolicies': [
+                    {'PolicyArn': 'arn:aws:iam::aws:policy/ReadOnlyAccess'}],
+                'PermissionsBoundary': {
+                    'PermissionsBoundaryArn': 'arn:aws:iam::aws:policy/AmazonEC2ReadOnlyAccess'}}]})
+        self.assertIsNone(authorization.get_evaluator('arn:aws:iam::123456789012:role/other'))
+        # managed policies that can't be fetched don't apply
+        evaluator = authorization.get_evaluator('arn:aws:iam::123456789012:role/app')
+        self.assertEqual(evaluator.policies, [])
+        self.assertEqual(
+            evaluator.evaluate_action('ec2:DescribeInstances')['EvalDecision'], 'implicitDeny')
+        self.assertIsNone(
+            authorization.get_evaluator(
+                'arn:aws:iam::123456789012:role/app', boundaries=False).boundary)
+
+
 class IamUserGroupMembership(BaseTest):
 
     def test_iam_user_group_membership(self):
@@ -1,6 +1,7 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
 import importlib
+import importlib.util
 import json
 import logging
 import os
@@ -153,6 +154,46 @@ class PolicyLambdaProvision(Publish):
         self.assertEqual(result["FunctionName"], "custodian-sg-modified")
         self.addCleanup(mgr.remove, pl)
 
+    def test_policy_lambda_archive_options(self):
+        runtime = 'python%d.%d' % sys.version_info[:2]
+        p = self.load_policy({
+            'name': 'sqs-check',
+            'resource': 'aws.sqs',
+            'mode': {'type': 'periodic', 'schedule': 'rate(1 day)',
+                     'runtime': runtime, 'prune-archive': True, 'bytecode-archive': True}},
+            validate=False, config={'account_id': ACCOUNT_ID})
+        archive = PolicyLambda(p).get_archive()
+        self.addCleanup(archive.remove)
+        filenames = archive.get_filenames()
+        self.assertIn(importlib.util.cache_from_source('c7n/resources/sqs.py'), filenames)
+        self.assertNotIn('c7n/resources/xray.py', filenames)
+
+        # bytecode is opt-in
+        p = self.load_policy({
+            'name': 'sqs-check',
+            'resource': 'aws.sqs',
+            'mode': {'type': 'periodic', 'schedule': 'rate(1 day)',
+                     'runtime': runtime, 'prune-archive': True}},
+            validate=False, config={'account_id': ACCOUNT_ID})
+        archive = PolicyLambda(p).get_archive()
+        self.addCleanup(archive.remove)
+        self.assertFalse([f for f in archive.get_filenames() if f.endswith('.pyc')])
+        with archive.get_reader() as reader:
+            config = json.loads(reader.read('config.json'))
+        self.assertEqual(config['execution-options']['account_id'], ACCOUNT_ID)
+
+        # default archives keep the same config, and code hash, across accounts
+        p = self.load_policy({
+            'name': 'sqs-check',
+            'resource': 'aws.sqs',
+            'mode': {'type': 'periodic', 'schedule': 'rate(1 day)', 'runtime': runtime}},
+            validate=False, config={'account_id': ACCOUNT_ID})
+        archive = PolicyLambda(p).get_archive()
+        self.addCleanup(archive.remove)
+        with archive.get_reader() as reader:
+            config = json.loads(reader.read('config.json'))
+        self.assertNotIn('account_id', config['execution-options'])
+
     def test_published_lambda_architecture(self):
         session_factory = self.replay_flight_data("test_published_lambda_architecture")
         with patch('platform.machine', return_value="arm64"):
@@ -1281,6 +1322,36 @@ class PythonArchiveTest(unittest.TestCase):
         filenames = archive.get_filenames()
         self.assertTrue("c7n/__init__.py" in filenames)
 
+    def test_custodian_archive_prune_resources(self):
+        archive = custodian_archive(
+            resource_types={'aws.sqs'},
+            policy_data={'resource': 'aws.sqs', 'filters': [
+                {'type': 'value', 'key': 'Policy', 'value': 'aws.sagemaker-notebook'}]})
+        self.addCleanup(archive.remove)
+        archive.close()
+        filenames = set(archive.get_filenames())
+        for f in ('c7n/policy.py', 'c7n/resources/__init__.py', 'c7n/resources/aws.py',
+                  'c7n/resources/resource_map.py', 'c7n/resources/sqs.py',
+                  'c7n/resources/sagemaker.py', 'c7n/resources/kms.py'):
+            self.assertIn(f, filenames)
+        self.assertNotIn('c7n/resources/xray.py', filenames)
+        self.assertFalse([f for f in filenames if f.endswith('.pyc')])
+
+    def test_custodian_archive_bytecode(self):
+        archives = []
+        for i in range(2):
+            archive = custodian_archive(bytecode=True)
+            self.addCleanup(archive.remove)
+            archives.append(archive.close())
+        pyc = importlib.util.cache_from_source('c7n/policy.py')
+        self.assertIn(pyc, archives[0].get_filenames())
+        with archives[0].get_reader() as reader:
+            header = reader.read(pyc)[:8]
+        self.assertEqual(header[:4], importlib.util.MAGIC_NUMBER)
+        # unchecked hash based bytecode
+        self.assertEqual(int.from_bytes(header[4:8], 'little'), 0b01)
+        self.assertEqual(archives[0].get_checksum(), archives[1].get_checksum())
+
     def make_file(self):
         bench = tempfile.mkdtemp()
         path = os.path.join(bench, "foo.txt")
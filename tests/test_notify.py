@@ -9,8 +9,8 @@ import time
 import tempfile
 import zlib
 
-from c7n.exceptions import PolicyValidationError
-from c7n.actions.notify import ResourceMessageBuffer
+from c7n.exceptions import PolicyExecutionError, PolicyValidationError
+from c7n.actions.notify import ResourceMessageBuffer, SQSTransport
 
 import pytest
 
@@ -56,6 +56,105 @@ def test_msg_buffer_exceed():
     assert str(mbuffer) in str(e_info.value)
 
 
+class FakeSQSClient:
+
+    def __init__(self, failures=()):
+        self.batches = []
+        self.objects = {}
+        self.failures = list(failures)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append((QueueUrl, [e['Id'] for e in Entries]))
+        failed = self.failures and self.failures.pop(0) or {}
+        return {
+            'Successful': [
+                {'Id': e['Id'], 'MessageId': 'm-%s' % e['MessageBody'][:10]}
+                for e in Entries if e['Id'] not in failed],
+            'Failed': [
+                {'Id': e['Id'], 'Code': failed[e['Id']], 'Message': 'failed',
+                 'SenderFault': failed[e['Id']] == 'InvalidMessageContents'}
+                for e in Entries if e['Id'] in failed]}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+
+def get_sqs_transport(client, **kw):
+    sessions = []
+
+    class Session:
+        def client(self, service):
+            return client
+
+    def session_factory(region=None, assume=None):
+        sessions.append(region)
+        return Session()
+
+    transport = SQSTransport(session_factory, **kw)
+    transport.retry_delay = 0
+    return transport, sessions
+
+
+def test_sqs_transport_batches():
+    client = FakeSQSClient()
+    transport, sessions = get_sqs_transport(client)
+    queue = 'https://sqs.us-east-1.amazonaws.com/123456789012/xyz'
+    sent = []
+    for i in range(25):
+        sent.extend(transport.add(queue, 'us-east-1', 'payload-%02d' % i, {}, i))
+    sent.extend(transport.flush())
+
+    assert [len(ids) for _, ids in client.batches] == [10, 10, 5]
+    assert [context for _, context in sent] == list(range(25))
+    assert sent[0][0] == 'm-payload-00'
+    # clients are cached per region
+    assert sessions == ['us-east-1']
+
+    # batches are also bounded by their total size
+    client.batches = []
+    for i in range(3):
+        transport.add(queue, 'us-east-1', 'x' * 100000, {}, i)
+    transport.flush()
+    assert [len(ids) for _, ids in client.batches] == [2, 1]
+
+
+def test_sqs_transport_retry_failed():
+    client = FakeSQSClient(failures=[{'1': 'InternalError'}])
+    transport, _ = get_sqs_transport(client)
+    for i in range(3):
+        transport.add('queue', 'us-east-1', 'payload-%d' % i, {}, i)
+    sent = transport.flush()
+    assert client.batches == [('queue', ['0', '1', '2']), ('queue', ['1'])]
+    assert sorted(context for _, context in sent) == [0, 1, 2]
+
+    client = FakeSQSClient(failures=[{'0': 'InvalidMessageContents'}])
+    transport, _ = get_sqs_transport(client)
+    transport.add('queue', 'us-east-1', 'payload', {}, 0)
+    with pytest.raises(PolicyExecutionError) as e_info:
+        transport.flush()
+    assert 'InvalidMessageContents' in str(e_info.value)
+    assert len(client.batches) == 1
+
+
+def test_sqs_transport_offload():
+    client = FakeSQSClient()
+    transport, _ = get_sqs_transport(
+        client, payload_bucket='payloads', payload_prefix='notify/')
+    transport.add('queue', 'us-east-1', 'x' * 300000, {}, 0)
+    transport.add('queue', 'us-east-1', 'small', {}, 1)
+    transport.flush()
+
+    assert len(client.batches) == 1
+    [(bucket, key)] = client.objects
+    assert bucket == 'payloads' and key.startswith('notify/')
+    assert client.objects[(bucket, key)] == b'x' * 300000
+    entry = transport.offload('us-east-1', {'MessageBody': 'abc', 'MessageAttributes': {}})
+    pointer_class, pointer = json.loads(entry['MessageBody'])
+    assert pointer_class == SQSTransport.s3_pointer_class
+    assert pointer['s3BucketName'] == 'payloads'
+    assert entry['MessageAttributes']['ExtendedPayloadSize']['StringValue'] == '3'
+
+
 class NotifyTest(BaseTest):
 
     @functional
@@ -4,12 +4,14 @@ import datetime
 import gzip
 import logging
 import shutil
+import threading
 from unittest import mock
 import os
 
 from dateutil.parser import parse as date_parse
 
 from c7n.ctx import ExecutionContext
+from c7n.executor import ThreadPoolExecutor
 from c7n.config import Config
 from c7n.output import DirectoryOutput, BlobOutput, LogFile, metrics_outputs
 from c7n.resources.aws import S3Output, MetricsOutput, inspect_bucket_region
@@ -121,6 +123,64 @@ class S3OutputTest(TestUtils):
             content = fh.read().strip()
             self.assertTrue(content.endswith("hello world"))
 
+    def test_join_log_concurrent(self):
+        log = logging.getLogger("custodian.test")
+        log.setLevel(logging.INFO)
+        v = log.manager.disable
+        log.manager.disable = 0
+        self.addCleanup(setattr, log.manager, "disable", v)
+
+        dirs = [self.get_temp_dir() for i in range(2)]
+        joined = threading.Barrier(2)
+        logged = threading.Barrier(2)
+
+        def execute(log_dir, name):
+            output = LogFile(Bag(log_dir=log_dir), {})
+            output.join_log()
+            joined.wait()
+            log.info("policy %s", name)
+            logged.wait()
+            output.leave_log()
+
+        threads = [
+            threading.Thread(target=execute, args=(d, n)) for d, n in zip(dirs, "ab")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for d, n in zip(dirs, "ab"):
+            with open(os.path.join(d, "custodian-run.log")) as fh:
+                content = fh.read().strip().splitlines()
+            self.assertEqual(len(content), 1)
+            self.assertTrue(content[0].endswith("policy %s" % n))
+
+    def test_join_log_worker_threads(self):
+        log = logging.getLogger("custodian.test")
+        log.setLevel(logging.INFO)
+        v = log.manager.disable
+        log.manager.disable = 0
+        self.addCleanup(setattr, log.manager, "disable", v)
+
+        dirs = [self.get_temp_dir() for i in range(2)]
+
+        def execute(log_dir, name):
+            output = LogFile(Bag(log_dir=log_dir), {})
+            output.join_log()
+            with ThreadPoolExecutor(max_workers=2) as w:
+                list(w.map(lambda i: log.info("policy %s %d", name, i), range(2)))
+            output.leave_log()
+
+        with ThreadPoolExecutor(max_workers=2) as w:
+            list(w.map(execute, dirs, "ab"))
+
+        for d, n in zip(dirs, "ab"):
+            with open(os.path.join(d, "custodian-run.log")) as fh:
+                content = fh.read().strip().splitlines()
+            self.assertEqual(
+                sorted(line.rsplit(" - ", 1)[-1] for line in content),
+                ["policy %s 0" % n, "policy %s 1" % n])
+
     def test_compress(self):
         output = self.get_s3_output()
 
@@ -3,8 +3,10 @@
 import json
 import logging
 import os
+from unittest import mock
 
-
+from c7n import cache, config
+from c7n.executor import MainThreadExecutor
 from c7n.query import ResourceQuery, RetryPageIterator, TypeInfo
 from c7n.resources.vpc import InternetGateway
 
@@ -154,6 +156,98 @@ class QueryResourceManagerTest(BaseTest):
         p.run()
         self.assertTrue("Using cached internet-gateway: 3", output.getvalue())
 
+    def test_stream_resources(self):
+        session_factory = self.replay_flight_data("test_query_model")
+        p = self.load_policy(
+            {
+                "name": "igw-check",
+                "resource": "internet-gateway",
+                "filters": [{"InternetGatewayId": "igw-3d9e3d56"}],
+            },
+            session_factory=session_factory,
+            config={'stream_batch_size': 2},
+        )
+        batches = []
+        augment = p.resource_manager.augment
+
+        def record_augment(resources):
+            batches.append(len(resources))
+            return augment(resources)
+
+        with mock.patch.object(p.resource_manager, 'augment', record_augment):
+            resources = p.run()
+        self.assertEqual(len(resources), 1)
+        self.assertEqual(batches, [2, 1])
+
+    def test_stream_resources_config(self):
+        session_factory = self.replay_flight_data("test_sns_config")
+        p = self.load_policy(
+            {"name": "sns-config", "source": "config", "resource": "sns"},
+            session_factory=session_factory,
+            config={'region': 'ap-northeast-2', 'stream_batch_size': 1})
+        self.assertEqual(p.resource_manager.get_stream_batch_size(), 1)
+        batches = list(p.resource_manager.source.iter_resources({}, 1))
+        self.assertEqual([len(b) for b in batches], [1, 1])
+        self.assertEqual(batches[0][0]['Tags'][0]['Value'], 'false')
+
+    def test_config_batch_resources(self):
+        def get_item(rid, tags=None):
+            configuration = {'serviceName': rid}
+            if tags is not None:
+                configuration['Tags'] = tags
+            return {'resourceId': rid, 'configuration': configuration,
+                    'supplementaryConfiguration': {}}
+
+        def get_batch_resources(resource, items):
+            p = self.load_policy({
+                "name": "batch", "source": "config", "resource": resource})
+            client = mock.MagicMock()
+            client.batch_get_resource_config.return_value = {
+                'baseConfigurationItems': items}
+            results, history_ids = p.resource_manager.source.get_batch_resources(
+                MainThreadExecutor(), client, ['a', 'b', 'c'])
+            return len(results), history_ids
+
+        # base items report tags for the type, untagged ones are served too
+        self.assertEqual(
+            get_batch_resources(
+                "ecs-service", [get_item('a', [{'Key': 'Env', 'Value': 'Dev'}]), get_item('b')]),
+            (2, ['c']))
+        # tags are only on history items
+        self.assertEqual(
+            get_batch_resources("ecs-service", [get_item('a'), get_item('b')]),
+            (0, ['a', 'b', 'c']))
+        # resources types that aren't taggable
+        self.assertEqual(
+            get_batch_resources("launch-config", [get_item('a'), get_item('b')]),
+            (2, ['c']))
+
+    def test_stream_resources_disabled(self):
+        p = self.load_policy(
+            {"name": "igw-check", "resource": "internet-gateway",
+             "filters": [{"type": "reduce", "limit": 1}]},
+            config={'stream_batch_size': 2})
+        self.assertEqual(p.resource_manager.get_stream_batch_size(), 0)
+        p = self.load_policy({"name": "igw-check", "resource": "internet-gateway"})
+        self.assertEqual(p.resource_manager.get_stream_batch_size(), 0)
+        p = self.load_policy(
+            {"name": "igw-check", "resource": "internet-gateway"},
+            config={'stream_batch_size': 2})
+        self.assertEqual(p.resource_manager.get_stream_batch_size(), 2)
+
+    def test_stream_resources_resource_count(self):
+        session_factory = self.replay_flight_data("test_query_model")
+        p = self.load_policy(
+            {"name": "igw-check", "resource": "internet-gateway",
+             "filters": [{"or": [
+                 {"type": "value", "value_type": "resource_count", "op": "eq", "value": 3},
+                 {"InternetGatewayId": "absent"}]}]},
+            session_factory=session_factory,
+            config={'stream_batch_size': 2})
+        self.assertEqual(p.resource_manager.get_stream_batch_size(), 0)
+        resources = p.run()
+        self.assertEqual(len(resources), 3)
+
     def test_get_resources(self):
         session_factory = self.replay_flight_data("test_query_manager_get")
         p = self.load_policy(
@@ -164,3 +258,27 @@ class QueryResourceManagerTest(BaseTest):
         self.assertEqual(len(resources), 1)
         resources = p.resource_manager.get_resources(["igw-5bce113f"])
         self.assertEqual(resources, [])
+
+    def test_get_resources_cache(self):
+        p = self.load_policy({"name": "igw-check", "resource": "internet-gateway"})
+        manager = p.resource_manager
+        manager._cache = cache.SqlItemCache(config.Bag(
+            cache=os.path.join(self.get_temp_dir(), "cache.db"), cache_period=60))
+        key = manager.get_cache_key(None)
+        with manager._cache:
+            manager._cache.save_resources(key, [], 'InternetGatewayId')
+
+        ids = ["igw-2e65104a", "igw-2e65104a"]
+        with mock.patch.object(manager.source, 'get_resources') as source_get:
+            source_get.return_value = [{'InternetGatewayId': 'igw-2e65104a'}]
+            with mock.patch.object(manager, 'augment', lambda r: r):
+                self.assertEqual(len(manager.get_resources(ids, cache=False)), 1)
+                with manager._cache:
+                    self.assertIsNone(
+                        manager._cache.get_resources(key, ids, 'InternetGatewayId'))
+                self.assertEqual(len(manager.get_resources(ids)), 1)
+                self.assertEqual(source_get.call_count, 2)
+                source_get.assert_called_with(["igw-2e65104a"])
+                # served from the cache despite the duplicate id
+                self.assertEqual(len(manager.get_resources(ids)), 1)
+                self.assertEqual(source_get.call_count, 2)
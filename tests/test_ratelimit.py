@@ -0,0 +1,87 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+import logging
+import time
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+from c7n import ratelimit, utils
+
+from .common import BaseTest
+
+
+class FakeClient:
+
+    def __init__(self, service, region):
+        self.meta = SimpleNamespace(
+            service_model=SimpleNamespace(service_name=service),
+            region_name=region)
+        self.calls = 0
+
+    def describe(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise ClientError(
+                {'Error': {'Code': 'Throttling'}}, 'Describe')
+        return self.calls
+
+
+class RateLimitTest(BaseTest):
+
+    def test_token_bucket(self):
+        bucket = ratelimit.TokenBucket(2, burst=2)
+        now = bucket.updated
+        self.assertEqual(bucket.reserve(now), 0)
+        self.assertEqual(bucket.reserve(now), 0)
+        self.assertEqual(bucket.reserve(now), 0.5)
+        self.assertEqual(bucket.reserve(now), 1.0)
+        # refilled after the reserved tokens are paid back
+        self.assertEqual(bucket.reserve(now + 2.5), 0)
+
+    def test_governor_rates(self):
+        governor = ratelimit.RateGovernor({'organizations': 1, '*': 100})
+        self.assertEqual(governor.get_rate('organizations'), 1)
+        self.assertEqual(governor.get_rate('ec2'), 100)
+        self.assertEqual(governor.acquire('organizations', '123', 'us-east-1'), 0)
+        self.assertGreater(governor.acquire('organizations', '123', 'us-east-1'), 0)
+        # buckets are per account
+        self.assertEqual(governor.acquire('organizations', '456', 'us-east-1'), 0)
+        self.assertEqual(ratelimit.RateGovernor().acquire('ec2', '123', 'us-east-1'), 0)
+
+    def test_retry_governed(self):
+        sleeps = []
+        self.patch(time, 'sleep', sleeps.append)
+        governor = ratelimit.RateGovernor({'*': 1})
+        self.patch(ratelimit, '_governor', governor)
+        self.patch(ratelimit, '_account_id', '123')
+
+        client = FakeClient('config', 'us-west-2')
+        retry = utils.get_retry(('Throttling',))
+        self.assertEqual(retry(client.describe), 2)
+
+        # unbound functions aren't governed
+        self.assertEqual(retry(lambda: 42), 42)
+        self.assertEqual(
+            governor.get_stats(),
+            [{'service': 'config', 'account_id': '123', 'region': 'us-west-2',
+              'calls': 2, 'throttled': 1, 'delay': sleeps[-1]}])
+        self.assertGreater(sleeps[-1], 0)
+
+    def test_retry_ungoverned(self):
+        self.patch(time, 'sleep', lambda x: x)
+        self.patch(ratelimit, '_governor', None)
+        client = FakeClient('config', 'us-west-2')
+        self.assertEqual(utils.get_retry(('Throttling',))(client.describe), 2)
+
+    def test_shared_governor(self):
+        manager, governor = ratelimit.start_governor({'sqs': 1})
+        self.addCleanup(manager.shutdown)
+        self.assertEqual(governor.acquire('sqs', '123', 'us-east-1'), 0)
+        governor.throttled('sqs', '123', 'us-east-1')
+        log_output = self.capture_logging('custodian.ratelimit', level=logging.INFO)
+        stats = ratelimit.report(governor)
+        self.assertEqual(stats[0]['throttled'], 1)
+        self.assertIn(
+            'API rate service:sqs account:123 region:us-east-1 calls:1 throttled:1',
+            log_output.getvalue())
@@ -1,6 +1,13 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
-from c7n.reports.csvout import Formatter, strip_output_path
+import gzip
+import json
+import os
+from datetime import datetime
+from unittest import mock
+
+from c7n.reports import csvout
+from c7n.reports.csvout import Formatter, ReportIndex, iter_record_set, strip_output_path
 from .common import BaseTest, load_data
 
 
@@ -61,6 +68,24 @@ class TestEC2Report(BaseTest):
         rows = [self.rows["minimal_custom"]]
         self.assertEqual(formatter.to_csv(recs), rows)
 
+    def test_csv_stream(self):
+        formatter = Formatter(self.p.resource_manager.resource_type)
+        batches = [
+            ["minimal", "full"], ["duplicate"], ["terminated", "full"], [], ["minimal"]]
+        records = [self.records[r] for b in batches for r in b]
+        for unique in (True, False):
+            for reverse in (True, False):
+                self.assertEqual(
+                    formatter.to_csv_stream(
+                        ([dict(self.records[r]) for r in b] for b in batches),
+                        reverse=reverse, unique=unique),
+                    formatter.to_csv([dict(r) for r in records], reverse=reverse, unique=unique))
+        self.assertEqual(
+            formatter.to_csv_stream(
+                [[self.records["full"], self.records["duplicate"], self.records["minimal"]]]),
+            [self.rows["full"], self.rows["minimal"]])
+        self.assertEqual(formatter.to_csv_stream([]), [])
+
     def test_formatter_jmespath_key(self):
         # models a k8s resource, or any that has a jmespath expression for
         # their id and name
@@ -164,3 +189,84 @@ class TestMultiReport(BaseTest):
             strip_output_path(p, policy_name) == f"logs/{policy_name}"
             for p in output_paths
         ))
+
+
+class RecordSetTest(BaseTest):
+
+    def get_s3(self, objects):
+        s3 = mock.MagicMock()
+        s3.get_paginator.return_value.paginate.side_effect = lambda **kw: [{
+            'Contents': [
+                {'Key': k, 'ETag': '"%s"' % k} for k in sorted(objects)
+                if k.startswith(kw['Prefix']) and k > kw['StartAfter']]}]
+        s3.get_object.side_effect = lambda Bucket, Key: {
+            'Body': mock.MagicMock(read=lambda: gzip.compress(
+                json.dumps(objects[Key]).encode('utf8')))}
+        self.patch(csvout, 'local_session', lambda factory: mock.MagicMock(
+            client=lambda service: s3))
+        return s3
+
+    def test_iter_record_set_index(self):
+        objects = {
+            'logs/policy/2021/01/0%d/01/resources.json.gz' % i: [{'InstanceId': 'i-%d' % i}]
+            for i in range(1, 6)}
+        objects['logs/policy/2021/01/01/01/custodian-run.log.gz'] = []
+        s3 = self.get_s3(objects)
+        index = ReportIndex(os.path.join(self.get_temp_dir(), 'index.db'))
+        self.addCleanup(index.close)
+        resource_type = self.load_policy(
+            {'name': 'policy', 'resource': 'ec2'}).resource_manager.resource_type
+        formatter = Formatter(resource_type, include_default_fields=False,
+                              extra_fields=['Id=InstanceId', 'Policy=policy'])
+        annotations = {'policy': 'policy', 'region': 'us-east-1'}
+
+        def get_entries(start_date, formatter=formatter, **kw):
+            return sorted(
+                (rec_id, date.day, row)
+                for batch in iter_record_set(
+                    None, 'bucket', 'logs/policy', start_date, index=index,
+                    formatter=formatter, annotations=annotations, **kw)
+                for date, rec_id, row in batch)
+
+        self.assertEqual(
+            get_entries(datetime(2021, 1, 1), max_workers=2),
+            [('i-%d' % i, i, ['i-%d' % i, 'policy']) for i in range(1, 6)])
+        self.assertEqual(s3.get_object.call_count, 5)
+        self.assertEqual(
+            s3.get_paginator.return_value.paginate.call_args[1]['StartAfter'],
+            'logs/policy/2021/01/01/00/resources.json.gz')
+
+        # indexed outputs are not fetched or parsed again
+        objects['logs/policy/2021/01/06/01/resources.json.gz'] = [{'InstanceId': 'i-6'}]
+        s3 = self.get_s3(objects)
+        self.assertEqual(
+            get_entries(datetime(2021, 1, 1)),
+            [('i-%d' % i, i, ['i-%d' % i, 'policy']) for i in range(1, 7)])
+        self.assertEqual(
+            [c[1]['Key'] for c in s3.get_object.call_args_list],
+            ['logs/policy/2021/01/06/01/resources.json.gz'])
+
+        # rows are indexed per report fields
+        other = Formatter(resource_type, include_default_fields=False,
+                          extra_fields=['Region=region'])
+        self.assertEqual(
+            [row for _, _, row in get_entries(datetime(2021, 1, 1), formatter=other)],
+            [['us-east-1']] * 6)
+        self.assertEqual(s3.get_object.call_count, 7)
+
+        # outputs before the start date are pruned
+        get_entries(datetime(2021, 1, 4))
+        self.assertEqual(
+            index.conn.execute('select count(*) from output_rows').fetchone()[0], 6)
+
+    def test_iter_record_set(self):
+        objects = {'logs/policy/2021/01/01/01/resources.json.gz': [{'InstanceId': 'i-1'}]}
+        self.get_s3(objects)
+        records = [
+            r for batch in iter_record_set(
+                None, 'bucket', 'logs/policy', datetime(2021, 1, 1),
+                annotations={'policy': 'policy'})
+            for r in batch]
+        self.assertEqual(
+            records,
+            [{'InstanceId': 'i-1', 'policy': 'policy', 'CustodianDate': datetime(2021, 1, 1, 1)}])
@@ -7,6 +7,7 @@ import logging
 import os
 import io
 import shutil
+import ssl
 import tempfile
 import time  # NOQA needed for some recordings
 from unittest import mock
@@ -14,7 +15,7 @@ from unittest import mock
 from unittest import TestCase
 
 from contextlib import suppress
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, EndpointConnectionError
 from dateutil.tz import tzutc
 import pytest
 from pytest_terraform import terraform
@@ -4544,3 +4545,133 @@ class BucketReplication(BaseTest):
                 ]
             },
         )
+
+
+class S3AugmentSubset(BaseTest):
+
+    def get_policy(self, filters=(), actions=(), session_factory=None, augment='auto'):
+        return self.load_policy(
+            {'name': 's3-augment-subset', 'resource': 's3',
+             'filters': list(filters), 'actions': list(actions)},
+            session_factory=session_factory, config={'s3_augment': augment})
+
+    def test_augment_keys_auto(self):
+        p = self.get_policy(
+            filters=[
+                {'tag:Owner': 'absent'},
+                {'Versioning.Status': 'Enabled'},
+                {'or': [{'type': 'global-grants'}, {'Name': 'abc'}]}],
+            actions=[{'type': 'tag', 'key': 'Owner', 'value': 'unknown'}])
+        self.assertEqual(
+            p.resource_manager.source.get_augment_keys(),
+            {'Location', 'Tags', 'Versioning', 'Acl', 'Website'})
+        self.assertEqual(
+            p.resource_manager.get_cache_key(None)['augment'],
+            ['Acl', 'Location', 'Tags', 'Versioning', 'Website'])
+
+        p = self.get_policy(filters=[{'type': 'is-log-target'}])
+        self.assertEqual(p.resource_manager.source.get_augment_keys(), None)
+
+    def test_augment_keys_mode(self):
+        p = self.get_policy(filters=[{'tag:Owner': 'absent'}], augment='all')
+        self.assertEqual(p.resource_manager.source.get_augment_keys(), None)
+        self.assertNotIn('augment', p.resource_manager.get_cache_key(None))
+        p = self.get_policy(filters=[{'tag:Owner': 'absent'}], augment='Tags, Policy')
+        self.assertEqual(
+            p.resource_manager.source.get_augment_keys(),
+            {'Location', 'Tags', 'Policy'})
+
+    def test_augment_subset(self):
+        client = mock.MagicMock()
+        client.get_bucket_location.side_effect = lambda Bucket: {
+            'LocationConstraint': 'EU', 'ResponseMetadata': {}}
+        client.get_bucket_tagging.side_effect = lambda Bucket: {
+            'TagSet': [{'Key': 'Owner', 'Value': 'kapil'}], 'ResponseMetadata': {}}
+        client.get_bucket_versioning.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'Denied'}}, 'GetBucketVersioning')
+        session = mock.MagicMock()
+        session.client.return_value = client
+
+        p = self.get_policy(
+            filters=[{'tag:Owner': 'present'}, {'Versioning': 'absent'}],
+            session_factory=lambda *args, **kw: session)
+        buckets = p.resource_manager.source.augment([{'Name': 'a'}, {'Name': 'b'}])
+        self.assertEqual(
+            buckets[0],
+            {'Name': 'a',
+             'Location': {'LocationConstraint': 'eu-west-1'},
+             'Tags': [{'Key': 'Owner', 'Value': 'kapil'}],
+             'c7n:DeniedMethods': ['get_bucket_versioning']})
+        self.assertFalse(client.get_bucket_policy.called)
+        self.assertEqual(
+            [c.kwargs['region_name'] for c in session.client.call_args_list],
+            [None, 'eu-west-1'])
+
+    def test_augment_semaphore(self):
+        semaphore = s3.get_augment_semaphore(7)
+        # concurrent augments share their bound, differing ones are kept apart
+        self.assertIs(s3.get_augment_semaphore(7), semaphore)
+        self.assertIsNot(s3.get_augment_semaphore(3), semaphore)
+        for count in (7, 3):
+            bound = s3.get_augment_semaphore(count)
+            acquired = [bound.acquire(blocking=False) for _ in range(count + 1)]
+            self.assertEqual(acquired, [True] * count + [False])
+            for _ in range(count):
+                bound.release()
+
+    def test_augment_subset_keeps_unreachable(self):
+        def get_bucket_tagging(Bucket):
+            if Bucket == 'b':
+                raise ssl.SSLError("bad handshake")
+            return {'TagSet': [], 'ResponseMetadata': {}}
+
+        def get_bucket_location(Bucket):
+            if Bucket == 'c':
+                raise EndpointConnectionError(endpoint_url='https://s3.amazonaws.com')
+            return {'LocationConstraint': None, 'ResponseMetadata': {}}
+
+        client = mock.MagicMock()
+        client.get_bucket_location.side_effect = get_bucket_location
+        client.get_bucket_tagging.side_effect = get_bucket_tagging
+        session = mock.MagicMock()
+        session.client.return_value = client
+
+        p = self.get_policy(
+            filters=[{'tag:Owner': 'absent'}],
+            session_factory=lambda *args, **kw: session)
+        buckets = p.resource_manager.source.augment(
+            [{'Name': 'a'}, {'Name': 'b'}, {'Name': 'c'}])
+        # as with full augmentation, keys that can't be fetched are left unset
+        self.assertEqual(
+            buckets,
+            [{'Name': 'a', 'Location': {'LocationConstraint': None}, 'Tags': []},
+             {'Name': 'b', 'Location': {'LocationConstraint': None}},
+             {'Name': 'c', 'Tags': []}])
+
+    def test_augment_subset_redirect(self):
+        clients = {}
+
+        def get_client(service, region_name=None, **kw):
+            if region_name not in clients:
+                clients[region_name] = mock.MagicMock()
+                clients[region_name].get_bucket_location.side_effect = ClientError(
+                    {'Error': {'Code': 'AccessDenied', 'Message': 'Denied'}},
+                    'GetBucketLocation')
+                clients[region_name].get_bucket_tagging.side_effect = ClientError(
+                    {'Error': {'Code': 'PermanentRedirect', 'Message': 'Moved'},
+                     'ResponseMetadata': {'HTTPHeaders': {
+                         'x-amz-bucket-region': 'us-west-2'}}},
+                    'GetBucketTagging')
+            return clients[region_name]
+
+        session = mock.MagicMock()
+        session.client.side_effect = get_client
+        p = self.get_policy(
+            filters=[{'tag:Owner': 'absent'}],
+            session_factory=lambda *args, **kw: session)
+        buckets = p.resource_manager.source.augment([{'Name': 'a'}])
+        # the call is retried in the bucket's region, once
+        self.assertEqual(
+            buckets, [{'Name': 'a', 'c7n:DeniedMethods': ['get_bucket_location']}])
+        self.assertEqual(sorted(clients, key=str), [None, 'us-east-1', 'us-west-2'])
+        self.assertEqual(clients['us-west-2'].get_bucket_tagging.call_count, 1)
@@ -7,7 +7,11 @@ import time
 from freezegun import freeze_time
 from mock import MagicMock, call
 
-from c7n.tags import universal_retry, coalesce_copy_user_tags
+from c7n import tags as tags_module, utils
+from c7n.commands import _share_tag_results
+from c7n.executor import MainThreadExecutor
+from c7n.tags import (
+    universal_augment, universal_retry, coalesce_copy_user_tags, invalidate_tag_results)
 from c7n.exceptions import PolicyExecutionError, PolicyValidationError
 from c7n.utils import yaml_load
 
@@ -221,6 +225,132 @@ class UniversalTagTest(BaseTest):
             """)
 
 
+class UniversalAugmentTest(BaseTest):
+
+    def get_manager(self, manager=None):
+        if manager is not None:
+            manager = manager.get_resource_manager('aws.config-rule')
+        else:
+            manager = self.load_policy(
+                {'name': 'config-rules', 'resource': 'aws.config-rule'}).resource_manager
+        self.patch(manager, 'executor_factory', MainThreadExecutor)
+        return manager
+
+    def get_resources(self, count=250):
+        return [{'ConfigRuleName': 'r%d' % i,
+                 'ConfigRuleArn': 'arn:aws:config:us-east-1:644160558196:config-rule/r%d' % i}
+                for i in range(count)]
+
+    def get_client(self):
+        session = MagicMock()
+        self.patch(utils, 'local_session', lambda factory: session)
+        client = session.client.return_value
+
+        def get_resources(ResourceARNList):
+            return {'ResourceTagMappingList': [
+                {'ResourceARN': arn, 'Tags': [{'Key': 'Name', 'Value': arn[-3:]}]}
+                for arn in ResourceARNList if not arn.endswith('r0')]}
+        client.get_resources.side_effect = get_resources
+        return client
+
+    def test_universal_augment_shared_results(self):
+        client = self.get_client()
+        manager = self.get_manager()
+        resources = universal_augment(manager, self.get_resources())
+        self.assertEqual(
+            [len(c.kwargs['ResourceARNList']) for c in client.get_resources.call_args_list],
+            [100, 100, 50])
+        self.assertEqual(resources[0]['Tags'], [])
+        self.assertEqual(resources[1]['Tags'], [{'Key': 'Name', 'Value': '/r1'}])
+
+        # tags are shared with the execution's other resource managers, less
+        # tagged resources.
+        invalidate_tag_results(manager, [resources[1]])
+        resources = universal_augment(self.get_manager(manager), self.get_resources())
+        self.assertEqual(client.get_resources.call_count, 4)
+        self.assertEqual(
+            client.get_resources.call_args.kwargs['ResourceARNList'],
+            [resources[1]['ConfigRuleArn']])
+        self.assertEqual(resources[0]['Tags'], [])
+        self.assertEqual(resources[249]['Tags'], [{'Key': 'Name', 'Value': '249'}])
+
+        # other policy executions retrieve tags anew
+        manager.ctx.initialize()
+        universal_augment(self.get_manager(manager), self.get_resources())
+        self.assertEqual(client.get_resources.call_count, 7)
+
+    def test_universal_augment_run_results(self):
+        client = self.get_client()
+        policies = [
+            self.load_policy({'name': name, 'resource': 'aws.config-rule'})
+            for name in ('config-rules', 'config-rules-tagged')]
+        _share_tag_results(policies)
+        for p in policies:
+            p.ctx.initialize()
+            universal_augment(self.get_manager(p.resource_manager), self.get_resources())
+        # tags are retrieved once per run
+        self.assertEqual(client.get_resources.call_count, 3)
+
+        # tagging by one policy is seen by the others
+        invalidate_tag_results(policies[0].resource_manager, self.get_resources()[1:2])
+        universal_augment(self.get_manager(policies[1].resource_manager), self.get_resources())
+        self.assertEqual(client.get_resources.call_count, 4)
+
+        # including by resource specific tag actions
+        action = tags_module.RemoveTag({'tags': ['Name']}, policies[0].resource_manager)
+        self.patch(action, 'get_client', MagicMock)
+        self.patch(action, 'process_resource_set', MagicMock())
+        action.process(self.get_resources()[2:3])
+        self.assertEqual(action.process_resource_set.call_count, 1)
+        universal_augment(self.get_manager(policies[1].resource_manager), self.get_resources())
+        self.assertEqual(client.get_resources.call_count, 5)
+        self.assertEqual(
+            client.get_resources.call_args.kwargs['ResourceARNList'],
+            [self.get_resources()[2]['ConfigRuleArn']])
+
+    def test_universal_augment_concurrency(self):
+        self.get_client()
+        manager = self.load_policy(
+            {'name': 'config-rules', 'resource': 'aws.config-rule'},
+            config={'tag_augment_concurrency': 5}).resource_manager
+        executor = MagicMock(side_effect=MainThreadExecutor)
+        self.patch(manager, 'executor_factory', executor)
+        universal_augment(manager, self.get_resources())
+        executor.assert_called_once_with(max_workers=5)
+
+    def test_universal_augment_scan(self):
+        self.patch(tags_module, 'TAG_SCAN_THRESHOLD', 10)
+        client = self.get_client()
+        client.get_paginator.return_value.paginate.return_value = [
+            {'ResourceTagMappingList': [
+                {'ResourceARN': r['ConfigRuleArn'], 'Tags': [{'Key': 'App', 'Value': 'x'}]}
+                for r in self.get_resources(20)[1:]]}]
+
+        manager = self.get_manager()
+        resources = universal_augment(manager, self.get_resources(20))
+        client.get_paginator.return_value.paginate.assert_called_once_with(
+            ResourceTypeFilters=['config:config-rule'], ResourcesPerPage=100)
+        self.assertEqual(client.get_resources.call_count, 0)
+        self.assertEqual(resources[0]['Tags'], [])
+        self.assertEqual(resources[19]['Tags'], [{'Key': 'App', 'Value': 'x'}])
+
+        # below the threshold, resources not found by the scan are untagged.
+        resources = universal_augment(self.get_manager(manager), self.get_resources(5))
+        self.assertEqual(client.get_resources.call_count, 0)
+        self.assertEqual(resources[0]['Tags'], [])
+
+    def test_universal_augment_scan_mismatch(self):
+        self.patch(tags_module, 'TAG_SCAN_THRESHOLD', 10)
+        client = self.get_client()
+        client.get_paginator.return_value.paginate.return_value = [
+            {'ResourceTagMappingList': [
+                {'ResourceARN': 'arn:aws:config:us-east-1:644160558196:config-rule/other',
+                 'Tags': []}]}]
+        resources = universal_augment(self.get_manager(), self.get_resources(20))
+        self.assertEqual(client.get_resources.call_count, 1)
+        self.assertEqual(resources[19]['Tags'], [{'Key': 'Name', 'Value': 'r19'}])
+
+
 class CoalesceCopyUserTags(BaseTest):
     def test_copy_bool_user_tags(self):
         tags = [{'Key': 'test-key', 'Value': 'test-value'}]
@@ -11,7 +11,7 @@ from botocore.exceptions import ClientError
 from dateutil.parser import parse as parse_date
 
 from c7n import utils
-from c7n.config import Config
+from c7n.config import Bag, Config
 from .common import BaseTest
 
 
@@ -711,3 +711,22 @@ def test_jmespath_parse_split():
         {'foo': {'bar': 'abc.xyz'}}
     )
     assert result == ['abc', 'xyz']
+
+
+def test_client_pool():
+    session = mock.MagicMock()
+    factory = mock.MagicMock(return_value=session, region='us-east-1', assume_role=None)
+    ctx = Bag(client_pools=None)
+    pool = utils.get_client_pool(ctx, factory)
+    assert utils.get_client_pool(ctx, factory) is pool
+
+    c1 = pool.client('s3')
+    assert pool.client('s3') is c1
+    pool.client('s3', region_name='us-west-2')
+    assert pool.stats == {'sessions': 1, 'clients': 2, 'hits': 1}
+    assert factory.call_count == 1
+
+    # pools are scoped to the execution context
+    assert utils.get_client_pool(Bag(client_pools=None), factory) is not pool
+    ctx.client_pools = None
+    assert utils.get_client_pool(ctx, factory) is not pool
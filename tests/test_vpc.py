@@ -2036,6 +2036,38 @@ class SecurityGroupTest(BaseTest):
         self.assertIn("vpc_endpoint", resources[0]["c7n:InterfaceTypes"])
         self.assertIn("ec2", resources[0]["c7n:InterfaceResourceTypes"])
 
+    def test_used_reference_graph(self):
+        factory = self.replay_flight_data("test_security_group_used")
+        policy_data = {"name": "sg-used", "resource": "security-group", "filters": ["used"]}
+        p = self.load_policy(policy_data, session_factory=factory, cache=True)
+        resources = p.run()
+        graph = p.resource_manager.ctx.reference_graph
+        self.assertIn(('security-group', 'nic-attributes'), graph.edges)
+
+        # subsequent policies within the cache period don't list enis again
+        p = self.load_policy(policy_data, session_factory=factory, config=p.options)
+        used = p.resource_manager.filters[0]
+
+        def scanner():
+            raise AssertionError("references scanned")
+
+        self.patch(
+            used, 'get_scanners',
+            lambda: [(kind, scanner) for kind, _ in type(used).get_scanners(used)])
+        self.patch(used, 'get_eni_attribute_refs', scanner)
+        self.assertEqual(
+            {r['GroupId']: sorted(r['c7n:InterfaceTypes']) for r in p.run()},
+            {r['GroupId']: sorted(r['c7n:InterfaceTypes']) for r in resources})
+
+    def test_used_no_enis(self):
+        p = self.load_policy(
+            {"name": "sg-used", "resource": "security-group", "filters": ["used"]})
+        used = p.resource_manager.filters[0]
+        # the eni scan found none, they aren't listed again
+        used.nics = []
+        self.patch(used.manager, 'get_resource_manager', None)
+        self.assertEqual(used._get_eni_attributes(), {})
+
     def test_unused_ecs(self):
         factory = self.replay_flight_data("test_security_group_ecs_unused")
         p = self.load_policy(
@@ -2083,6 +2115,32 @@ class SecurityGroupTest(BaseTest):
         resources = p.run()
         self.assertEqual(len(resources), 2)
 
+    def test_unused_reference_graph(self):
+        factory = self.replay_flight_data("test_security_group_unused")
+        p = self.load_policy(
+            {"name": "sg-unused", "resource": "security-group", "filters": ["unused"]},
+            session_factory=factory, cache=True)
+        resources = p.run()
+        self.assertEqual(len(resources), 2)
+        graph = p.resource_manager.ctx.reference_graph
+        self.assertIn(('security-group', 'nics'), graph.edges)
+
+        # subsequent policies within the cache period don't rescan references
+        p = self.load_policy(
+            {"name": "sg-unused-2", "resource": "security-group", "filters": ["unused"]},
+            session_factory=factory, config=p.options)
+        unused = p.resource_manager.filters[0]
+
+        def scanner():
+            raise AssertionError("references scanned")
+
+        self.patch(
+            unused, 'get_scanners',
+            lambda: [(kind, scanner) for kind, _ in type(unused).get_scanners(unused)])
+        self.assertEqual(
+            {r['GroupId'] for r in p.run()},
+            {r['GroupId'] for r in resources})
+
     def test_match_resource_validator(self):
 
         try:
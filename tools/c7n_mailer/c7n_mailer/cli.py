@@ -132,6 +132,7 @@ CONFIG_SCHEMA = {
         "ldap_email_key": {"type": "string"},
         "ldap_uid_tags": {"type": "array", "items": {"type": "string"}},
         "debug": {"type": "boolean"},
+        "email_digest_window": {"type": "integer", "minimum": 0},
         "ldap_uid_regex": {"type": "string"},
         "ldap_uri": {"type": "string"},
         "ldap_bind_dn": {"type": "string"},
@@ -144,6 +145,7 @@ CONFIG_SCHEMA = {
         "cross_accounts": {"type": "object"},
         "ses_region": {"type": "string"},
         "ses_role": {"type": "string"},
+        "ses_send_rate": {"type": "number", "exclusiveMinimum": 0},
         "redis_host": {"type": "string"},
         "redis_port": {"type": "integer"},
         "datadog_api_key": {"type": "string"},  # TODO: encrypt with KMS?
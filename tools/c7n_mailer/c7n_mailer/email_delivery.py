@@ -1,5 +1,8 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from itertools import chain
 
 from c7n_mailer.azure_mailer.sendgrid_delivery import SendGridDelivery
@@ -18,14 +21,52 @@ from .utils import (
 from .utils_email import get_mimetext_message, is_email
 
 
+class SendRateLimiter:
+    """Space sends at a maximum rate per second, shared across threads."""
+
+    _limiters = {}
+    _lock = threading.Lock()
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_send = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls, rate):
+        with cls._lock:
+            if rate not in cls._limiters:
+                cls._limiters[rate] = cls(rate)
+            return cls._limiters[rate]
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0, self.next_send - now)
+            self.next_send = max(now, self.next_send) + self.interval
+        if delay:
+            time.sleep(delay)
+
+
 class EmailDelivery:
+    """Deliver notification emails.
+
+    An instance keeps its smtp connection, ses client and ldap connection
+    open, so it can be reused across messages by a single thread.
+    """
+
     def __init__(self, config, session, logger):
         self.config = config
         self.logger = logger
         self.session = session
         self.provider = get_provider(self.config)
+        self.smtp_delivery = None
+        self.ses_expiration = None
+        self.ses_limiter = None
         if self.provider == Providers.AWS:
             self.aws_ses = self.get_ses_session()
+            if self.config.get("ses_send_rate"):
+                self.ses_limiter = SendRateLimiter.get(self.config["ses_send_rate"])
         self.ldap_lookup = self.get_ldap_connection()
 
     def get_ses_session(self):
@@ -33,6 +74,7 @@ class EmailDelivery:
             creds = self.session.client("sts").assume_role(
                 RoleArn=self.config.get("ses_role"), RoleSessionName="CustodianNotification"
             )["Credentials"]
+            self.ses_expiration = creds["Expiration"]
 
             return self.session.client(
                 "ses",
@@ -227,15 +269,17 @@ class EmailDelivery:
         # eg: { ('milton@initech.com', 'peter@initech.com'): mimetext_message }
         return emails_to_mimetext_map
 
-    def send_c7n_email(self, sqs_message):
+    def send_c7n_email(self, sqs_message, raise_errors=False):
+        """Send the emails for a message, errors are logged and raised if requested."""
         emails_to_mimetext_map = self.get_emails_to_mimetext_map(sqs_message)
         email_to_addrs = list(emails_to_mimetext_map.keys())
         try:
             # if smtp_server is set in mailer.yml, send through smtp
             if "smtp_server" in self.config:
-                delivery = SmtpDelivery(self.config, self.session, self.logger)
+                if self.smtp_delivery is None:
+                    self.smtp_delivery = SmtpDelivery(self.config, self.session, self.logger)
                 for emails, mimetext_msg in emails_to_mimetext_map.items():
-                    delivery.send_message(message=mimetext_msg, to_addrs=list(emails))
+                    self.smtp_delivery.send_message(message=mimetext_msg, to_addrs=list(emails))
             elif "sendgrid_api_key" in self.config:
                 delivery = SendGridDelivery(self.config, self.session, self.logger)
                 delivery.sendgrid_handler(sqs_message, emails_to_mimetext_map)
@@ -245,7 +289,7 @@ class EmailDelivery:
             # use aws ses normally.
             else:
                 for emails, mimetext_msg in emails_to_mimetext_map.items():
-                    self.aws_ses.send_raw_email(RawMessage={"Data": mimetext_msg.as_string()})
+                    self.send_ses_email(mimetext_msg)
         except Exception as error:
             self.logger.error(
                 "policy:%s account:%s sending to:%s \n\n error: %s\n\n mailer.yml: %s"
@@ -257,7 +301,8 @@ class EmailDelivery:
                     self.config,
                 )
             )
-            # TODO shall we raise the exception and interrupt the entire notify process?
+            if raise_errors:
+                raise
             return
         self.logger.info(
             "Sent account:%s policy:%s %s:%s email:%s to %s"
@@ -270,3 +315,13 @@ class EmailDelivery:
                 email_to_addrs,
             )
         )
+
+    def send_ses_email(self, mimetext_msg):
+        # refresh assumed role credentials before they expire
+        if self.ses_expiration and self.ses_expiration - timedelta(minutes=5) < datetime.now(
+            timezone.utc
+        ):
+            self.aws_ses = self.get_ses_session()
+        if self.ses_limiter:
+            self.ses_limiter.wait()
+        self.aws_ses.send_raw_email(RawMessage={"Data": mimetext_msg.as_string()})
@@ -8,21 +8,22 @@ import c7n_mailer.utils as utils
 
 class SmtpDelivery:
     def __init__(self, config, session, logger):
-        smtp_server = config["smtp_server"]
-        smtp_port = int(config.get("smtp_port", 25))
-        smtp_ssl = bool(config.get("smtp_ssl", True))
-        smtp_username = config.get("smtp_username")
-        smtp_password = utils.decrypt(config, logger, session, "smtp_password")
-
-        smtp_connection = smtplib.SMTP(smtp_server, smtp_port)
-        if smtp_ssl:
+        self.smtp_server = config["smtp_server"]
+        self.smtp_port = int(config.get("smtp_port", 25))
+        self.smtp_ssl = bool(config.get("smtp_ssl", True))
+        self.smtp_username = config.get("smtp_username")
+        self.smtp_password = utils.decrypt(config, logger, session, "smtp_password")
+        self._smtp_connection = self.connect()
+
+    def connect(self):
+        smtp_connection = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        if self.smtp_ssl:
             smtp_connection.starttls()
             smtp_connection.ehlo()
 
-        if smtp_username or smtp_password:
-            smtp_connection.login(smtp_username, smtp_password)
-
-        self._smtp_connection = smtp_connection
+        if self.smtp_username or self.smtp_password:
+            smtp_connection.login(self.smtp_username, self.smtp_password)
+        return smtp_connection
 
     def __del__(self):
         try:
@@ -31,4 +32,10 @@ class SmtpDelivery:
             pass
 
     def send_message(self, message, to_addrs):
-        self._smtp_connection.sendmail(message["From"], to_addrs, message.as_string())
+        # the connection is kept open across messages, servers may close
+        # idle connections, in which case we reconnect once.
+        try:
+            self._smtp_connection.sendmail(message["From"], to_addrs, message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self._smtp_connection = self.connect()
+            self._smtp_connection.sendmail(message["From"], to_addrs, message.as_string())
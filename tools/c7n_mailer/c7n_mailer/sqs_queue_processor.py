@@ -4,27 +4,45 @@
 SQS Message Processing
 ===============
 
+Messages are received in batches of up to 10 by one or more pollers,
+and each batch is decoded and delivered on a worker pool. Messages are
+deleted from the queue once delivered, in batches, while those that
+fail to be delivered are left for redelivery after their visibility
+timeout. The visibility timeout of messages still being delivered is
+periodically extended, so slow deliveries aren't received again.
+
+With an ``email_digest_window``, messages are collected for up to that
+many seconds, and those for the same policy, account, region and notify
+action are delivered as a single message with all of their resources.
 """
 import base64
 import json
 import logging
+import math
+import threading
+import time
 import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from c7n_mailer.target import MessageTargetMixin
 
 DATA_MESSAGE = "maidmsg/1.0"
+S3_POINTER_CLASS = "software.amazon.payloadoffloading.PayloadS3Pointer"
 
 
 class MailerSqsQueueIterator:
     # Copied from custodian to avoid runtime library dependency
     msg_attributes = ["sequence_id", "op", "ser"]
 
-    def __init__(self, aws_sqs, queue_url, logger, limit=0, timeout=10):
+    batch_size = 10
+
+    def __init__(self, aws_sqs, queue_url, logger, limit=0, timeout=10, visibility_timeout=None):
         self.aws_sqs = aws_sqs
         self.queue_url = queue_url
         self.limit = limit
         self.logger = logger
         self.timeout = timeout
+        self.visibility_timeout = visibility_timeout
         self.messages = []
 
     # this and the next function make this object iterable with a for loop
@@ -34,29 +52,67 @@ class MailerSqsQueueIterator:
     def __next__(self):
         if self.messages:
             return self.messages.pop(0)
-        response = self.aws_sqs.receive_message(
+        self.messages.extend(self.receive())
+        if self.messages:
+            return self.messages.pop(0)
+        raise StopIteration()
+
+    next = __next__  # python2.7
+
+    def receive(self):
+        """Receive a batch of messages, returns an empty list once the queue is drained."""
+        params = dict(
             QueueUrl=self.queue_url,
             WaitTimeSeconds=self.timeout,
-            MaxNumberOfMessages=3,
+            MaxNumberOfMessages=self.batch_size,
             MessageAttributeNames=self.msg_attributes,
             AttributeNames=["SentTimestamp"],
         )
-
-        msgs = response.get("Messages", [])
+        if self.visibility_timeout:
+            params["VisibilityTimeout"] = self.visibility_timeout
+        msgs = self.aws_sqs.receive_message(**params).get("Messages", [])
         self.logger.debug("Messages received %d", len(msgs))
-        for m in msgs:
-            self.messages.append(m)
-        if self.messages:
-            return self.messages.pop(0)
-        raise StopIteration()
-
-    next = __next__  # python2.7
+        return msgs
 
     def ack(self, m):
         self.aws_sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=m["ReceiptHandle"])
 
+    def ack_batch(self, messages):
+        """Delete messages from the queue in batches."""
+        self._batch_call(self.aws_sqs.delete_message_batch, messages)
+
+    def extend_visibility(self, messages, timeout):
+        """Extend the visibility timeout of messages still being processed."""
+        self._batch_call(
+            self.aws_sqs.change_message_visibility_batch, messages, VisibilityTimeout=timeout
+        )
+
+    def _batch_call(self, func, messages, **params):
+        for idx in range(0, len(messages), self.batch_size):
+            entries = [
+                dict(Id=str(eid), ReceiptHandle=m["ReceiptHandle"], **params)
+                for eid, m in enumerate(messages[idx : idx + self.batch_size])
+            ]
+            response = func(QueueUrl=self.queue_url, Entries=entries)
+            for f in response.get("Failed", ()):
+                self.logger.warning(
+                    "%s failed for message %s: %s %s"
+                    % (
+                        func.__name__,
+                        messages[idx + int(f["Id"])]["MessageId"],
+                        f["Code"],
+                        f.get("Message", ""),
+                    )
+                )
+
 
 class MailerSqsQueueProcessor(MessageTargetMixin):
+    # messages are received with this visibility timeout, extended
+    # at half of it for messages still being delivered.
+    visibility_timeout = 120
+    # maximum messages collected for a digest
+    digest_max_messages = 100
+
     def __init__(self, config, session, logger, max_num_processes=16):
         self.config = config
         self.logger = logger
@@ -64,6 +120,7 @@ class MailerSqsQueueProcessor(MessageTargetMixin):
         self.max_num_processes = max_num_processes
         self.receive_queue = self.config["queue_url"]
         self.endpoint_url = self.config.get("endpoint_url", None)
+        self.digest_window = self.config.get("email_digest_window", 0)
         if self.config.get("debug", False):
             self.logger.debug("debug logging is turned on from mailer config file.")
             logger.setLevel(logging.DEBUG)
@@ -88,16 +145,105 @@ class MailerSqsQueueProcessor(MessageTargetMixin):
     def run(self, parallel=False):
         self.logger.info("Downloading messages from the SQS queue.")
         aws_sqs = self.session.client("sqs", endpoint_url=self.endpoint_url)
-        sqs_messages = MailerSqsQueueIterator(aws_sqs, self.receive_queue, self.logger)
+        sqs_messages = MailerSqsQueueIterator(
+            aws_sqs,
+            self.receive_queue,
+            self.logger,
+            visibility_timeout=self.visibility_timeout + self.digest_window,
+        )
 
         sqs_messages.msg_attributes = ["mtype", "recipient"]
-        # lambda doesn't support multiprocessing, so we don't instantiate any mp stuff
-        # unless it's being run from CLI on a normal system with SHM
-        if parallel:
-            import multiprocessing
+        # deliveries are io bound, so a thread pool is used, which also
+        # works in lambda where multiprocessing isn't supported.
+        workers = parallel and self.max_num_processes or 1
+        pollers = math.ceil(workers / sqs_messages.batch_size)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if pollers == 1:
+                self.poll(sqs_messages, executor)
+            else:
+                threads = [
+                    threading.Thread(target=self.poll, args=(sqs_messages, executor))
+                    for _ in range(pollers)
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+        self.logger.info("No sqs_messages left on the queue, exiting c7n_mailer.")
+        return
+
+    def poll(self, sqs_messages, executor):
+        """Receive and process batches of messages until the queue is drained."""
+        while True:
+            messages = self.receive(sqs_messages)
+            if not messages:
+                return
+            self.process_batch(sqs_messages, messages, executor)
 
-            process_pool = multiprocessing.Pool(processes=self.max_num_processes)
-        for sqs_message in sqs_messages:
+    def receive(self, sqs_messages):
+        """Receive a batch of messages, collected over the digest window if set."""
+        messages = sqs_messages.receive()
+        started = time.time()
+        while (
+            messages
+            and time.time() - started < self.digest_window
+            and len(messages) < self.digest_max_messages
+        ):
+            received = sqs_messages.receive()
+            if not received:
+                break
+            messages.extend(received)
+        return messages
+
+    def process_batch(self, sqs_messages, messages, executor):
+        if self.digest_window:
+            groups = self.coalesce(messages)
+        else:
+            groups = [[(m, None)] for m in messages]
+        futures = {executor.submit(self.process_group, g): g for g in groups}
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, timeout=self.visibility_timeout / 2)
+            if not pending:
+                break
+            sqs_messages.extend_visibility(
+                [m for f in pending for m, _ in futures[f]], self.visibility_timeout
+            )
+        sqs_messages.ack_batch([m for f, g in futures.items() if f.result() for m, _ in g])
+
+    def coalesce(self, messages):
+        """Group messages for the same policy, account, region and notify action.
+
+        Messages carrying an event are delivered on their own, as their
+        recipients and templates can depend on the event.
+
+        Returns lists of (sqs message, decoded message) pairs.
+        """
+        groups = {}
+        for m in messages:
+            try:
+                decoded = self.decode_sqs_message(m)
+                key = json.dumps(
+                    [
+                        decoded["policy"]["name"],
+                        decoded.get("account_id"),
+                        decoded.get("region"),
+                        decoded["action"],
+                    ],
+                    sort_keys=True,
+                    default=str,
+                )
+            except Exception:
+                # delivered, and reported, on its own
+                decoded, key = None, m["MessageId"]
+            if decoded is not None and decoded.get("event"):
+                key = m["MessageId"]
+            groups.setdefault(key, []).append((m, decoded))
+        return list(groups.values())
+
+    def process_group(self, group):
+        """Deliver a group of messages as one, returns whether they can be deleted."""
+        for sqs_message, _ in group:
             self.logger.debug(
                 "Message id: %s received %s"
                 % (sqs_message["MessageId"], sqs_message.get("MessageAttributes", ""))
@@ -108,29 +254,34 @@ class MailerSqsQueueProcessor(MessageTargetMixin):
             if not msg_kind == DATA_MESSAGE:
                 warning_msg = "Unknown sqs_message or sns format %s" % (sqs_message["Body"][:50])
                 self.logger.warning(warning_msg)
-            if parallel:
-                process_pool.apply_async(self.process_sqs_message, args=sqs_message)
+        try:
+            if len(group) == 1:
+                self.process_sqs_message(*group[0])
             else:
-                self.process_sqs_message(sqs_message)
-            self.logger.debug("Processed sqs_message")
-            sqs_messages.ack(sqs_message)
-        if parallel:
-            process_pool.close()
-            process_pool.join()
-        self.logger.info("No sqs_messages left on the queue, exiting c7n_mailer.")
-        return
+                self.process_sqs_message(group[0][0], self.get_digest([d for _, d in group]))
+        except Exception:
+            self.logger.exception(
+                "Error processing sqs_message %s, leaving it on the queue"
+                % ", ".join(m["MessageId"] for m, _ in group)
+            )
+            return False
+        self.logger.debug("Processed sqs_message")
+        return True
+
+    def get_digest(self, messages):
+        self.logger.info(
+            "Coalesced %d messages for policy:%s into one delivery"
+            % (len(messages), messages[0]["policy"]["name"])
+        )
+        return dict(messages[0], resources=[r for m in messages for r in m["resources"]])
 
     # This function when processing sqs messages will only deliver messages over email or sns
     # If you explicitly declare which tags are aws_usernames (synonymous with ldap uids)
     # in the ldap_uid_tags section of your mailer.yml, we'll do a lookup of those emails
     # (and their manager if that option is on) and also send emails there.
-    def process_sqs_message(self, encoded_sqs_message):
-        body = encoded_sqs_message["Body"]
-        try:
-            body = json.dumps(json.loads(body)["Message"])
-        except ValueError:
-            pass
-        sqs_message = json.loads(zlib.decompress(base64.b64decode(body)))
+    def process_sqs_message(self, encoded_sqs_message, sqs_message=None):
+        if sqs_message is None:
+            sqs_message = self.decode_sqs_message(encoded_sqs_message)
 
         self.logger.debug(
             "Got account:%s message:%s %s:%d policy:%s recipients:%s"
@@ -149,4 +300,32 @@ class MailerSqsQueueProcessor(MessageTargetMixin):
             encoded_sqs_message["Attributes"]["SentTimestamp"],
             email_delivery=True,
             sns_delivery=True,
+            # failed emails are left on the queue to be retried
+            raise_errors=True,
+        )
+
+    def decode_sqs_message(self, encoded_sqs_message):
+        body = self.get_message_body(encoded_sqs_message["Body"])
+        return json.loads(zlib.decompress(base64.b64decode(body)))
+
+    def get_message_body(self, body):
+        """Return the encoded payload of a message.
+
+        Unwraps messages delivered via sns, and fetches payloads that
+        were offloaded to s3.
+        """
+        try:
+            body = json.dumps(json.loads(body)["Message"])
+        except (ValueError, TypeError):
+            pass
+        try:
+            pointer_class, pointer = json.loads(body)
+        except (ValueError, TypeError):
+            return body
+        if pointer_class != S3_POINTER_CLASS:
+            return body
+        return (
+            self.session.client("s3")
+            .get_object(Bucket=pointer["s3BucketName"], Key=pointer["s3Key"])["Body"]
+            .read()
         )
@@ -1,6 +1,7 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
 
+import threading
 import traceback
 
 from .email_delivery import EmailDelivery
@@ -8,12 +9,21 @@ from .utils import decrypt
 
 
 class MessageTargetMixin(object):
-    def handle_targets(self, message, sent_timestamp, email_delivery=True, sns_delivery=False):
+    def get_email_delivery(self):
+        """Return this thread's email delivery, reused across messages."""
+        local = self.__dict__.setdefault("_email_delivery", threading.local())
+        if getattr(local, "delivery", None) is None:
+            local.delivery = EmailDelivery(self.config, self.session, self.logger)
+        return local.delivery
+
+    def handle_targets(
+        self, message, sent_timestamp, email_delivery=True, sns_delivery=False, raise_errors=False
+    ):
         # get the map of email_to_addresses to mimetext messages (with resources baked in)
         # and send any emails (to SES or SMTP) if there are email addresses found
         if email_delivery:
-            email_delivery = EmailDelivery(self.config, self.session, self.logger)
-            email_delivery.send_c7n_email(message)
+            email_delivery = self.get_email_delivery()
+            email_delivery.send_c7n_email(message, raise_errors=raise_errors)
 
         # this sections gets the map of sns_to_addresses to rendered_jinja messages
         # (with resources baked in) and delivers the message to each sns topic
@@ -5,8 +5,9 @@ import boto3
 import copy
 import os
 import unittest
+from datetime import datetime, timedelta, timezone
 
-from c7n_mailer.email_delivery import EmailDelivery
+from c7n_mailer.email_delivery import EmailDelivery, SendRateLimiter
 from common import (
     logger,
     get_ldap_lookup,
@@ -401,6 +402,32 @@ class EmailTest(unittest.TestCase):
             args = mock_send.call_args_list[1][0]
             assert "To: someone@example.com" in args[1]["RawMessage"]["Data"]
 
+    def test_ses_send_rate_and_refresh(self):
+        config = copy.deepcopy(MAILER_CONFIG)
+        del config["smtp_server"]
+        config["ses_send_rate"] = 2
+        delivery = MockEmailDelivery(config, self.aws_session, MagicMock())
+        self.assertIs(delivery.ses_limiter, SendRateLimiter.get(2))
+        delivery.ses_limiter = MagicMock()
+        delivery.aws_ses = MagicMock()
+        delivery.ses_expiration = datetime.now(timezone.utc) + timedelta(minutes=1)
+        with patch.object(delivery, "get_ses_session") as get_ses_session:
+            delivery.send_ses_email(
+                get_mimetext_message(
+                    config, logger, SQS_MESSAGE_1, SQS_MESSAGE_1["resources"], ["a@example.com"]
+                )
+            )
+        get_ses_session.return_value.send_raw_email.assert_called_once()
+        delivery.ses_limiter.wait.assert_called_once()
+
+    def test_send_rate_limiter(self):
+        limiter = SendRateLimiter(10)
+        with patch("time.sleep") as sleep:
+            limiter.wait()
+            limiter.wait()
+        sleep.assert_called_once()
+        self.assertAlmostEqual(sleep.call_args[0][0], 0.1, places=2)
+
     def test_get_ldap_connection(self):
         with patch("c7n_mailer.email_delivery.decrypt") as patched:
             patched.return_value = "a password"
@@ -119,3 +119,21 @@ class SmtpDeliveryTest(unittest.TestCase):
         d = SmtpDelivery(config, MagicMock(), MagicMock())
         d._smtp_connection.quit.side_effect = smtplib.SMTPServerDisconnected
         del d
+
+    @patch("smtplib.SMTP")
+    def test_send_message_reconnect(self, mock_smtp):
+        config = {
+            "smtp_server": "server",
+            "smtp_port": 25,
+            "smtp_ssl": False,
+            "smtp_username": None,
+            "smtp_password": None,
+        }
+        d = SmtpDelivery(config, MagicMock(), MagicMock())
+        mock_smtp.return_value.sendmail.side_effect = [smtplib.SMTPServerDisconnected, None]
+        message_mock = MagicMock()
+        message_mock.__getitem__.side_effect = lambda x: "t@test.com" if x == "From" else None
+        message_mock.as_string.return_value = "mock_text"
+        d.send_message(message_mock, ["test1@test.com"])
+        self.assertEqual(mock_smtp.call_count, 2)
+        self.assertEqual(mock_smtp.return_value.sendmail.call_count, 2)
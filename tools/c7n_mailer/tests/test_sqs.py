@@ -0,0 +1,198 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+import base64
+import copy
+import io
+import json
+import threading
+import time
+import unittest
+import zlib
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from c7n_mailer.sqs_queue_processor import (
+    DATA_MESSAGE,
+    S3_POINTER_CLASS,
+    MailerSqsQueueProcessor,
+)
+from common import MAILER_CONFIG, SQS_MESSAGE_1, SQS_MESSAGE_1_ENCODED, logger
+
+
+class FakeSQS:
+    def __init__(self, count):
+        self.messages = [
+            {
+                "MessageId": str(i),
+                "ReceiptHandle": "handle-%d" % i,
+                "Body": "body-%d" % i,
+                "MessageAttributes": {"mtype": {"StringValue": DATA_MESSAGE}},
+            }
+            for i in range(count)
+        ]
+        self.lock = threading.Lock()
+        self.receives = []
+        self.deleted = []
+        self.extended = []
+
+    def receive_message(self, **params):
+        with self.lock:
+            self.receives.append(params)
+            messages = self.messages[: params["MaxNumberOfMessages"]]
+            self.messages = self.messages[params["MaxNumberOfMessages"] :]
+        return {"Messages": messages}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self.lock:
+            self.deleted.append([e["ReceiptHandle"] for e in Entries])
+        return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self.lock:
+            self.extended.extend((e["ReceiptHandle"], e["VisibilityTimeout"]) for e in Entries)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+
+class SqsQueueProcessorTest(unittest.TestCase):
+    def get_processor(self, sqs, process, config=MAILER_CONFIG):
+        session = MagicMock()
+        session.client.return_value = sqs
+        processor = MailerSqsQueueProcessor(config, session, logger)
+        processor.process_sqs_message = process
+        return processor
+
+    def test_run_acks_delivered(self):
+        sqs = FakeSQS(25)
+
+        def process(message, decoded=None):
+            if message["MessageId"] == "3":
+                raise ValueError("delivery failed")
+
+        self.get_processor(sqs, process).run()
+        self.assertEqual([r["MaxNumberOfMessages"] for r in sqs.receives], [10, 10, 10, 10])
+        self.assertEqual([len(d) for d in sqs.deleted], [9, 10, 5])
+        deleted = {h for d in sqs.deleted for h in d}
+        self.assertNotIn("handle-3", deleted)
+        self.assertEqual(len(deleted), 24)
+
+    def test_run_parallel(self):
+        sqs = FakeSQS(60)
+        threads = set()
+
+        def process(message, decoded=None):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.01)
+
+        processor = self.get_processor(sqs, process)
+        processor.max_num_processes = 20
+        processor.run(parallel=True)
+        self.assertEqual(len({h for d in sqs.deleted for h in d}), 60)
+        self.assertGreater(len(threads), 1)
+        # each of the two pollers stops on an empty receive
+        self.assertEqual(len(sqs.receives), 8)
+
+    def test_run_extends_visibility(self):
+        sqs = FakeSQS(2)
+
+        def process(message, decoded=None):
+            if message["MessageId"] == "1":
+                time.sleep(0.3)
+
+        processor = self.get_processor(sqs, process)
+        processor.visibility_timeout = 0.2
+        processor.run(parallel=True)
+        self.assertIn(("handle-1", 0.2), sqs.extended)
+        self.assertNotIn("handle-0", {h for h, _ in sqs.extended})
+        self.assertEqual(sqs.receives[0]["VisibilityTimeout"], 0.2)
+        self.assertEqual(sorted(h for d in sqs.deleted for h in d), ["handle-0", "handle-1"])
+
+    def test_run_email_failure(self):
+        sqs = FakeSQS(2)
+        for m in sqs.messages:
+            m.update(Body=SQS_MESSAGE_1_ENCODED["Body"], Attributes={"SentTimestamp": "0"})
+        ses = MagicMock()
+        ses.send_raw_email.side_effect = [
+            ClientError({"Error": {"Code": "Throttling"}}, "SendRawEmail"),
+            {},
+        ]
+        session = MagicMock()
+        session.client.side_effect = lambda service, **kw: sqs if service == "sqs" else ses
+        config = {k: v for k, v in MAILER_CONFIG.items() if k not in ("smtp_server", "ldap_uri")}
+        MailerSqsQueueProcessor(config, session, logger).run()
+        self.assertEqual(ses.send_raw_email.call_count, 2)
+        # only the delivered message is deleted
+        self.assertEqual([len(d) for d in sqs.deleted], [1])
+
+    def test_message_body_s3_pointer(self):
+        session = MagicMock()
+        session.client.return_value.get_object.return_value = {
+            "Body": io.BytesIO(SQS_MESSAGE_1_ENCODED["Body"])
+        }
+        processor = MailerSqsQueueProcessor(MAILER_CONFIG, session, logger)
+        body = json.dumps([S3_POINTER_CLASS, {"s3BucketName": "payloads", "s3Key": "abc"}])
+        self.assertEqual(processor.get_message_body(body), SQS_MESSAGE_1_ENCODED["Body"])
+        session.client.return_value.get_object.assert_called_once_with(Bucket="payloads", Key="abc")
+        # sns wrapped and plain payloads are passed through
+        self.assertEqual(processor.get_message_body(json.dumps({"Message": "abc"})), '"abc"')
+        self.assertEqual(processor.get_message_body("abc"), "abc")
+
+    def test_run_digest(self):
+        sqs = FakeSQS(25)
+        for i, m in enumerate(sqs.messages):
+            message = copy.deepcopy(SQS_MESSAGE_1)
+            message["policy"]["name"] = "policy-%d" % (i % 2)
+            message["resources"][0]["VolumeId"] = "vol-%d" % i
+            m["Body"] = base64.b64encode(zlib.compress(json.dumps(message).encode("utf8")))
+        sqs.messages[24]["Body"] = "garbage"
+        delivered = []
+
+        def process(encoded, message=None):
+            if message is None:
+                raise ValueError("undecodable")
+            delivered.append(message)
+
+        config = dict(MAILER_CONFIG, email_digest_window=60)
+        self.get_processor(sqs, process, config).run()
+        self.assertEqual(sqs.receives[0]["VisibilityTimeout"], 180)
+        self.assertEqual(
+            sorted((m["policy"]["name"], len(m["resources"])) for m in delivered),
+            [("policy-0", 12), ("policy-1", 12)],
+        )
+        deleted = {h for d in sqs.deleted for h in d}
+        self.assertEqual(len(deleted), 24)
+        self.assertNotIn("handle-24", deleted)
+
+    def test_run_digest_event_owners(self):
+        sqs = FakeSQS(4)
+        for i, m in enumerate(sqs.messages):
+            message = copy.deepcopy(SQS_MESSAGE_1)
+            message["action"]["to"] = ["event-owner"]
+            message["event"] = {"detail": {"userIdentity": {"userName": "user-%d" % (i % 2)}}}
+            message["resources"][0]["VolumeId"] = "vol-%d" % i
+            m["Body"] = base64.b64encode(zlib.compress(json.dumps(message).encode("utf8")))
+        delivered = []
+
+        def process(encoded, message=None):
+            delivered.append(message)
+
+        config = dict(MAILER_CONFIG, email_digest_window=60)
+        self.get_processor(sqs, process, config).run()
+        # each event owner only hears about their own resources
+        self.assertEqual(
+            sorted(
+                (
+                    m["event"]["detail"]["userIdentity"]["userName"],
+                    [r["VolumeId"] for r in m["resources"]],
+                )
+                for m in delivered
+            ),
+            [
+                ("user-0", ["vol-0"]),
+                ("user-0", ["vol-2"]),
+                ("user-1", ["vol-1"]),
+                ("user-1", ["vol-3"]),
+            ],
+        )
+        self.assertEqual(len({h for d in sqs.deleted for h in d}), 4)
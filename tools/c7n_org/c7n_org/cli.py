@@ -3,6 +3,7 @@
 """Run a custodian policy across an organization's accounts
 """
 
+import copy
 import csv
 from collections import Counter
 from datetime import timedelta, datetime
@@ -23,17 +24,21 @@ from botocore.exceptions import ClientError
 import click
 import jsonschema
 
+from c7n import cache
 from c7n.credentials import assumed_session, SessionFactory
+from c7n.ctx import ExecutionContext
 from c7n.executor import MainThreadExecutor
 from c7n.exceptions import InvalidOutputConfig
 from c7n.config import Config
-from c7n.policy import PolicyCollection
+from c7n.policy import Policy, PolicyCollection, get_session_factory
+from c7n import ratelimit
 from c7n.provider import get_resource_class, clouds as cloud_providers
 from c7n.reports.csvout import Formatter, fs_record_set, record_set, strip_output_path
 from c7n.resources import load_available
 from c7n.utils import (
     CONN_CACHE, dumps, filter_empty, format_string_values, get_policy_provider, join_output_path)
 
+from c7n_org.journal import RunJournal
 from c7n_org.utils import environ, account_tags
 
 log = logging.getLogger('c7n_org')
@@ -49,6 +54,9 @@ if sys.platform == 'darwin' and (
 WORKER_COUNT = int(
     os.environ.get('C7N_ORG_PARALLEL', multiprocessing.cpu_count() * 4))
 
+# Policies prepared once per worker process, see init_worker.
+WORKER_POLICIES = None
+
 
 CONFIG_SCHEMA = {
     '$schema': 'http://json-schema.org/draft-07/schema',
@@ -605,14 +613,115 @@ def _update(old, new):
     return old
 
 
+def has_variables(data):
+    """Whether any string value of the policy data is a format string."""
+    if isinstance(data, dict):
+        return any(has_variables(v) for v in data.values())
+    elif isinstance(data, list):
+        return any(has_variables(v) for v in data)
+    return isinstance(data, str) and '{' in data
+
+
+class PolicyBundle:
+    """A policy set loaded and validated once per worker process.
+
+    The policies of a region are loaded and validated for the first task
+    in the region, and cloned for the accounts of later tasks. Policies
+    that reference variables or have an execution mode are expanded per
+    account, so they're loaded and validated per task, as are policies
+    that can't be cloned.
+    """
+
+    def __init__(self, policies_config):
+        self.policies_config = policies_config
+        self.templates = {}
+
+    def get_policies(self, config):
+        """Return the policies for a task's config, with whether each is validated."""
+        templates = self.templates.get(config.region)
+        if templates is None:
+            templates = self.templates[config.region] = self.load_templates(config)
+        policies = []
+        for data, template in zip(self.policies_config.get('policies', ()), templates):
+            policy = template and self.clone(template, config)
+            if policy is None:
+                policies.append((Policy(copy.deepcopy(data), config), False))
+            else:
+                policies.append((policy, True))
+        return policies
+
+    def load_templates(self, config):
+        # templates don't run, and values copied from their cache would
+        # be bound to the account they were loaded with.
+        config = config.copy(cache='', cache_period=0)
+        templates = []
+        for data in self.policies_config.get('policies', ()):
+            if 'mode' in data or has_variables(data):
+                templates.append(None)
+                continue
+            try:
+                policy = Policy(copy.deepcopy(data), config)
+                policy.validate()
+            except Exception:
+                # errors are reported by the tasks that load the policy.
+                policy = None
+            templates.append(policy)
+        return templates
+
+    def clone(self, template, config):
+        """Copy a validated policy for a task's config, None if it can't be copied.
+
+        Filters and actions keep the runtime state initialized by their
+        validation, their references to the template's config, session
+        factory, execution context and cache are replaced with the task's.
+        """
+        policy = Policy.__new__(Policy)
+        policy.options = config
+        policy.session_factory = get_session_factory(template.provider_name, config)
+        policy.ctx = ExecutionContext(policy.session_factory, policy, config)
+        memo = {
+            id(template): policy,
+            id(template.options): config,
+            id(template.session_factory): policy.session_factory,
+            id(template.ctx): policy.ctx,
+            id(template.resource_manager.get_cache()): cache.factory(config)}
+        try:
+            policy.data = copy.deepcopy(template.data, memo)
+            policy.resource_manager = copy.deepcopy(template.resource_manager, memo)
+            policy.conditions = copy.deepcopy(template.conditions, memo)
+        except Exception as e:
+            log.debug("Unable to clone policy:%s error:%s", template.name, e)
+            return None
+        return policy
+
+
+def init_worker(policies_config=None, governor=None):
+    """Load providers and prepare the policy set once per worker process."""
+    global WORKER_POLICIES
+    load_available()
+    if policies_config is not None:
+        WORKER_POLICIES = PolicyBundle(policies_config)
+    if governor is not None:
+        ratelimit.set_governor(governor)
+
+
+def get_worker_policies(policies_config):
+    if WORKER_POLICIES is None or WORKER_POLICIES.policies_config != policies_config:
+        init_worker(policies_config)
+    return WORKER_POLICIES
+
+
 def run_account(account, region, policies_config, output_path,
-                cache_period, cache_path, metrics, dryrun, debug):
+                cache_period, cache_path, metrics, dryrun, debug, journal=None):
     """Execute a set of policies on an account.
+
+    Policies completed by a resumed run, per the journal, are skipped.
     """
     logging.getLogger('custodian.output').setLevel(logging.ERROR + 1)
     CONN_CACHE.session = None
     CONN_CACHE.time = None
-    load_available()
+    ratelimit.set_account(account['account_id'])
+    bundle = get_worker_policies(policies_config)
 
     output_path = join_output_path(output_path, account['name'], region)
 
@@ -640,24 +749,32 @@ def run_account(account, region, policies_config, output_path,
     if account.get("oci_compartments"):
         env_vars.update({"OCI_COMPARTMENTS": account.get("oci_compartments")})
 
-    policies = PolicyCollection.from_data(policies_config, config)
+    policies = bundle.get_policies(config)
     policy_counts = {}
     success = True
     st = time.time()
+    completed = journal and journal.get_completed(account['account_id'], region) or {}
 
     with environ(**env_vars):
-        for p in policies:
+        for p, validated in policies:
+            if p.name in completed:
+                policy_counts[p.name] = completed[p.name]
+                continue
             # Extend policy execution conditions with account information
             p.conditions.env_vars['account'] = account
-            # Variable expansion and non schema validation (not optional)
-            p.expand_variables(p.get_variables(account.get('vars', {})))
-            p.validate()
+            if not validated:
+                # Variable expansion and non schema validation (not optional)
+                p.expand_variables(p.get_variables(account.get('vars', {})))
+                p.validate()
             log.debug(
                 "Running policy:%s account:%s region:%s",
                 p.name, account['name'], region)
             try:
                 resources = p.run()
                 policy_counts[p.name] = resources and len(resources) or 0
+                if journal:
+                    journal.record(
+                        account['account_id'], region, p.name, policy_counts[p.name])
                 if not resources:
                     continue
                 if not config.dryrun and p.execution_mode != 'pull':
@@ -690,6 +807,8 @@ def run_account(account, region, policies_config, output_path,
                 pdb.post_mortem(sys.exc_info()[-1])
                 raise
 
+    if journal and not completed:
+        journal.record_duration(account['account_id'], region, time.time() - st)
     return policy_counts, success
 
 
@@ -712,6 +831,17 @@ def initialize_provider_output(policies_config, output_dir, regions):
     return policy_config.output_dir
 
 
+def parse_rate_limits(ctx, param, value):
+    rates = {}
+    for v in value:
+        service, _, rate = v.partition('=')
+        try:
+            rates[service.strip()] = float(rate)
+        except ValueError:
+            raise click.BadParameter("expected service=rate, got %s" % v)
+    return rates
+
+
 @cli.command(name='run')
 @click.option('-c', '--config', required=True, help="Accounts config file")
 @click.option("-u", "--use", required=True)
@@ -726,18 +856,24 @@ def initialize_provider_output(policies_config, output_dir, regions):
 @click.option('--cache-period', default=15, type=int)
 @click.option('--cache-path', required=False,
               type=click.Path(
-                  writable=True, readable=True, exists=True,
+                  writable=True, readable=True,
                   resolve_path=True, allow_dash=False,
                   file_okay=False, dir_okay=True),
               default=None)
 @click.option("--metrics", default=False, is_flag=True)
 @click.option("--metrics-uri", default=None, help="Configure provider metrics target")
 @click.option("--dryrun", default=False, is_flag=True)
+@click.option('--resume', default=False, is_flag=True,
+              help="Resume the last incomplete run of the policies, skipping"
+              " completed account/region policies")
+@click.option('--rate-limit', multiple=True, callback=parse_rate_limits,
+              help="Api calls per second per account and region for a service,"
+              " ie. organizations=2, or * for all services")
 @click.option('--debug', default=False, is_flag=True)
 @click.option('-v', '--verbose', default=False, help="Verbose", is_flag=True)
 def run(config, use, output_dir, accounts, not_accounts, tags, region,
         policy, policy_tags, cache_period, cache_path, metrics,
-        dryrun, debug, verbose, metrics_uri):
+        dryrun, resume, rate_limit, debug, verbose, metrics_uri):
     """run a custodian policy across accounts"""
     accounts_config, custodian_config, executor = init(
         config, use, debug, verbose, accounts, tags, policy, policy_tags=policy_tags,
@@ -755,17 +891,34 @@ def run(config, use, output_dir, accounts, not_accounts, tags, region,
     if metrics_uri:
         metrics = metrics_uri
 
-    if not cache_path:
-        cache_path = os.path.expanduser("~/.cache/c7n-org")
-        if not os.path.exists(cache_path):
-            os.makedirs(cache_path)
+    cache_path = os.path.expanduser(cache_path or "~/.cache/c7n-org")
+    os.makedirs(cache_path, exist_ok=True)
 
     output_dir = initialize_provider_output(custodian_config, output_dir, region)
 
-    with executor(max_workers=WORKER_COUNT) as w:
-        futures = {}
-        for a in accounts_config['accounts']:
-            for r in resolve_regions(region or a.get('regions', ()), a):
+    jobs = [
+        (a, r) for a in accounts_config['accounts']
+        for r in resolve_regions(region or a.get('regions', ()), a)]
+    journal = RunJournal(
+        os.path.join(cache_path, RunJournal.file_name),
+        RunJournal.get_run_key(custodian_config, jobs, output_dir, dryrun))
+    if journal.start(resume):
+        log.info("Resuming run, skipping completed account/region policies")
+    jobs = journal.order(jobs)
+    completed = True
+
+    governor_manager = governor = None
+    if rate_limit:
+        governor_manager, governor = ratelimit.start_governor(rate_limit)
+        ratelimit.set_governor(governor)
+
+    try:
+        with executor(
+                max_workers=WORKER_COUNT,
+                initializer=init_worker,
+                initargs=(custodian_config, governor)) as w:
+            futures = {}
+            for a, r in jobs:
                 futures[w.submit(
                     run_account,
                     a, r,
@@ -775,24 +928,36 @@ def run(config, use, output_dir, accounts, not_accounts, tags, region,
                     cache_path,
                     metrics,
                     dryrun,
-                    debug)] = (a, r)
+                    debug,
+                    journal)] = (a, r)
+
+            for f in as_completed(futures):
+                a, r = futures[f]
+                if f.exception():
+                    completed = False
+                    if debug:
+                        raise
+                    log.warning(
+                        "Error running policy in %s @ %s exception: %s",
+                        a['name'], r, f.exception())
+                    continue
 
-        for f in as_completed(futures):
-            a, r = futures[f]
-            if f.exception():
-                if debug:
-                    raise
-                log.warning(
-                    "Error running policy in %s @ %s exception: %s",
-                    a['name'], r, f.exception())
-                continue
+                account_region_pcounts, account_region_success = f.result()
+                for p in account_region_pcounts:
+                    policy_counts[p] += account_region_pcounts[p]
 
-            account_region_pcounts, account_region_success = f.result()
-            for p in account_region_pcounts:
-                policy_counts[p] += account_region_pcounts[p]
+                if not account_region_success:
+                    success = False
 
-            if not account_region_success:
-                success = False
+        if governor is not None:
+            ratelimit.report(governor, log)
+    finally:
+        if governor_manager is not None:
+            ratelimit.set_governor(None)
+            governor_manager.shutdown()
+
+    if success and completed:
+        journal.complete()
 
     log.info("Policy resource counts %s" % policy_counts)
 
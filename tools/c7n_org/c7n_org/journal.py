@@ -0,0 +1,120 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Run journal for resumable c7n-org runs.
+
+The journal is a sqlite database under the run's cache path recording
+the account/region/policy units completed by a run, so an interrupted
+run can be resumed without executing those units again, along with the
+duration of each account/region, used to schedule the longest running
+ones first on subsequent runs.
+
+Worker processes write to the journal directly, each operation uses
+its own short lived connection.
+"""
+from contextlib import closing, contextmanager
+import hashlib
+import json
+import sqlite3
+import time
+
+
+SCHEMA = (
+    """create table if not exists runs (
+        run_key text primary key, started real, completed real)""",
+    """create table if not exists units (
+        run_key text, account_id text, region text, policy text,
+        resources integer, completed real,
+        primary key (run_key, account_id, region, policy))""",
+    """create table if not exists durations (
+        account_id text, region text, duration real,
+        primary key (account_id, region))""",
+)
+
+
+class RunJournal:
+
+    file_name = 'c7n-org-journal.db'
+
+    def __init__(self, path, run_key):
+        self.path = path
+        self.run_key = run_key
+
+    @staticmethod
+    def get_run_key(policies_config, jobs, output_dir, dryrun):
+        """Identify a run by its policies, account/regions and output.
+
+        A resumed run must use the same ones, while runs of the same
+        policies against other accounts or outputs are journaled apart.
+        """
+        data = json.dumps(
+            [policies_config,
+             sorted((a['account_id'], r) for a, r in jobs),
+             output_dir,
+             bool(dryrun)],
+            sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf8')).hexdigest()
+
+    @contextmanager
+    def transaction(self):
+        with closing(sqlite3.connect(self.path, timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def start(self, resume=False):
+        """Start a run, returns True if an incomplete run was resumed."""
+        with self.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            row = conn.execute(
+                'select completed from runs where run_key = ?',
+                (self.run_key,)).fetchone()
+            if resume and row and row[0] is None:
+                return True
+            conn.execute('delete from units where run_key = ?', (self.run_key,))
+            conn.execute(
+                'insert or replace into runs (run_key, started, completed) values (?, ?, null)',
+                (self.run_key, time.time()))
+        return False
+
+    def complete(self):
+        with self.transaction() as conn:
+            conn.execute(
+                'update runs set completed = ? where run_key = ?',
+                (time.time(), self.run_key))
+
+    def record(self, account_id, region, policy, resources):
+        """Record a completed policy execution of an account/region."""
+        with self.transaction() as conn:
+            conn.execute(
+                'insert or replace into units values (?, ?, ?, ?, ?, ?)',
+                (self.run_key, account_id, region, policy, resources, time.time()))
+
+    def get_completed(self, account_id, region):
+        """Return resource counts by policy of the account/region's completed units."""
+        with self.transaction() as conn:
+            return dict(conn.execute(
+                'select policy, resources from units '
+                'where run_key = ? and account_id = ? and region = ?',
+                (self.run_key, account_id, region)).fetchall())
+
+    def record_duration(self, account_id, region, duration):
+        with self.transaction() as conn:
+            conn.execute(
+                'insert or replace into durations values (?, ?, ?)',
+                (account_id, region, duration))
+
+    def get_durations(self):
+        with self.transaction() as conn:
+            return {
+                (account_id, region): duration for account_id, region, duration
+                in conn.execute('select account_id, region, duration from durations')}
+
+    def order(self, jobs):
+        """Order account/region jobs by their previous durations, longest first.
+
+        Jobs without a previous duration are scheduled first, otherwise the
+        given order is kept.
+        """
+        durations = self.get_durations()
+        return sorted(
+            jobs, key=lambda j: -durations.get((j[0]['account_id'], j[1]), float('inf')))
@@ -184,6 +184,45 @@ class OrgTest(TestUtils):
             log_output.getvalue().strip(),
             "Policy resource counts Counter({'compute': 96, 'serverless': 48})")
 
+    def test_cli_run_rate_limit(self):
+        run_dir = self.setup_run_dir()
+        governors = []
+
+        def run_account(account, *args):
+            governor = org.ratelimit.get_governor()
+            governors.append(governor)
+            governor.throttled('ec2', account['account_id'], 'us-east-1')
+            return {'compute': 1}, True
+
+        self.patch(org, 'logging', mock.MagicMock())
+        self.patch(org, 'run_account', run_account)
+        self.change_cwd(run_dir)
+        log_output = self.capture_logging('c7n_org')
+        runner = CliRunner()
+        result = runner.invoke(
+            org.cli,
+            ['run', '-c', 'accounts.yml', '-u', 'policies.yml',
+             '--debug', '-s', 'output', '--cache-path', 'cache',
+             '--rate-limit', 'ec2=5', '--rate-limit', 'organizations=1'],
+            catch_exceptions=False)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(governors), 4)
+        self.assertIsNone(org.ratelimit.get_governor())
+        self.assertIn(
+            "API rate service:ec2 account:112233445566 region:us-east-1"
+            " calls:0 throttled:2",
+            log_output.getvalue())
+        self.assertIn(
+            "API rate totals calls:0 throttled:4", log_output.getvalue())
+
+        result = runner.invoke(
+            org.cli,
+            ['run', '-c', 'accounts.yml', '-u', 'policies.yml',
+             '-s', 'output', '--rate-limit', 'ec2'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('expected service=rate', result.output)
+
     def test_filter_policies(self):
         d = {'policies': [
             {'name': 'find-ml',
@@ -302,6 +341,153 @@ class OrgTest(TestUtils):
         # NOTE allow override at account level
         accounts[1]["vars"]["default_tz"] = "UTC"
 
+    def test_run_account_prepared_policies(self):
+        from c7n.policy import Policy
+        policies = {'policies': [
+            {'name': 'compute', 'resource': 'aws.ec2',
+             'filters': [{'type': 'subnet', 'key': 'tag:Public', 'value': 'true'}]},
+            {'name': 'compute-tagged', 'resource': 'aws.ec2',
+             'filters': [{'tag:Owner': '{account_id}'}]}]}
+        accounts = yaml.safe_load(ACCOUNTS_AWS_DEFAULT)['accounts']
+        validate = Policy.validate
+        validated, ran = [], []
+
+        def record_validate(p):
+            validated.append(p.name)
+            validate(p)
+
+        def run(p):
+            ran.append((
+                p.name, p.resource_manager.config.account_id,
+                p.resource_manager.filters[0].manager is p.resource_manager,
+                p.data.get('filters', [{}])[0].get('tag:Owner')))
+            return []
+
+        load_available = mock.MagicMock()
+        self.patch(org, 'WORKER_POLICIES', None)
+        self.patch(org, 'load_available', load_available)
+        self.patch(Policy, 'validate', record_validate)
+        self.patch(Policy, 'run', run)
+        output_dir = self.get_temp_dir()
+        for a in accounts:
+            org.run_account(
+                a, 'us-east-1', policies, output_dir, 0, output_dir, False, False, False)
+
+        # providers are loaded once per worker process, and policies
+        # without variables are validated once per region and cloned.
+        self.assertEqual(load_available.call_count, 1)
+        self.assertEqual(validated, ['compute', 'compute-tagged', 'compute-tagged'])
+        self.assertEqual(ran, [
+            ('compute', '112233445566', True, None),
+            ('compute-tagged', '112233445566', True, '112233445566'),
+            ('compute', '002244668899', True, None),
+            ('compute-tagged', '002244668899', True, '002244668899')])
+        self.assertEqual(
+            policies['policies'][1]['filters'], [{'tag:Owner': '{account_id}'}])
+
+    def test_run_account_journal_resume(self):
+        from c7n.policy import Policy
+        from c7n_org.journal import RunJournal
+        policies = {'policies': [
+            {'name': 'compute', 'resource': 'aws.ec2'},
+            {'name': 'serverless', 'resource': 'aws.lambda'}]}
+        account = yaml.safe_load(ACCOUNTS_AWS_DEFAULT)['accounts'][0]
+        ran = []
+
+        def run(p):
+            ran.append(p.name)
+            if p.name == 'serverless' and len(ran) == 2:
+                raise ValueError('interrupted')
+            return [{}] * 3
+
+        self.patch(org, 'WORKER_POLICIES', None)
+        self.patch(Policy, 'validate', lambda p: None)
+        self.patch(Policy, 'run', run)
+        output_dir = self.get_temp_dir()
+        journal = RunJournal(
+            os.path.join(output_dir, RunJournal.file_name),
+            RunJournal.get_run_key(policies, [(account, 'us-east-1')], output_dir, False))
+        self.assertFalse(journal.start(resume=True))
+
+        counts, success = org.run_account(
+            account, 'us-east-1', policies, output_dir, 0, output_dir,
+            False, False, False, journal)
+        self.assertEqual((counts, success), ({'compute': 3}, False))
+        self.assertEqual(journal.get_completed('112233445566', 'us-east-1'), {'compute': 3})
+        self.assertEqual(list(journal.get_durations()), [('112233445566', 'us-east-1')])
+
+        # resuming skips the completed unit
+        self.assertTrue(journal.start(resume=True))
+        counts, success = org.run_account(
+            account, 'us-east-1', policies, output_dir, 0, output_dir,
+            False, False, False, journal)
+        self.assertEqual((counts, success), ({'compute': 3, 'serverless': 3}, True))
+        self.assertEqual(ran, ['compute', 'serverless', 'serverless'])
+
+        # a completed run isn't resumed
+        journal.complete()
+        self.assertFalse(journal.start(resume=True))
+        self.assertEqual(journal.get_completed('112233445566', 'us-east-1'), {})
+
+    def test_journal_run_key(self):
+        from c7n_org.journal import RunJournal
+        policies = {'policies': [{'name': 'compute', 'resource': 'aws.ec2'}]}
+        accounts = yaml.safe_load(ACCOUNTS_AWS_DEFAULT)['accounts']
+        jobs = [(a, r) for a in accounts for r in ('us-east-1', 'us-west-2')]
+        key = RunJournal.get_run_key(policies, jobs, 'output', False)
+        self.assertEqual(
+            key, RunJournal.get_run_key(policies, list(reversed(jobs)), 'output', False))
+        self.assertEqual(len({
+            key,
+            RunJournal.get_run_key(policies, jobs[:2], 'output', False),
+            RunJournal.get_run_key(policies, jobs[::2], 'output', False),
+            RunJournal.get_run_key(policies, jobs, 'other-output', False),
+            RunJournal.get_run_key(policies, jobs, 'output', True)}), 5)
+
+    def test_journal_job_order(self):
+        from c7n_org.journal import RunJournal
+        journal = RunJournal(
+            os.path.join(self.get_temp_dir(), RunJournal.file_name), 'xyz')
+        journal.start()
+        journal.record_duration('112233445566', 'us-east-1', 30)
+        journal.record_duration('112233445566', 'us-west-2', 300)
+        journal.record_duration('002244668899', 'us-east-1', 60)
+        dev, qa = yaml.safe_load(ACCOUNTS_AWS_DEFAULT)['accounts']
+        jobs = [(dev, 'us-east-1'), (dev, 'us-west-2'),
+                (qa, 'us-east-1'), (qa, 'us-west-2')]
+        self.assertEqual(
+            [(a['name'], r) for a, r in journal.order(jobs)],
+            [('qa', 'us-west-2'), ('dev', 'us-west-2'),
+             ('qa', 'us-east-1'), ('dev', 'us-east-1')])
+
+    def test_cli_run_resume(self):
+        run_dir = self.setup_run_dir()
+        run_account = mock.MagicMock()
+        run_account.return_value = ({'compute': 1}, False)
+        self.patch(org, 'logging', mock.MagicMock())
+        self.patch(org, 'run_account', run_account)
+        self.change_cwd(run_dir)
+        log_output = self.capture_logging('c7n_org')
+        runner = CliRunner()
+        args = ['run', '-c', 'accounts.yml', '-u', 'policies.yml',
+                '--debug', '-s', 'output', '--cache-path', 'run-cache', '--resume']
+
+        result = runner.invoke(org.cli, args)
+        self.assertEqual(result.exit_code, 1)
+        self.assertNotIn('Resuming run', log_output.getvalue())
+        journal = run_account.call_args[0][-1]
+        self.assertEqual(
+            journal.path, os.path.join(run_dir, 'run-cache', 'c7n-org-journal.db'))
+
+        run_account.return_value = ({'compute': 1}, True)
+        result = runner.invoke(org.cli, args)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Resuming run', log_output.getvalue())
+
+        # the previous run completed, so this one starts over
+        result = runner.invoke(org.cli, args)
+        self.assertEqual(log_output.getvalue().count('Resuming run'), 1)
+
     def test_cli_nothing_to_do(self):
         run_dir = self.setup_run_dir()
         logger = mock.MagicMock()